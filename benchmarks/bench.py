@@ -0,0 +1,360 @@
+"""
+Benchmarks de ponta a ponta do caminho de consulta e de exportação de um motor
+espacial (PostGIS ou local) sobre um conjunto sintético (ver dataset.py).
+
+Uso (a partir da raiz do projeto, com um PostgreSQL/PostGIS local):
+    python -m benchmarks.bench gerar --camadas 20 --linhas 10000 --aois benchmarks/aois
+    python -m benchmarks.bench executar --aois benchmarks/aois --workers 1 4 --saida antes.json
+    python -m benchmarks.bench comparar antes.json depois.json
+
+Sem banco, com o motor local sobre um GeoPackage sintético:
+    python -m benchmarks.bench gerar --arquivos benchmarks/dados --aois benchmarks/aois
+    python -m benchmarks.bench executar --fonte benchmarks/dados --aois benchmarks/aois
+
+Sem --credenciais, a conexão usa as variáveis de ambiente da libpq
+(PGHOST, PGPORT, PGDATABASE, PGUSER, PGPASSWORD).
+
+Para cada AOI, número de workers e repetição, são medidas as etapas:
+- aoi: leitura, reprojeção, dissolução e serialização da AOI
+- contagem: iter_resultados do runner, sem cache de resultados
+- perfil: perfil dos campos das camadas com interseção (perfil_camada)
+- exportacao: GeoPackage reaproveitando a contagem (chaves registradas no PostGIS,
+  feições retidas no motor local)
+- exportacao_espacial: GeoPackage repetindo o filtro espacial
+  (nas duas exportações, as camadas ZM devem sair apenas com Z)
+- lote: iter_lote do runner (apenas AOIs com o campo de área)
+
+O resultado (JSON) registra o commit, as versões do servidor, a configuração
+do esquema sintético, os tempos de cada repetição (mínimo e mediana) e o
+detalhamento por etapa interna (RunProfiler) da última repetição.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.dataset import (
+    CAMPO_AREA, ConfigDataset, config_do_esquema, config_dos_arquivos, gerar_aois, gerar_arquivos, gerar_esquema
+)
+
+ETAPAS = ("aoi", "contagem", "perfil", "exportacao", "exportacao_espacial", "lote")
+
+
+def log(mensagem: str):
+    print(mensagem, file=sys.stderr, flush=True)
+
+
+def _argumentos(argv=None) -> argparse.Namespace:
+    padrao = ConfigDataset()
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench", description=__doc__.split("\n\n")[0])
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    gerar = sub.add_parser("gerar", help="cria o esquema sintético (ou o GeoPackage sintético) e as AOIs")
+    gerar.add_argument("--arquivos", metavar="DIRETORIO",
+                       help="grava as camadas em <DIRETORIO>/<schema>.gpkg, sem banco, para o motor local")
+    gerar.add_argument("--credenciais", help="arquivo JSON com host, port, dbname, user e password")
+    gerar.add_argument("--schema", default=padrao.schema)
+    gerar.add_argument("--camadas", type=int, default=padrao.camadas)
+    gerar.add_argument("--linhas", type=int, default=padrao.linhas, help="feições por camada")
+    gerar.add_argument("--vertices", type=int, default=padrao.vertices, help="vértices por polígono ou linha")
+    gerar.add_argument("--sem-indice", type=float, default=padrao.fracao_sem_indice,
+                       help="fração das camadas sem índice GiST")
+    gerar.add_argument("--zm", type=float, default=padrao.fracao_zm, help="fração das camadas com geometrias ZM")
+    gerar.add_argument("--outro-srid", type=float, default=padrao.fracao_outro_srid,
+                       help="fração das camadas em EPSG:3857")
+    gerar.add_argument("--invalidas", type=float, default=padrao.fracao_invalidas,
+                       help="fração das feições poligonais inválidas")
+    gerar.add_argument("--semente", type=int, default=padrao.semente)
+    gerar.add_argument("--aois", required=True, help="diretório onde as AOIs são gravadas")
+    gerar.add_argument("--vertices-aoi", type=int, nargs="+", default=[4, 1_000, 50_000],
+                       help="número de vértices de cada AOI gerada")
+    gerar.add_argument("--areas", type=int, default=100, help="áreas da AOI do modo em lote")
+
+    executar = sub.add_parser("executar", help="mede as etapas sobre o esquema sintético")
+    executar.add_argument("--credenciais", help="arquivo JSON com host, port, dbname, user e password")
+    executar.add_argument("--schema", default=padrao.schema)
+    executar.add_argument("--fonte", nargs="+", metavar="CAMINHO",
+                          help="mede o motor local sobre estes arquivos GeoPackage/Shapefile, sem banco")
+    executar.add_argument("--assincrono", action="store_true",
+                          help="mede o motor assíncrono (psycopg 3) do PostGIS")
+    executar.add_argument("--aois", required=True, help="diretório (ou arquivos) das AOIs")
+    executar.add_argument("--workers", type=int, nargs="+", default=[1])
+    executar.add_argument("--repeticoes", type=int, default=3)
+    executar.add_argument("--etapas", nargs="+", choices=ETAPAS, default=list(ETAPAS))
+    executar.add_argument("--saida", help="arquivo JSON do resultado "
+                                          "(padrão: benchmarks/resultados/<data>_<commit>.json)")
+
+    comparar = sub.add_parser("comparar", help="compara dois resultados JSON")
+    comparar.add_argument("base")
+    comparar.add_argument("novo")
+    return parser.parse_args(argv)
+
+
+def _conectar(args, max_size: int):
+    from core.db.connector import PostgresConnector, carregar_credenciais, credenciais_do_ambiente
+
+    config = carregar_credenciais(args.credenciais) if args.credenciais else credenciais_do_ambiente()
+    connector = PostgresConnector(config, max_size=max_size, application_name="PostIntersect benchmark")
+    return connector, connector.connect()
+
+
+def _commit() -> str | None:
+    """
+    Commit atual do repositório, com o sufixo '-sujo' se houver alterações.
+    """
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=raiz, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        sujo = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=raiz, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-sujo" if sujo else "")
+
+
+def comando_gerar(args) -> int:
+    config = ConfigDataset(
+        schema=args.schema, camadas=args.camadas, linhas=args.linhas, vertices=args.vertices,
+        fracao_sem_indice=args.sem_indice, fracao_zm=args.zm, fracao_outro_srid=args.outro_srid,
+        fracao_invalidas=args.invalidas, semente=args.semente
+    )
+    inicio = time.perf_counter()
+    if args.arquivos:
+        caminho = gerar_arquivos(args.arquivos, config, log_func=log)
+        log(f"[OK] GeoPackage '{caminho}' gerado em {time.perf_counter() - inicio:.1f} s.")
+    else:
+        connector, conn = _conectar(args, 1)
+        try:
+            gerar_esquema(conn, config, log_func=log)
+            log(f"[OK] Esquema '{config.schema}' gerado em {time.perf_counter() - inicio:.1f} s.")
+        finally:
+            connector.close()
+    for caminho in gerar_aois(args.aois, config, tuple(args.vertices_aoi), args.areas):
+        log(f"[OK] AOI gravada em: {caminho}")
+    return 0
+
+
+def _caminhos_aoi(entrada: str) -> list[str]:
+    if os.path.isdir(entrada):
+        return sorted(
+            os.path.join(entrada, nome) for nome in os.listdir(entrada)
+            if nome.lower().endswith((".geojson", ".json", ".gpkg", ".shp"))
+        )
+    return [entrada]
+
+
+def _medir_caso(backend, conn, caminho: str, layers, workers: int, etapas: list[str],
+                diretorio: str) -> tuple[dict[str, float], dict[str, int], dict]:
+    """
+    Uma repetição de todas as etapas para uma AOI. Retorna (segundos por etapa,
+    linhas por etapa, relatório do RunProfiler). `conn` é None no motor local.
+    """
+    from core.spatial.aoi import AOI
+    from utils.run_profiler import RunProfiler
+
+    tempos = RunProfiler()
+    segundos, linhas = {}, {}
+
+    t = time.perf_counter()
+    aoi = AOI(caminho, tempos=tempos)
+    aoi.wkb
+    segundos["aoi"] = time.perf_counter() - t
+    lote = CAMPO_AREA in aoi.gdf.columns
+
+    if lote:
+        if "lote" in etapas:
+            runner = backend.runner(aoi, layers, workers=workers, campo_id=CAMPO_AREA, tempos=tempos)
+            t = time.perf_counter()
+            resultados = list(runner.iter_lote())
+            segundos["lote"] = time.perf_counter() - t
+            linhas["lote"] = sum(sum(r.get("por_aoi", {}).values()) for r in resultados)
+        return segundos, linhas, tempos.relatorio()
+
+    runner = backend.runner(aoi, layers, workers=workers, tempos=tempos)
+    t = time.perf_counter()
+    resultados = list(runner.iter_resultados(amostras=False))
+    segundos["contagem"] = time.perf_counter() - t
+    linhas["contagem"] = sum(r.get("count", 0) for r in resultados)
+    # As camadas de tempo esgotado voltam ao final; o resultado é associado pelo nome
+    com_intersecao = {r["tabela"] for r in resultados if r.get("count", 0) > 0}
+    com_intersecao = [layer for layer in runner.layers if layer.nome in com_intersecao]
+
+    if "perfil" in etapas:
+        t = time.perf_counter()
+        for layer in com_intersecao:
+            runner.perfil_camada(conn, layer)
+        segundos["perfil"] = time.perf_counter() - t
+
+    for etapa, origem in (("exportacao", runner), ("exportacao_espacial", None)):
+        if etapa not in etapas:
+            continue
+        destino = os.path.join(diretorio, f"{etapa}.gpkg")
+        exporter = backend.exporter(aoi, runner=origem, workers=workers, tempos=tempos)
+        t = time.perf_counter()
+        relatorio = exporter.export_layers(com_intersecao, destino, log_func=lambda _: None)
+        segundos[etapa] = time.perf_counter() - t
+        linhas[etapa] = sum(r.get("gravadas", 0) for r in relatorio.values())
+        if os.path.exists(destino):
+            gravadas = [layer for layer in com_intersecao if relatorio.get(layer.nome, {}).get("gravadas")]
+            _verificar_dimensoes(destino, gravadas)
+            os.remove(destino)
+    return segundos, linhas, tempos.relatorio()
+
+
+def _verificar_dimensoes(destino: str, layers):
+    """
+    Confere que as camadas de 4 dimensões (ZM) foram gravadas sem M no
+    GeoPackage, isto é, convertidas para Z como o exportador promete.
+    """
+    import pyogrio
+
+    for layer in layers:
+        if layer.dim != 4:
+            continue
+        tipo = pyogrio.read_info(destino, layer=layer.nome)["geometry_type"] or ""
+        if tipo.upper().endswith("M"):
+            raise RuntimeError(f"Camada ZM '{layer.nome}' exportada com M ({tipo}); esperado apenas Z.")
+
+
+def comando_executar(args) -> int:
+    caminhos = _caminhos_aoi(args.aois)
+    if not caminhos:
+        log(f"[Erro] Nenhuma AOI encontrada em: {args.aois}")
+        return 2
+    etapas = list(args.etapas)
+    connector = conn = None
+    versao_pg = versao_postgis = None
+    try:
+        if args.fonte:
+            from core.spatial.local_engine import LocalBackend
+
+            backend = LocalBackend(args.fonte)
+            dataset = config_dos_arquivos(args.fonte)
+            if dataset is None:
+                log("[Aviso] As fontes não foram geradas pelo gerador de benchmarks.")
+        else:
+            from core.spatial.backend import PostGISBackend
+
+            connector, conn = _conectar(args, max(args.workers) + 1)
+            dataset = config_do_esquema(conn, args.schema)
+            if dataset is None:
+                log(f"[Aviso] O esquema '{args.schema}' não foi criado pelo gerador de benchmarks.")
+            with conn.cursor() as cur:
+                cur.execute("SELECT version(), postgis_full_version()")
+                versao_pg, versao_postgis = cur.fetchone()
+            conn.rollback()
+            backend = PostGISBackend(conn, args.schema, pool=connector, assincrono=args.assincrono)
+        layers = backend.listar_camadas()
+
+        casos = []
+        with tempfile.TemporaryDirectory(prefix="postintersect_bench_") as diretorio:
+            for caminho in caminhos:
+                for workers in args.workers:
+                    medidas: dict[str, list[float]] = {}
+                    linhas, detalhe = {}, {}
+                    for _ in range(max(1, args.repeticoes)):
+                        segundos, linhas, detalhe = _medir_caso(
+                            backend, conn, caminho, layers, workers, etapas, diretorio
+                        )
+                        for etapa, valor in segundos.items():
+                            medidas.setdefault(etapa, []).append(valor)
+                    for etapa, valores in medidas.items():
+                        if etapa not in etapas:
+                            continue
+                        casos.append({
+                            "aoi": os.path.basename(caminho),
+                            "workers": workers,
+                            "etapa": etapa,
+                            "segundos": valores,
+                            "min": min(valores),
+                            "mediana": statistics.median(valores),
+                            "linhas": linhas.get(etapa),
+                        })
+                        log(f"[OK] {os.path.basename(caminho)} | workers={workers} | {etapa}: "
+                            f"mediana {statistics.median(valores):.3f} s")
+                    casos.append({
+                        "aoi": os.path.basename(caminho), "workers": workers,
+                        "etapa": "detalhe", "perfil_execucao": detalhe["etapas"],
+                    })
+    finally:
+        if connector is not None:
+            connector.close()
+
+    resultado = {
+        "versao": 1,
+        "commit": _commit(),
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "postgres": versao_pg,
+        "postgis": versao_postgis,
+        "motor": backend.nome + ("-assincrono" if args.assincrono and not args.fonte else ""),
+        "schema": None if args.fonte else args.schema,
+        "fonte": args.fonte,
+        "dataset": dataset,
+        "camadas": len(layers),
+        "repeticoes": args.repeticoes,
+        "casos": casos,
+    }
+    saida = args.saida
+    if not saida:
+        diretorio = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+        os.makedirs(diretorio, exist_ok=True)
+        saida = os.path.join(diretorio, f"{time.strftime('%Y%m%d_%H%M%S')}_{resultado['commit'] or 'sem-git'}.json")
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    log(f"[Export] Resultado salvo em: {saida}")
+    return 0
+
+
+def comando_comparar(args) -> int:
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.novo, encoding="utf-8") as f:
+        novo = json.load(f)
+    if base.get("dataset") != novo.get("dataset"):
+        log("[Aviso] Os resultados foram medidos sobre esquemas sintéticos diferentes.")
+    motores = base.get("motor", "postgis"), novo.get("motor", "postgis")
+    if motores[0] != motores[1]:
+        log(f"[Info] Comparando motores diferentes: {motores[0]} × {motores[1]}.")
+
+    def indice(resultado):
+        return {
+            (c["aoi"], c["workers"], c["etapa"]): c
+            for c in resultado["casos"] if "mediana" in c
+        }
+
+    antes, depois = indice(base), indice(novo)
+    print(f"{'AOI':<24} {'workers':>7} {'etapa':<20} {base.get('commit') or 'base':>12} "
+          f"{novo.get('commit') or 'novo':>12} {'razão':>7}")
+    for chave in sorted(antes.keys() & depois.keys()):
+        a, d = antes[chave]["mediana"], depois[chave]["mediana"]
+        razao = d / a if a else float("nan")
+        print(f"{chave[0]:<24} {chave[1]:>7} {chave[2]:<20} {a:>11.3f}s {d:>11.3f}s {razao:>7.2f}")
+    for chave in sorted(antes.keys() ^ depois.keys()):
+        log(f"[Aviso] Caso presente em apenas um dos resultados: {chave}")
+    return 0
+
+
+def main(argv=None) -> int:
+    args = _argumentos(argv)
+    comandos = {"gerar": comando_gerar, "executar": comando_executar, "comparar": comando_comparar}
+    try:
+        return comandos[args.comando](args)
+    except KeyboardInterrupt:
+        return 130
+    except Exception as e:
+        log(f"[Erro] {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""
+Gerador de dados sintéticos para os benchmarks: cria em um banco PostgreSQL/PostGIS
+local um esquema com camadas espaciais de tamanho e complexidade configuráveis,
+e grava em disco AOIs (GeoJSON) de complexidade variada.
+
+As feições são geradas no próprio servidor (generate_series e funções PostGIS),
+com semente fixa (setseed), de modo que o mesmo ConfigDataset produz sempre o
+mesmo esquema. Cada camada alterna entre polígonos, linhas e pontos; frações
+configuráveis das camadas ficam sem índice GiST, com geometrias ZM ou em outro
+SRID, e uma fração das feições poligonais é inválida (gravata borboleta).
+
+O esquema recebe um comentário com a configuração usada. Um esquema existente
+só é substituído se tiver sido criado por este gerador.
+
+Para os benchmarks sem banco (motor local), gerar_arquivos grava as mesmas
+camadas em um GeoPackage, geradas com numpy/shapely a partir da mesma semente
+(as feições não são idênticas às do esquema, mas seguem a mesma distribuição).
+No arquivo, as camadas ZM ficam apenas com Z, e as camadas sem índice ficam
+sem o R-tree do GeoPackage.
+"""
+
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # o psycopg2 não é necessário para comparar resultados
+    from psycopg2.extensions import connection
+
+MARCADOR = "postintersect-benchmark"
+SRID = 4674
+SRID_ALTERNATIVO = 3857
+TIPOS = ("POLYGON", "LINESTRING", "POINT")
+CAMPO_AREA = "cod_area"
+
+
+@dataclass
+class ConfigDataset:
+    """
+    Parâmetros do esquema sintético.
+    """
+    schema: str = "bench_postintersect"
+    camadas: int = 20
+    linhas: int = 10_000
+    vertices: int = 32  # vértices por polígono ou linha
+    fracao_sem_indice: float = 0.2
+    fracao_zm: float = 0.1
+    fracao_outro_srid: float = 0.1
+    fracao_invalidas: float = 0.01  # das feições poligonais
+    extensao: tuple[float, float, float, float] = (-60.0, -25.0, -40.0, -5.0)
+    tamanho: float = 0.05  # tamanho típico de uma feição, em graus
+    semente: int = 42
+
+
+def _espalhado(i: int, fracao: float) -> bool:
+    """
+    Marca cerca de `fracao` das camadas, distribuídas ao longo da lista.
+    """
+    return int((i + 1) * fracao) > int(i * fracao)
+
+
+def descrever_camadas(config: ConfigDataset) -> list[dict]:
+    """
+    Características de cada camada do esquema (nome, tipo, SRID, ZM, índice).
+    """
+    camadas = []
+    for i in range(config.camadas):
+        tipo = TIPOS[i % len(TIPOS)]
+        zm = _espalhado(i, config.fracao_zm)
+        camadas.append({
+            "nome": f"camada_{i:03d}",
+            "tipo": tipo + ("ZM" if zm else ""),
+            "srid": SRID_ALTERNATIVO if _espalhado(i, config.fracao_outro_srid) else SRID,
+            "zm": zm,
+            "indice": not _espalhado(i, config.fracao_sem_indice),
+        })
+    return camadas
+
+
+def _expressao_centro(config: ConfigDataset) -> tuple[str, tuple]:
+    """
+    Expressão SQL de um ponto aleatório na extensão do esquema, e seus parâmetros.
+    """
+    xmin, ymin, xmax, ymax = config.extensao
+    sql = f"ST_SetSRID(ST_MakePoint(%s + random() * %s, %s + random() * %s), {SRID})"
+    return sql, (xmin, xmax - xmin, ymin, ymax - ymin)
+
+
+def _expressao_geometria(config: ConfigDataset, tipo: str) -> tuple[str, tuple]:
+    """
+    Expressão SQL que gera uma feição do tipo indicado a partir do ponto de
+    referência c.p, e seus parâmetros.
+    """
+    if tipo == "POINT":
+        return "c.p", ()
+    if tipo == "LINESTRING":
+        sql = "ST_Segmentize(ST_MakeLine(c.p, ST_Translate(c.p, (random() - 0.5) * %s, (random() - 0.5) * %s)), %s)"
+        return sql, (config.tamanho * 2, config.tamanho * 2, config.tamanho / max(1, config.vertices))
+    # Polígonos: buffer com ~vertices vértices, ou uma gravata borboleta inválida
+    sql = (
+        "CASE WHEN random() < %s THEN ST_MakePolygon(ST_MakeLine(ARRAY["
+        "c.p, ST_Translate(c.p, %s, %s), ST_Translate(c.p, %s, 0), ST_Translate(c.p, 0, %s), c.p]))"
+        " ELSE ST_Buffer(c.p, %s * (0.2 + random()), %s) END"
+    )
+    d = config.tamanho
+    return sql, (config.fracao_invalidas, d, d, d, d, d, max(1, config.vertices // 4))
+
+
+def _comentario(conn: "connection", schema: str) -> str | None:
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT obj_description(oid, 'pg_namespace') FROM pg_namespace WHERE nspname = %s",
+            (schema,)
+        )
+        linha = cur.fetchone()
+    if linha is None:
+        return None
+    return linha[0] or ""
+
+
+def config_do_esquema(conn: "connection", schema: str) -> dict | None:
+    """
+    Configuração gravada no comentário de um esquema gerado, ou None.
+    """
+    comentario = _comentario(conn, schema)
+    if not comentario or not comentario.startswith(MARCADOR):
+        return None
+    return json.loads(comentario[len(MARCADOR):])
+
+
+def gerar_esquema(conn: "connection", config: ConfigDataset, log_func=print) -> list[dict]:
+    """
+    Cria (ou recria) o esquema sintético. Levanta ValueError se já existir um
+    esquema com o mesmo nome que não foi criado pelo gerador.
+
+    Retorna a descrição das camadas criadas.
+    """
+    comentario = _comentario(conn, config.schema)
+    if comentario is not None and not comentario.startswith(MARCADOR):
+        raise ValueError(f"O esquema '{config.schema}' já existe e não foi criado pelo gerador de benchmarks.")
+
+    camadas = descrever_camadas(config)
+    schema_sql = '"' + config.schema.replace('"', '""') + '"'
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {schema_sql} CASCADE")
+        cur.execute(f"CREATE SCHEMA {schema_sql}")
+        cur.execute(
+            f"COMMENT ON SCHEMA {schema_sql} IS %s",
+            (MARCADOR + json.dumps(asdict(config)),)
+        )
+        conn.commit()
+
+        for i, camada in enumerate(camadas):
+            tabela = f'{schema_sql}."{camada["nome"]}"'
+            tipo_base = TIPOS[i % len(TIPOS)]
+            geometria, params = _expressao_geometria(config, tipo_base)
+            if camada["zm"]:
+                geometria = f"ST_Force4D({geometria})"
+            if camada["srid"] != SRID:
+                geometria = f"ST_Transform({geometria}, {camada['srid']})"
+
+            cur.execute("SELECT setseed(%s)", (((config.semente + i) % 1000) / 1000.0,))
+            cur.execute(f"""
+                CREATE TABLE {tabela} (
+                    id bigint PRIMARY KEY,
+                    classe text,
+                    valor double precision,
+                    nome text,
+                    geom geometry({camada['tipo']}, {camada['srid']})
+                )
+            """)
+            # c.p: ponto de referência da feição, usado pela expressão da geometria
+            centro, params_centro = _expressao_centro(config)
+            cur.execute(f"""
+                INSERT INTO {tabela} (id, classe, valor, nome, geom)
+                SELECT c.g, 'classe_' || (c.g % 7), round((random() * 1000)::numeric, 2), md5(c.g::text),
+                       {geometria}
+                FROM (SELECT g, {centro} AS p FROM generate_series(1, %s) g) c
+            """, params + params_centro + (config.linhas,))
+            if camada["indice"]:
+                cur.execute(f'CREATE INDEX ON {tabela} USING gist (geom)')
+            conn.commit()
+            cur.execute(f"ANALYZE {tabela}")
+            conn.commit()
+            log_func(f"[Info] {camada['nome']}: {config.linhas} feições {camada['tipo']} "
+                     f"(SRID {camada['srid']}{'' if camada['indice'] else ', sem índice'})")
+    return camadas
+
+
+def gerar_aois(diretorio: str, config: ConfigDataset, vertices: tuple[int, ...] = (4, 1_000, 50_000),
+               areas: int = 100) -> list[str]:
+    """
+    Grava em `diretorio` AOIs centradas na extensão do esquema:
+    - aoi_<n>v.geojson: um polígono em estrela com n vértices, para cada valor de `vertices`
+    - aoi_<areas>areas.geojson: `areas` quadrados identificados por CAMPO_AREA (modo em lote)
+
+    Retorna os caminhos gravados.
+    """
+    import geopandas as gpd
+    import numpy as np
+    import shapely
+
+    os.makedirs(diretorio, exist_ok=True)
+    rng = np.random.default_rng(config.semente)
+    xmin, ymin, xmax, ymax = config.extensao
+    cx, cy = (xmin + xmax) / 2, (ymin + ymax) / 2
+    raio = min(xmax - xmin, ymax - ymin) / 8
+    caminhos = []
+
+    for n in vertices:
+        n = max(3, n)
+        angulos = np.sort(rng.uniform(0, 2 * np.pi, n))
+        raios = raio * rng.uniform(0.6, 1.0, n)
+        pontos = np.column_stack([cx + raios * np.cos(angulos), cy + raios * np.sin(angulos)])
+        gdf = gpd.GeoDataFrame({"nome": [f"aoi_{n}v"]}, geometry=[shapely.Polygon(pontos)], crs=f"EPSG:{SRID}")
+        caminho = os.path.join(diretorio, f"aoi_{n}v.geojson")
+        gdf.to_file(caminho, driver="GeoJSON")
+        caminhos.append(caminho)
+
+    lado = int(np.ceil(np.sqrt(areas)))
+    passo = 2 * raio / lado
+    quadrados, codigos = [], []
+    for k in range(areas):
+        x0 = cx - raio + (k % lado) * passo
+        y0 = cy - raio + (k // lado) * passo
+        quadrados.append(shapely.box(x0, y0, x0 + passo * 0.9, y0 + passo * 0.9))
+        codigos.append(f"A{k:05d}")
+    gdf = gpd.GeoDataFrame({CAMPO_AREA: codigos}, geometry=quadrados, crs=f"EPSG:{SRID}")
+    caminho = os.path.join(diretorio, f"aoi_{areas}areas.geojson")
+    gdf.to_file(caminho, driver="GeoJSON")
+    caminhos.append(caminho)
+    return caminhos
+
+
+def _geometrias_locais(rng, config: ConfigDataset, tipo: str):
+    """
+    Geometrias de uma camada em EPSG:4674, no mesmo formato de _expressao_geometria.
+    """
+    import numpy as np
+    import shapely
+
+    xmin, ymin, xmax, ymax = config.extensao
+    n = config.linhas
+    x = xmin + rng.random(n) * (xmax - xmin)
+    y = ymin + rng.random(n) * (ymax - ymin)
+    d = config.tamanho
+    if tipo == "POINT":
+        return shapely.points(x, y)
+    if tipo == "LINESTRING":
+        fim = np.column_stack([x + (rng.random(n) - 0.5) * d * 2, y + (rng.random(n) - 0.5) * d * 2])
+        coords = np.stack([np.column_stack([x, y]), fim], axis=1)
+        return shapely.segmentize(shapely.linestrings(coords), d / max(1, config.vertices))
+    geometrias = shapely.buffer(shapely.points(x, y), d * (0.2 + rng.random(n)),
+                                quad_segs=max(1, config.vertices // 4))
+    invalidas = rng.random(n) < config.fracao_invalidas
+    if invalidas.any():
+        px, py = x[invalidas], y[invalidas]
+        gravatas = np.stack([
+            np.column_stack([px, py]), np.column_stack([px + d, py + d]),
+            np.column_stack([px + d, py]), np.column_stack([px, py + d]), np.column_stack([px, py]),
+        ], axis=1)
+        geometrias[invalidas] = shapely.polygons(gravatas)
+    return geometrias
+
+
+def gerar_arquivos(diretorio: str, config: ConfigDataset, log_func=print) -> str:
+    """
+    Grava as camadas do esquema sintético em <diretorio>/<schema>.gpkg, para o
+    motor local, e a configuração em <diretorio>/<schema>.json.
+
+    Retorna o caminho do GeoPackage.
+    """
+    import geopandas as gpd
+    import numpy as np
+    import shapely
+
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, f"{config.schema}.gpkg")
+    if os.path.exists(caminho):
+        os.remove(caminho)
+
+    for i, camada in enumerate(descrever_camadas(config)):
+        rng = np.random.default_rng(config.semente + i)
+        geometrias = _geometrias_locais(rng, config, TIPOS[i % len(TIPOS)])
+        if camada["zm"]:
+            geometrias = shapely.force_3d(geometrias, z=0.0)
+        ids = np.arange(1, config.linhas + 1)
+        gdf = gpd.GeoDataFrame({
+            "id": ids,
+            "classe": [f"classe_{g % 7}" for g in ids],
+            "valor": np.round(rng.random(config.linhas) * 1000, 2),
+            "nome": [hashlib.md5(str(g).encode()).hexdigest() for g in ids],
+        }, geometry=geometrias, crs=f"EPSG:{SRID}")
+        if camada["srid"] != SRID:
+            gdf = gdf.to_crs(epsg=camada["srid"])
+        gdf.to_file(caminho, layer=camada["nome"], driver="GPKG",
+                    SPATIAL_INDEX="YES" if camada["indice"] else "NO")
+        log_func(f"[Info] {camada['nome']}: {config.linhas} feições {camada['tipo']} "
+                 f"(SRID {camada['srid']}{'' if camada['indice'] else ', sem índice'})")
+
+    with open(os.path.join(diretorio, f"{config.schema}.json"), "w", encoding="utf-8") as f:
+        json.dump(asdict(config), f, ensure_ascii=False, indent=2)
+    return caminho
+
+
+def config_dos_arquivos(fontes: list[str]) -> dict | None:
+    """
+    Configuração gravada por gerar_arquivos ao lado do primeiro GeoPackage das
+    fontes, ou None.
+    """
+    for fonte in fontes:
+        candidatos = [fonte] if not os.path.isdir(fonte) else sorted(
+            os.path.join(fonte, nome) for nome in os.listdir(fonte) if nome.endswith(".gpkg")
+        )
+        for caminho in candidatos:
+            config = os.path.splitext(caminho)[0] + ".json"
+            if os.path.exists(config):
+                with open(config, encoding="utf-8") as f:
+                    return json.load(f)
+    return None
@@ -0,0 +1,425 @@
+"""
+Ponto de entrada de linha de comando, sem interface gráfica: executa o
+diagnóstico (interseção da AOI com as camadas de um esquema) e as exportações
+usando apenas o pacote core, sem importar o PyQt6. Pensado para servidores e
+agendamentos (cron).
+
+Uso:
+    python cli.py run --aoi area.geojson --schema meu_esquema \\
+        --credenciais banco.json --csv diagnostico.csv --gpkg resultado.gpkg
+
+Modo em lote (várias áreas na AOI, identificadas por um campo):
+    python cli.py run --aoi imoveis.geojson --campo-id cod_imovel --schema meu_esquema \\
+        --csv diagnostico.csv --gpkg-por-aoi saida/
+
+Sem --credenciais, a conexão usa as variáveis de ambiente da libpq
+(PGHOST, PGPORT, PGDATABASE, PGUSER, PGPASSWORD).
+
+Sem banco, sobre arquivos GeoPackage/Shapefile (motor local, STRtree em memória):
+    python cli.py run --aoi area.geojson --fonte camadas.gpkg dados/ --csv diagnostico.csv
+
+As mensagens de andamento vão para stderr (e, com --log-jsonl, também para um
+arquivo JSON lines); ao final, um resumo em JSON é escrito em stdout (e,
+opcionalmente, em arquivo com --resumo).
+
+Códigos de saída:
+    0  sucesso
+    1  concluído com erros em alguma camada ou exportação
+    2  argumentos ou credenciais inválidos
+    3  falha de conexão com o banco
+    4  falha na execução
+    130  execução cancelada (Ctrl+C ou SIGTERM)
+"""
+
+import argparse
+import json
+import signal
+import sys
+import time
+
+from utils.logger import Logger
+
+SAIDA_OK = 0
+SAIDA_PARCIAL = 1
+SAIDA_ARGUMENTOS = 2
+SAIDA_CONEXAO = 3
+SAIDA_EXECUCAO = 4
+SAIDA_CANCELADO = 130
+
+
+_logger = Logger(console=sys.stderr)
+
+
+def log(mensagem: str):
+    _logger.log(mensagem)
+
+
+def _argumentos(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="postintersect",
+        description="Diagnóstico espacial de uma AOI contra as camadas PostGIS de um esquema "
+                    "ou de arquivos GeoPackage/Shapefile."
+    )
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    run = comandos.add_parser("run", help="executa as interseções e as exportações")
+    run.add_argument("--aoi", required=True, help="arquivo GeoJSON da área de interesse")
+    run.add_argument("--schema", help="esquema com as camadas espaciais")
+    run.add_argument("--fonte", nargs="+", metavar="CAMINHO",
+                     help="em vez de --schema: arquivos GeoPackage/Shapefile (ou diretórios com eles), "
+                          "processados localmente, sem banco")
+    run.add_argument("--credenciais", help="arquivo JSON com host, port, dbname, user e password "
+                                           "(padrão: variáveis de ambiente PG*)")
+    run.add_argument("--tabelas", nargs="+", help="camadas a consultar (padrão: todas do esquema ou das fontes)")
+    run.add_argument("--csv", help="caminho do diagnóstico CSV")
+    run.add_argument("--gpkg", help="caminho do GeoPackage com as feições encontradas")
+    run.add_argument("--workers", type=int, default=4,
+                     help="conexões (ou, com --fonte, camadas) simultâneas (padrão: 4)")
+    run.add_argument("--assincrono", action="store_true",
+                     help="executa as consultas com asyncio (psycopg 3); --workers passa a ser o número "
+                          "de conexões assíncronas")
+    run.add_argument("--timeout-consulta", type=float, metavar="SEGUNDOS",
+                     help="tempo máximo de cada consulta de uma camada; a consulta é cancelada e a "
+                          "camada marcada com tempo esgotado")
+    run.add_argument("--nova-tentativa", choices=("ampliada", "estimativa"),
+                     help="com --timeout-consulta, ao final repete as camadas de tempo esgotado com um limite "
+                          "maior (ampliada) ou usa a estimativa do planejador (estimativa; não no modo em lote)")
+    run.add_argument("--fator-nova-tentativa", type=float, default=10.0, metavar="N",
+                     help="multiplicador do limite na nova tentativa ampliada (padrão: 10)")
+    run.add_argument("--criar-indices", action="store_true",
+                     help="cria índices GiST nas camadas que não os possuem")
+    run.add_argument("--max-vertices", type=int, default=0,
+                     help="subdivide a AOI em pedaços de até N vértices (0 desativa)")
+    run.add_argument("--sem-cache", action="store_true", help="não usa o cache de resultados")
+    run.add_argument("--reparar", action="store_true",
+                     help="corrige geometrias inválidas na exportação em vez de descartá-las")
+    run.add_argument("--resumo", help="grava também o resumo JSON neste arquivo")
+    run.add_argument("--perfil-execucao", metavar="ARQUIVO",
+                     help="grava o perfil de tempos da execução (por etapa e por camada) em JSON, "
+                          "ou em HTML se o arquivo terminar em .html")
+    run.add_argument("--explain", type=int, default=0, metavar="N",
+                     help="com --perfil-execucao, inclui o EXPLAIN (ANALYZE, BUFFERS) das N camadas mais lentas")
+    run.add_argument("--log-jsonl", help="anexa as mensagens de andamento, uma por linha JSON, neste arquivo")
+    run.add_argument("--campo-id", help="modo em lote: campo da AOI que identifica cada área")
+    run.add_argument("--gpkg-por-aoi", metavar="DIRETORIO",
+                     help="modo em lote: grava um GeoPackage por área neste diretório")
+    run.add_argument("--incluir-zeros", action="store_true",
+                     help="modo em lote: inclui no CSV os pares área/camada sem interseção")
+
+    return parser.parse_args(argv)
+
+
+def _credenciais(args) -> dict:
+    from core.db.connector import carregar_credenciais, credenciais_do_ambiente
+
+    if args.credenciais:
+        return carregar_credenciais(args.credenciais)
+    config = credenciais_do_ambiente()
+    if "dbname" not in config:
+        raise ValueError("Informe --credenciais ou defina ao menos PGDATABASE no ambiente.")
+    return config
+
+
+def executar(args) -> tuple[int, dict]:
+    """
+    Executa o comando 'run'. Retorna (código de saída, resumo).
+    """
+    from core.exporter.csv_exporter import CSVExporter
+    from core.spatial.aoi import AOI
+    from utils.run_profiler import RunProfiler
+
+    inicio = time.monotonic()
+    resumo = {"status": "erro", "schema": args.schema, "fonte": args.fonte, "aoi": args.aoi}
+
+    if (args.schema is None) == (args.fonte is None):
+        log("[Erro] Informe --schema ou --fonte (apenas um deles).")
+        resumo["erro"] = "informe --schema ou --fonte"
+        return SAIDA_ARGUMENTOS, resumo
+    if args.campo_id is None and (args.gpkg_por_aoi or args.incluir_zeros):
+        log("[Erro] --gpkg-por-aoi e --incluir-zeros exigem --campo-id.")
+        resumo["erro"] = "argumentos do modo em lote sem --campo-id"
+        return SAIDA_ARGUMENTOS, resumo
+    if args.campo_id is not None and args.gpkg:
+        log("[Erro] No modo em lote, use --gpkg-por-aoi em vez de --gpkg.")
+        resumo["erro"] = "--gpkg no modo em lote"
+        return SAIDA_ARGUMENTOS, resumo
+    if args.explain and not args.perfil_execucao:
+        log("[Erro] --explain exige --perfil-execucao.")
+        resumo["erro"] = "--explain sem --perfil-execucao"
+        return SAIDA_ARGUMENTOS, resumo
+    if args.nova_tentativa and args.timeout_consulta is None:
+        log("[Erro] --nova-tentativa exige --timeout-consulta.")
+        resumo["erro"] = "--nova-tentativa sem --timeout-consulta"
+        return SAIDA_ARGUMENTOS, resumo
+    if args.nova_tentativa == "estimativa" and args.campo_id is not None:
+        log("[Erro] --nova-tentativa estimativa não se aplica ao modo em lote (--campo-id).")
+        resumo["erro"] = "--nova-tentativa estimativa com --campo-id"
+        return SAIDA_ARGUMENTOS, resumo
+    if args.timeout_consulta is not None and args.fonte:
+        log("[Erro] --timeout-consulta não se aplica ao motor local (--fonte).")
+        resumo["erro"] = "--timeout-consulta com --fonte"
+        return SAIDA_ARGUMENTOS, resumo
+    if args.assincrono and args.fonte:
+        log("[Erro] --assincrono não se aplica ao motor local (--fonte).")
+        resumo["erro"] = "--assincrono com --fonte"
+        return SAIDA_ARGUMENTOS, resumo
+    if args.explain and args.fonte:
+        log("[Erro] --explain não se aplica ao motor local (--fonte).")
+        resumo["erro"] = "--explain com --fonte"
+        return SAIDA_ARGUMENTOS, resumo
+
+    workers = max(1, args.workers)
+    connector = None
+    cache_resultados = None
+    if args.fonte:
+        from core.spatial.local_engine import LocalBackend
+
+        backend = LocalBackend(args.fonte)
+    else:
+        from core.db.catalog_cache import CatalogCache
+        from core.db.connector import PostgresConnector
+        from core.spatial.backend import PostGISBackend
+        from core.spatial.result_cache import ResultCache
+
+        try:
+            config = _credenciais(args)
+        except Exception as e:
+            log(f"[Erro] Credenciais inválidas: {e}")
+            resumo["erro"] = str(e)
+            return SAIDA_ARGUMENTOS, resumo
+
+        connector = PostgresConnector(config, max_size=workers)
+        try:
+            conn = connector.connect()
+        except Exception as e:
+            log(f"[Erro] Falha na conexão: {e}")
+            resumo["erro"] = str(e)
+            return SAIDA_CONEXAO, resumo
+
+        # O modo em lote não usa o cache de resultados
+        if not args.sem_cache and args.campo_id is None:
+            try:
+                cache_resultados = ResultCache()
+            except Exception as e:
+                log(f"[Aviso] Cache de resultados indisponível: {e}")
+
+        backend = PostGISBackend(
+            conn, args.schema, pool=connector, catalogo=CatalogCache(config),
+            max_vertices=args.max_vertices or None, criar_indices=args.criar_indices,
+            cache_resultados=cache_resultados, assincrono=args.assincrono,
+            timeout_consulta=args.timeout_consulta, nova_tentativa=args.nova_tentativa,
+            fator_nova_tentativa=args.fator_nova_tentativa
+        )
+
+    runner = None
+    tempos = RunProfiler(ativo=bool(args.perfil_execucao))
+
+    def interromper(*_):
+        log("[Aviso] Cancelamento solicitado.")
+        if runner is not None:
+            runner.cancel()
+
+    signal.signal(signal.SIGTERM, interromper)
+
+    try:
+        layers = backend.listar_camadas()
+        origem = f"no esquema '{args.schema}'" if args.schema else "nas fontes"
+        if args.tabelas:
+            pedidas = set(args.tabelas)
+            desconhecidas = pedidas - {layer.nome for layer in layers}
+            if desconhecidas:
+                raise ValueError(f"Camadas inexistentes {origem}: {sorted(desconhecidas)}")
+            layers = [layer for layer in layers if layer.nome in pedidas]
+        log(f"[Info] {len(layers)} camadas espaciais {origem}.")
+
+        aoi = AOI(args.aoi, tempos=tempos)
+        if args.campo_id is not None:
+            return _executar_lote(args, backend, aoi, layers, resumo)
+
+        runner = backend.runner(aoi, layers, workers=workers, tempos=tempos)
+
+        resultados = []
+        try:
+            for r in runner.iter_resultados(amostras=False):
+                resultados.append(r)
+                if "erro" in r:
+                    log(f"[Erro] {r['tabela']}: {r['erro']}")
+                elif r.get("estimado"):
+                    log(f"[Aviso] {r['tabela']}: tempo esgotado, ~{r['count']} feições (estimativa do planejador)")
+                else:
+                    log(f"[OK] {r['tabela']}: {r['count']} feições")
+        except KeyboardInterrupt:
+            runner.cancel()
+
+        resumo["resultados"] = resultados
+        resumo["camadas"] = len(layers)
+        resumo["com_intersecao"] = sum(1 for r in resultados if r.get("count", 0) > 0)
+        resumo["erros"] = [r["tabela"] for r in resultados if "erro" in r]
+        _relatar_esgotadas(resultados, resumo)
+
+        if runner.cancelado:
+            log(f"[Interseção] Execução cancelada após {len(resultados)} camadas.")
+            resumo["status"] = "cancelado"
+            return SAIDA_CANCELADO, resumo
+
+        log(f"[Interseção] {resumo['com_intersecao']} camadas com interseção encontrada.")
+        _explicar(args, runner)
+
+        if args.csv:
+            CSVExporter.export(resultados, args.csv, tempos=tempos)
+            log(f"[Export] Diagnóstico salvo em: {args.csv}")
+            resumo["csv"] = args.csv
+
+        if args.gpkg:
+            com_intersecao = {r["tabela"] for r in resultados if r.get("count", 0) > 0}
+            exporter = backend.exporter(aoi, runner=runner, workers=workers, reparar=args.reparar, tempos=tempos)
+            relatorio = exporter.export_layers(
+                [layer for layer in layers if layer.nome in com_intersecao],
+                args.gpkg, log_func=log, aoi_path=args.aoi
+            )
+            resumo["gpkg"] = args.gpkg
+            resumo["exportacao"] = relatorio
+            resumo["erros"] += [nome for nome, r in relatorio.items() if "erro" in r]
+
+        resumo["status"] = "parcial" if resumo["erros"] else "ok"
+        return (SAIDA_PARCIAL if resumo["erros"] else SAIDA_OK), resumo
+
+    except KeyboardInterrupt:
+        if runner is not None:
+            runner.cancel()
+        resumo["status"] = "cancelado"
+        return SAIDA_CANCELADO, resumo
+    except ValueError as e:
+        log(f"[Erro] {e}")
+        resumo["erro"] = str(e)
+        return SAIDA_ARGUMENTOS, resumo
+    except Exception as e:
+        log(f"[Erro] Falha na execução: {e}")
+        resumo["erro"] = str(e)
+        return SAIDA_EXECUCAO, resumo
+    finally:
+        resumo["duracao_s"] = round(time.monotonic() - inicio, 3)
+        if args.perfil_execucao:
+            try:
+                tempos.salvar(args.perfil_execucao)
+                log(f"[Export] Perfil da execução salvo em: {args.perfil_execucao}")
+                resumo["perfil_execucao"] = args.perfil_execucao
+            except OSError as e:
+                log(f"[Aviso] Falha ao gravar o perfil da execução: {e}")
+        if cache_resultados is not None:
+            cache_resultados.close()
+        if connector is not None:
+            connector.close()
+
+
+def _relatar_esgotadas(resultados: list[dict], resumo: dict):
+    """
+    Registra no resumo as camadas cuja consulta excedeu o tempo limite e sugere
+    a indexação das que não têm índice espacial.
+    """
+    esgotadas = [r for r in resultados if r.get("tempo_esgotado")]
+    if not esgotadas:
+        return
+    resumo["tempo_esgotado"] = [r["tabela"] for r in esgotadas]
+    log(f"[Aviso] {len(esgotadas)} camadas excederam o tempo limite: "
+        f"{', '.join(resumo['tempo_esgotado'])}.")
+    sem_indice = [r["tabela"] for r in esgotadas if r.get("sem_indice")]
+    if sem_indice:
+        log(f"[Aviso] Sem índice espacial (considere --criar-indices): {', '.join(sem_indice)}.")
+
+
+def _explicar(args, runner):
+    """
+    Captura o EXPLAIN (ANALYZE, BUFFERS) das camadas mais lentas, se pedido.
+    """
+    if args.explain > 0:
+        log(f"[Info] Capturando o plano das {args.explain} camadas mais lentas...")
+        runner.explicar_mais_lentas(args.explain)
+
+
+def _executar_lote(args, backend, aoi, layers, resumo) -> tuple[int, dict]:
+    """
+    Modo em lote: uma consulta agrupada por área para cada camada, diagnóstico
+    em formato longo e, opcionalmente, um GeoPackage por área.
+    """
+    from core.exporter.csv_exporter import CSVExporter
+
+    workers = max(1, args.workers)
+    aoi_ids = aoi.ids(args.campo_id)
+    log(f"[Info] Modo em lote: {len(aoi_ids)} áreas no campo '{args.campo_id}'.")
+
+    runner = backend.runner(aoi, layers, workers=workers, campo_id=args.campo_id, tempos=aoi.tempos)
+    signal.signal(signal.SIGTERM, lambda *_: runner.cancel())
+
+    resultados = []
+    try:
+        for r in runner.iter_lote():
+            resultados.append(r)
+            if "erro" in r:
+                log(f"[Erro] {r['tabela']}: {r['erro']}")
+            else:
+                log(f"[OK] {r['tabela']}: interseção com {len(r['por_aoi'])} áreas")
+    except KeyboardInterrupt:
+        runner.cancel()
+
+    resumo["areas"] = len(aoi_ids)
+    resumo["camadas"] = len(layers)
+    resumo["resultados"] = resultados
+    resumo["erros"] = [r["tabela"] for r in resultados if "erro" in r]
+    _relatar_esgotadas(resultados, resumo)
+
+    if runner.cancelado:
+        log(f"[Interseção] Execução cancelada após {len(resultados)} camadas.")
+        resumo["status"] = "cancelado"
+        return SAIDA_CANCELADO, resumo
+
+    _explicar(args, runner)
+
+    if args.csv:
+        CSVExporter.export_lote(resultados, args.csv, aoi_ids if args.incluir_zeros else None, tempos=aoi.tempos)
+        log(f"[Export] Diagnóstico salvo em: {args.csv}")
+        resumo["csv"] = args.csv
+
+    if args.gpkg_por_aoi:
+        relatorios = backend.exportar_por_aoi(
+            aoi, args.campo_id, resultados, layers, args.gpkg_por_aoi,
+            log_func=log, workers=workers, reparar=args.reparar, tempos=aoi.tempos
+        )
+        resumo["gpkg_por_aoi"] = args.gpkg_por_aoi
+        resumo["exportacao"] = relatorios
+        resumo["erros"] += [
+            f"{aoi_id}/{nome}"
+            for aoi_id, relatorio in relatorios.items()
+            for nome, r in relatorio.items() if "erro" in r
+        ]
+
+    resumo["status"] = "parcial" if resumo["erros"] else "ok"
+    return (SAIDA_PARCIAL if resumo["erros"] else SAIDA_OK), resumo
+
+
+def main(argv=None) -> int:
+    global _logger
+    args = _argumentos(argv)
+    if args.log_jsonl:
+        try:
+            _logger = Logger(console=sys.stderr, arquivo_jsonl=args.log_jsonl)
+        except OSError as e:
+            log(f"[Erro] Falha ao abrir o log JSON lines: {e}")
+            return SAIDA_ARGUMENTOS
+    codigo, resumo = executar(args)
+    resumo["codigo"] = codigo
+
+    texto = json.dumps(resumo, ensure_ascii=False, default=str)
+    print(texto)
+    if args.resumo:
+        try:
+            with open(args.resumo, "w", encoding="utf-8") as f:
+                f.write(texto)
+        except OSError as e:
+            log(f"[Erro] Falha ao gravar o resumo: {e}")
+    _logger.close()
+    return codigo
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Este módulo define a classe CatalogCache, um cache em disco do catálogo do banco,
+usado junto com o SchemaManager para que reconectar a um banco conhecido não
+exija consultar novamente information_schema e geometry_columns.
+
+São armazenados, por banco (host, porta, banco e usuário):
+- Lista de esquemas (validade por tempo)
+- Descritores de camada por esquema
+- Colunas não geométricas por tabela
+- Estimativa de linhas e extensão por camada
+
+A validade das entradas combina um TTL com marcadores de alteração baratos de
+consultar: para as camadas e colunas de um esquema, um hash de pg_class (tabelas
+criadas, removidas, reescritas ou com colunas alteradas); para estimativas e
+extensões, o total de inserções/atualizações/exclusões em pg_stat_user_tables.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import asdict
+
+from psycopg2.extensions import connection
+
+from core.db.schema_manager import Layer, SchemaManager
+
+DIRETORIO_PADRAO = os.path.join(os.path.expanduser("~"), ".postintersect", "cache")
+
+
+class CatalogCache:
+    def __init__(self, config: dict, ttl: float = 24 * 3600, diretorio: str = DIRETORIO_PADRAO):
+        """
+        Parâmetros:
+        - config: credenciais da conexão (usadas apenas para identificar o banco)
+        - ttl: validade máxima das entradas, em segundos
+        - diretorio: pasta onde os arquivos de cache são gravados
+        """
+        chave = f"{config.get('host')}:{config.get('port')}:{config.get('dbname')}:{config.get('user')}"
+        self.chave = hashlib.sha256(chave.encode("utf-8")).hexdigest()[:16]
+        self.ttl = ttl
+        self.path = os.path.join(diretorio, f"catalogo_{self.chave}.json")
+        self._lock = threading.RLock()
+        self._dados = self._carregar()
+
+    # ------------------------------------------------------------------
+    # Persistência
+    # ------------------------------------------------------------------
+
+    def _carregar(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def salvar(self):
+        """
+        Grava o cache em disco de forma atômica (arquivo temporário + rename).
+        """
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temporario = f"{self.path}.tmp"
+            with open(temporario, "w", encoding="utf-8") as f:
+                json.dump(self._dados, f, ensure_ascii=False)
+            os.replace(temporario, self.path)
+
+    def invalidar(self, schema: str | None = None):
+        """
+        Descarta o cache inteiro ou apenas as entradas de um esquema.
+        """
+        with self._lock:
+            if schema is None:
+                self._dados = {}
+            else:
+                for secao in ("layers", "colunas", "linhas"):
+                    self._dados.get(secao, {}).pop(schema, None)
+                extensoes = self._dados.get("extensoes", {})
+                for chave in [c for c in extensoes if c.startswith(f"{schema}.")]:
+                    del extensoes[chave]
+            self.salvar()
+
+    def _entrada(self, secao: str, chave: str, marcador=None):
+        """
+        Retorna o valor em cache se ainda estiver dentro do TTL e o marcador
+        de alteração coincidir; caso contrário, None.
+        """
+        with self._lock:
+            entrada = self._dados.get(secao, {}).get(chave)
+        if entrada is None or time.time() - entrada["t"] > self.ttl:
+            return None
+        if marcador is not None and entrada.get("marcador") != marcador:
+            return None
+        return entrada["valor"]
+
+    def _guardar(self, secao: str, chave: str, valor, marcador=None, salvar: bool = True):
+        with self._lock:
+            self._dados.setdefault(secao, {})[chave] = {
+                "t": time.time(), "marcador": marcador, "valor": valor
+            }
+            if salvar:
+                self.salvar()
+
+    # ------------------------------------------------------------------
+    # Marcadores de alteração
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def marcador_esquema(conn: connection, schema: str) -> str:
+        """
+        Hash da estrutura das tabelas do esquema em pg_class: muda quando tabelas
+        são criadas, removidas, reescritas ou têm colunas adicionadas/removidas.
+        """
+        query = """
+            SELECT md5(COALESCE(string_agg(
+                c.oid::text || ':' || c.relfilenode::text || ':' || c.relnatts::text,
+                ',' ORDER BY c.oid), ''))
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = %s
+            AND c.relkind IN ('r', 'v', 'm', 'p', 'f');
+        """
+        with conn.cursor() as cur:
+            cur.execute(query, (schema,))
+            return cur.fetchone()[0]
+
+    @staticmethod
+    def marcadores_tabelas(conn: connection, schema: str) -> dict[str, str]:
+        """
+        Marcador de alteração de dados por tabela do esquema, a partir dos
+        contadores de inserções, atualizações e exclusões de pg_stat_user_tables
+        e do relfilenode (que muda em TRUNCATE e reescritas da tabela).
+        """
+        query = """
+            SELECT s.relname,
+                   s.relid::text || ':' || c.relfilenode::text || ':'
+                   || (s.n_tup_ins + s.n_tup_upd + s.n_tup_del)::text
+            FROM pg_stat_user_tables s
+            JOIN pg_class c ON c.oid = s.relid
+            WHERE s.schemaname = %s;
+        """
+        with conn.cursor() as cur:
+            cur.execute(query, (schema,))
+            return {row[0]: row[1] for row in cur.fetchall()}
+
+    # ------------------------------------------------------------------
+    # Catálogo
+    # ------------------------------------------------------------------
+
+    def list_schemas(self, conn: connection) -> list[str]:
+        """
+        Lista os esquemas do banco (cache válido pelo TTL).
+        """
+        esquemas = self._entrada("schemas", "*")
+        if esquemas is None:
+            esquemas = SchemaManager(conn).list_schemas()
+            self._guardar("schemas", "*", esquemas)
+        return esquemas
+
+    def list_layers(self, conn: connection, schema: str) -> list[Layer]:
+        """
+        Lista as camadas do esquema, consultando geometry_columns apenas se a
+        estrutura do esquema mudou desde a última consulta.
+        """
+        marcador = self.marcador_esquema(conn, schema)
+        camadas = self._entrada("layers", schema, marcador)
+        if camadas is None:
+            layers = SchemaManager(conn).list_layers(schema)
+            self._guardar("layers", schema, [asdict(l) for l in layers], marcador)
+            return layers
+        return [Layer(**c) for c in camadas]
+
+    def colunas(self, conn: connection, schema: str) -> dict[str, list[str]]:
+        """
+        Colunas não geométricas de cada tabela do esquema, em ordem de posição.
+        """
+        marcador = self.marcador_esquema(conn, schema)
+        colunas = self._entrada("colunas", schema, marcador)
+        if colunas is None:
+            colunas = SchemaManager(conn).list_columns(schema)
+            self._guardar("colunas", schema, colunas, marcador)
+        return colunas
+
+    def estimativas_linhas(self, conn: connection, schema: str) -> dict[str, int]:
+        """
+        Estimativa do número de linhas por tabela (pg_class.reltuples), sem COUNT(*).
+        Tabelas nunca analisadas aparecem com -1.
+        """
+        marcadores = self.marcadores_tabelas(conn, schema)
+        marcador = hashlib.md5(json.dumps(marcadores, sort_keys=True).encode("utf-8")).hexdigest()
+        estimativas = self._entrada("linhas", schema, marcador)
+        if estimativas is None:
+            query = """
+                SELECT c.relname, c.reltuples::bigint
+                FROM pg_class c
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE n.nspname = %s
+                AND c.relkind IN ('r', 'm', 'p');
+            """
+            with conn.cursor() as cur:
+                cur.execute(query, (schema,))
+                estimativas = {row[0]: row[1] for row in cur.fetchall()}
+            self._guardar("linhas", schema, estimativas, marcador)
+        return estimativas
+
+    @staticmethod
+    def _chave_layer(layer: Layer) -> str:
+        return f"{layer.schema}.{layer.table}.{layer.geom_col}"
+
+    def extensao(self, layer: Layer, marcador: str | None):
+        """
+        Extensão exata em cache para a camada, ou None. O segundo valor
+        indica se havia entrada válida (a extensão de uma camada vazia é None).
+        """
+        if marcador is None:
+            return None, False
+        with self._lock:
+            entrada = self._dados.get("extensoes", {}).get(self._chave_layer(layer))
+        if entrada is None or entrada.get("marcador") != marcador \
+                or time.time() - entrada["t"] > self.ttl:
+            return None, False
+        valor = entrada["valor"]
+        return (tuple(valor) if valor is not None else None), True
+
+    def guardar_extensao(self, layer: Layer, marcador: str | None, extensao, salvar: bool = True):
+        if marcador is None:
+            return
+        self._guardar(
+            "extensoes", self._chave_layer(layer),
+            list(extensao) if extensao is not None else None, marcador, salvar
+        )
@@ -1,26 +1,331 @@
+"""
+Este módulo define a classe PostgresConnector, que gerencia as conexões com o
+banco PostgreSQL/PostGIS.
+
+Além da conexão principal (connect), o conector mantém um pool de conexões
+reutilizáveis, para que interseções e exportações simultâneas compartilhem
+conexões já abertas em vez de pagar o custo de conexão/autenticação a cada uso:
+
+- Tamanho mínimo e máximo do pool
+- TCP keepalive, para detectar sockets derrubados (VPN, firewall)
+- Verificação de saúde na retirada e reconexão transparente
+- Descarte de conexões ociosas além do tamanho mínimo
+- Parâmetros de sessão (statement_timeout, work_mem, application_name)
+
+Conexões assíncronas (psycopg 3, opcional) com os mesmos parâmetros são abertas
+por conectar_async, para o AsyncIntersectionRunner.
+
+Também lê as credenciais do arquivo JSON usado pela interface ou das variáveis
+de ambiente padrão da libpq (PGHOST, PGPORT, PGDATABASE, PGUSER, PGPASSWORD).
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
-from psycopg2.extensions import connection as _connection
+from psycopg2.extensions import (
+    connection as _connection, TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+)
+
+
+CAMPOS_CREDENCIAIS = ("host", "port", "dbname", "user", "password")
+
+# Variáveis de ambiente da libpq correspondentes a cada campo
+VARIAVEIS_AMBIENTE = {
+    "host": "PGHOST",
+    "port": "PGPORT",
+    "dbname": "PGDATABASE",
+    "user": "PGUSER",
+    "password": "PGPASSWORD",
+}
+
+
+def carregar_credenciais(caminho: str) -> dict:
+    """
+    Lê as credenciais de um arquivo JSON com os campos host, port, dbname,
+    user e password. Levanta ValueError se algum campo estiver ausente.
+    """
+    with open(caminho, "r", encoding="utf-8") as f:
+        dados = json.load(f)
+
+    for campo in CAMPOS_CREDENCIAIS:
+        if campo not in dados:
+            raise ValueError(f"Campo ausente: {campo}")
+    return {campo: dados[campo] for campo in CAMPOS_CREDENCIAIS}
+
+
+def credenciais_do_ambiente() -> dict:
+    """
+    Monta as credenciais a partir das variáveis de ambiente da libpq.
+    Campos não definidos são omitidos (a libpq usa seus padrões, como o .pgpass).
+    """
+    return {
+        campo: os.environ[variavel]
+        for campo, variavel in VARIAVEIS_AMBIENTE.items()
+        if os.environ.get(variavel)
+    }
+
+
+class PoolExhaustedError(Exception):
+    """
+    Levantada quando nenhuma conexão fica livre dentro do tempo de espera.
+    """
 
 
 class PostgresConnector:
-    def __init__(self, config: dict):
+    # Parâmetros de keepalive da libpq (segundos)
+    KEEPALIVE = {
+        "keepalives": 1,
+        "keepalives_idle": 30,
+        "keepalives_interval": 10,
+        "keepalives_count": 5,
+    }
+
+    def __init__(self, config: dict, min_size: int = 1, max_size: int = 8,
+                 session_settings: dict | None = None, application_name: str = "PostIntersect",
+                 keepalive: bool = True, idle_timeout: float = 300.0, health_check_after: float = 30.0):
         """
         Inicializa o conector com as credenciais necessárias.
         Espera um dicionário com as chaves:
         host, port, dbname, user, password
+
+        Parâmetros do pool:
+        - min_size / max_size: limites de conexões abertas no pool
+        - session_settings: parâmetros de sessão, ex: {"statement_timeout": "5min", "work_mem": "64MB"}
+        - application_name: nome exibido em pg_stat_activity
+        - keepalive: ativa o TCP keepalive da libpq
+        - idle_timeout: segundos até fechar conexões ociosas além de min_size
+        - health_check_after: conexões ociosas há mais tempo que isso são testadas
+          com SELECT 1 antes de serem entregues
         """
         self.config = config
         self.conn: _connection | None = None
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.session_settings = dict(session_settings or {})
+        self.application_name = application_name
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+
+        self._livres: list[tuple[_connection, float]] = []  # (conexão, instante em que foi liberada)
+        self._em_uso: set[_connection] = set()
+        self._cond = threading.Condition()
+
+    def _parametros(self) -> dict:
+        """
+        Monta os parâmetros de conexão, incluindo keepalive, application_name
+        e os parâmetros de sessão (enviados no handshake via 'options').
+        """
+        params = dict(self.config)
+        if self.keepalive:
+            for chave, valor in self.KEEPALIVE.items():
+                params.setdefault(chave, valor)
+        if self.application_name:
+            params.setdefault("application_name", self.application_name)
+        if self.session_settings:
+            opcoes = " ".join(
+                f"-c {nome}={str(valor).replace(' ', '')}"
+                for nome, valor in self.session_settings.items()
+            )
+            params["options"] = f"{params.get('options', '')} {opcoes}".strip()
+        return params
+
+    def _nova_conexao(self) -> _connection:
+        return psycopg2.connect(**self._parametros())
+
+    async def conectar_async(self, autocommit: bool = True):
+        """
+        Abre uma conexão assíncrona do psycopg 3 (AsyncConnection) com os mesmos
+        parâmetros das conexões do pool (keepalive, application_name, sessão).
+        Ela não faz parte do pool: quem a abre deve fechá-la.
+        """
+        import psycopg
+
+        return await psycopg.AsyncConnection.connect(autocommit=autocommit, **self._parametros())
+
+    def _saudavel(self, conn: _connection, ociosa_desde: float | None = None) -> bool:
+        """
+        Verifica se a conexão pode ser reutilizada. Conexões ociosas há pouco
+        tempo só têm o estado local verificado; as demais recebem um SELECT 1.
+        """
+        if conn.closed:
+            return False
+        if ociosa_desde is not None and time.monotonic() - ociosa_desde < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _principal_saudavel(self, conn: _connection) -> bool:
+        """
+        Verifica a conexão principal sem desfazer o trabalho de quem a usa: com
+        uma transação em andamento (tabelas temporárias, configurações de sessão
+        ainda não confirmadas), apenas o estado local é verificado; o SELECT 1
+        só é enviado quando ela está ociosa.
+        """
+        if conn.closed:
+            return False
+        status = conn.get_transaction_status()
+        if status == TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if status != TRANSACTION_STATUS_IDLE:
+            return True
+        return self._saudavel(conn)
+
+    @staticmethod
+    def _fechar(conn: _connection):
+        try:
+            if conn.closed == 0:
+                conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _abertas(self) -> int:
+        return len(self._livres) + len(self._em_uso)
+
+    def _descartar_ociosas(self):
+        """
+        Fecha conexões ociosas há mais de idle_timeout, preservando min_size.
+        Deve ser chamado com o lock adquirido.
+        """
+        agora = time.monotonic()
+        abertas = self._abertas()
+        manter = []
+        for conn, desde in self._livres:
+            if conn.closed or (agora - desde > self.idle_timeout and abertas > self.min_size):
+                self._fechar(conn)
+                abertas -= 1
+                continue
+            manter.append((conn, desde))
+        self._livres = manter
+
+    def acquire(self, timeout: float | None = 30.0) -> _connection:
+        """
+        Retira uma conexão do pool. Reaproveita uma conexão ociosa saudável,
+        abre uma nova se o pool ainda não atingiu max_size ou espera até que
+        alguma seja liberada. Levanta PoolExhaustedError se o tempo se esgotar.
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            ociosa = None
+            with self._cond:
+                while True:
+                    self._descartar_ociosas()
+                    if self._livres:
+                        # A conexão ociosa fica reservada enquanto é verificada, fora do lock
+                        ociosa = self._livres.pop()
+                        self._em_uso.add(ociosa[0])
+                        break
+
+                    if self._abertas() < self.max_size:
+                        break
+
+                    restante = None if limite is None else limite - time.monotonic()
+                    if restante is not None and restante <= 0:
+                        raise PoolExhaustedError(
+                            f"Nenhuma conexão livre no pool (máximo de {self.max_size})."
+                        )
+                    self._cond.wait(restante)
+
+                if ociosa is None:
+                    # Reserva a vaga antes de conectar, fora do lock
+                    marcador = object()
+                    self._em_uso.add(marcador)
+
+            if ociosa is None:
+                break
+            conn, desde = ociosa
+            if self._saudavel(conn, desde):
+                return conn
+            self._fechar(conn)
+            with self._cond:
+                self._em_uso.discard(conn)
+                self._cond.notify()
+
+        try:
+            conn = self._nova_conexao()
+        except Exception:
+            with self._cond:
+                self._em_uso.discard(marcador)
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._em_uso.discard(marcador)
+            self._em_uso.add(conn)
+        return conn
+
+    def release(self, conn: _connection):
+        """
+        Devolve uma conexão ao pool. Transações pendentes são desfeitas;
+        conexões quebradas são fechadas e deixam a vaga livre.
+        """
+        if conn.closed == 0 and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                self._fechar(conn)
+
+        with self._cond:
+            self._em_uso.discard(conn)
+            if conn.closed == 0:
+                self._livres.append((conn, time.monotonic()))
+            self._descartar_ociosas()
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: float | None = 30.0):
+        """
+        Context manager que retira uma conexão do pool e a devolve ao final.
+        """
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
 
     def connect(self) -> _connection:
         """
         Estabelece a conexão com o banco de dados.
         Retorna a conexão se bem-sucedida ou levanta um erro.
+
+        A conexão principal é retirada do pool e mantida reservada; se o socket
+        tiver caído, ela é substituída transparentemente por uma nova.
         """
-        if self.conn is None or self.conn.closed:
-            self.conn = psycopg2.connect(**self.config)
+        if self.conn is not None and not self._principal_saudavel(self.conn):
+            with self._cond:
+                self._em_uso.discard(self.conn)
+                self._cond.notify()
+            self._fechar(self.conn)
+            self.conn = None
+
+        if self.conn is None:
+            self.conn = self.acquire()
+            self._aquecer()
         return self.conn
 
+    def _aquecer(self):
+        """
+        Abre conexões adicionais até min_size, para que o primeiro uso
+        concorrente já encontre conexões prontas.
+        """
+        extras = []
+        try:
+            while self._abertas() < self.min_size:
+                extras.append(self.acquire(timeout=0))
+        except (psycopg2.Error, PoolExhaustedError):
+            pass
+        for conn in extras:
+            self.release(conn)
+
     def is_connected(self) -> bool:
         """
         Retorna True se a conexão está ativa.
@@ -29,10 +334,17 @@ class PostgresConnector:
 
     def close(self):
         """
-        Encerra a conexão com o banco, se estiver ativa.
+        Encerra a conexão principal e todas as conexões do pool.
         """
-        if self.conn and self.conn.closed == 0:
-            self.conn.close()
+        with self._cond:
+            livres = [conn for conn, _ in self._livres]
+            em_uso = [conn for conn in self._em_uso if isinstance(conn, _connection)]
+            self._livres = []
+            self._em_uso = set()
+            self._cond.notify_all()
+        for conn in livres + em_uso:
+            self._fechar(conn)
+        self.conn = None
 
     def __enter__(self):
         self.connect()
@@ -1,5 +1,45 @@
+from dataclasses import dataclass
+
 from psycopg2.extensions import connection
 
+SRID_PADRAO = 4674
+
+
+@dataclass(frozen=True)
+class Layer:
+    """
+    Descritor de uma camada espacial, conforme registrada em geometry_columns.
+    Uma tabela com mais de uma coluna geométrica gera um descritor por coluna.
+    """
+    schema: str
+    table: str
+    geom_col: str = "geom"
+    srid: int = SRID_PADRAO
+    geom_type: str = "GEOMETRY"
+    dim: int = 2
+    nome: str = ""
+
+    def __post_init__(self):
+        if not self.nome:
+            object.__setattr__(self, "nome", self.table)
+
+    @property
+    def tabela_sql(self) -> str:
+        """
+        Nome qualificado e entre aspas, pronto para uso em SQL.
+        """
+        return f'"{self.schema}"."{self.table}"'
+
+    @classmethod
+    def de(cls, schema: str, camada: "Layer | str") -> "Layer":
+        """
+        Aceita um descritor ou apenas o nome da tabela; neste caso assume a
+        coluna 'geom' no SRID 4674 (comportamento original da aplicação).
+        """
+        if isinstance(camada, Layer):
+            return camada
+        return cls(schema, camada)
+
 
 class SchemaManager:
     def __init__(self, conn: connection):
@@ -20,16 +60,67 @@ class SchemaManager:
             resultados = [row[0] for row in cur.fetchall()]
             return sorted([s for s in resultados if s not in ignorar])
 
-    def list_geometry_tables(self, schema: str) -> list[str]:
+    def list_layers(self, schema: str) -> list[Layer]:
         """
-        Lista os nomes das tabelas espaciais (com colunas geométricas)
-        dentro de um esquema fornecido.
+        Lista as camadas espaciais de um esquema a partir de geometry_columns:
+        tabela, coluna geométrica, SRID, tipo de geometria e dimensão.
+
+        Tabelas com várias colunas geométricas aparecem uma vez por coluna,
+        com nome 'tabela.coluna'.
         """
         query = """
-            SELECT f_table_name 
-            FROM geometry_columns 
-            WHERE f_table_schema = %s;
+            SELECT f_table_name, f_geometry_column, srid, type, coord_dimension
+            FROM geometry_columns
+            WHERE f_table_schema = %s
+            ORDER BY f_table_name, f_geometry_column;
         """
         with self.conn.cursor() as cur:
             cur.execute(query, (schema,))
-            return [row[0] for row in cur.fetchall()]
+            linhas = cur.fetchall()
+
+        por_tabela: dict[str, int] = {}
+        for tabela, *_ in linhas:
+            por_tabela[tabela] = por_tabela.get(tabela, 0) + 1
+
+        return [
+            Layer(
+                schema=schema,
+                table=tabela,
+                geom_col=coluna,
+                srid=srid or 0,
+                geom_type=tipo,
+                dim=dim,
+                nome=f"{tabela}.{coluna}" if por_tabela[tabela] > 1 else tabela,
+            )
+            for tabela, coluna, srid, tipo, dim in linhas
+        ]
+
+    def list_columns(self, schema: str) -> dict[str, list[str]]:
+        """
+        Colunas não geométricas de cada tabela do esquema, em ordem de posição.
+        """
+        query = """
+            SELECT c.relname, a.attname
+            FROM pg_attribute a
+            JOIN pg_class c ON c.oid = a.attrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            JOIN pg_type t ON t.oid = a.atttypid
+            WHERE n.nspname = %s
+            AND c.relkind IN ('r', 'v', 'm', 'p', 'f')
+            AND a.attnum > 0 AND NOT a.attisdropped
+            AND t.typname NOT IN ('geometry', 'geography')
+            ORDER BY c.relname, a.attnum;
+        """
+        colunas: dict[str, list[str]] = {}
+        with self.conn.cursor() as cur:
+            cur.execute(query, (schema,))
+            for tabela, coluna in cur.fetchall():
+                colunas.setdefault(tabela, []).append(coluna)
+        return colunas
+
+    def list_geometry_tables(self, schema: str) -> list[str]:
+        """
+        Lista os nomes das tabelas espaciais (com colunas geométricas)
+        dentro de um esquema fornecido.
+        """
+        return list(dict.fromkeys(layer.table for layer in self.list_layers(schema)))
@@ -6,27 +6,77 @@ espacial para um arquivo CSV. Cada linha contém:
 
 - O nome da tabela espacial
 - A quantidade de feições que intersectaram a AOI
+- Se a camada foi descartada pela triagem de extensão (sem consulta às feições)
+- Se a consulta da camada excedeu o tempo limite ("Sim (estimativa)" quando a
+  quantidade é a estimativa do planejador, não uma contagem)
+
+No modo em lote (várias áreas na AOI), o diagnóstico é exportado em formato
+longo: uma linha por área e camada (AOI, Tabela, Feições Encontradas).
 
 Ideal para relatórios rápidos ou integração com outras ferramentas.
 """
 
 import pandas as pd
+from utils.run_profiler import RunProfiler
 
 
 class CSVExporter:
     @staticmethod
-    def export(resultados: list[dict], output_path: str):
+    def export(resultados: list[dict], output_path: str, tempos: RunProfiler | None = None):
         """
         Exporta os resultados de interseção para um arquivo CSV.
 
         Parâmetros:
         - resultados: lista de dicionários contendo 'tabela' e 'count'
+          (e, opcionalmente, 'fora_extensao', 'tempo_esgotado' e 'estimado')
         - output_path: caminho completo para salvar o arquivo .csv
+        - tempos: recebe a duração da gravação (opcional)
         """
         dados = [
-            {"Tabela": r["tabela"], "Feições Encontradas": r["count"]}
+            {
+                "Tabela": r["tabela"],
+                "Feições Encontradas": r["count"],
+                "Fora da Extensão": "Sim" if r.get("fora_extensao") else "",
+                "Tempo Esgotado": CSVExporter._tempo_esgotado(r),
+            }
             for r in resultados
             if "count" in r  # ignora entradas com erro
         ]
-        df = pd.DataFrame(dados)
-        df.to_csv(output_path, index=False, encoding="utf-8-sig")
+        with (tempos or RunProfiler(ativo=False)).medir("csv.gravacao") as medida:
+            df = pd.DataFrame(dados)
+            df.to_csv(output_path, index=False, encoding="utf-8-sig")
+            medida["linhas"] = len(df)
+
+    @staticmethod
+    def _tempo_esgotado(r: dict) -> str:
+        if not r.get("tempo_esgotado"):
+            return ""
+        return "Sim (estimativa)" if r.get("estimado") else "Sim"
+
+    @staticmethod
+    def export_lote(resultados: list[dict], output_path: str, aoi_ids: list[str] | None = None,
+                    tempos: RunProfiler | None = None):
+        """
+        Exporta o diagnóstico do modo em lote em formato longo.
+
+        Parâmetros:
+        - resultados: dicionários de IntersectionRunner.iter_lote ('tabela', 'por_aoi')
+        - output_path: caminho completo para salvar o arquivo .csv
+        - aoi_ids: se informado, inclui também os pares área/camada sem interseção
+        - tempos: recebe a duração da gravação (opcional)
+        """
+        dados = []
+        for r in resultados:
+            if "erro" in r:
+                continue
+            por_aoi = r["por_aoi"]
+            for aoi_id in aoi_ids or por_aoi:
+                dados.append({
+                    "AOI": aoi_id,
+                    "Tabela": r["tabela"],
+                    "Feições Encontradas": por_aoi.get(aoi_id, 0),
+                })
+        with (tempos or RunProfiler(ativo=False)).medir("csv.gravacao") as medida:
+            df = pd.DataFrame(dados, columns=["AOI", "Tabela", "Feições Encontradas"])
+            df.to_csv(output_path, index=False, encoding="utf-8-sig")
+            medida["linhas"] = len(df)
@@ -1,31 +1,94 @@
 """
 Este módulo define a classe GPKGExporter, que exporta múltiplas tabelas espaciais
 para um único arquivo GeoPackage (.gpkg), filtrando apenas as feições que intersectam
-uma Área de Interesse (AOI) definida por WKT.
+uma Área de Interesse (AOI), enviada ao banco em WKB (ou WKT, se fornecida como texto).
+
+As feições são lidas por um cursor do lado do servidor e gravadas em lotes de
+tamanho fixo, anexados à camada do GeoPackage, de modo que o consumo de memória
+não depende do tamanho da camada.
+
+Com um pool de conexões, várias camadas são lidas em paralelo enquanto uma única
+thread grava no GeoPackage (a escrita em GPKG precisa ser serializada).
+
+Se receber o registro da última interseção (IntersectionRun), as camadas que não
+mudaram desde então são lidas diretamente pelas chaves das feições encontradas,
+sem repetir a consulta espacial.
+
+No modo em lote, SpatialBackend.exportar_por_aoi gera um GeoPackage por área
+da AOI, apenas com as camadas em que a área teve interseção.
+
+A limpeza das geometrias (limpar_geometrias) e o log por camada (log_camada)
+são compartilhados com o exportador do motor local.
 
 Inclui:
-- Validação das geometrias
-- Conversão de geometrias ZM para Z
+- Conversão de geometrias ZM para Z (e M para 2D), feita no servidor
+- Limpeza vetorizada das geometrias (shapely 2): nulas e vazias são descartadas,
+  inválidas são corrigidas com make_valid ou descartadas, com as contagens por camada
+- Medição dos tempos de leitura (com linhas e bytes de geometria recebidos),
+  limpeza e gravação de cada camada (RunProfiler)
 """
 
+import threading
+import time
+import uuid
+from queue import Empty, Queue
+
 import geopandas as gpd
-from shapely.geometry import mapping, shape
+import pandas as pd
+import shapely
 from psycopg2.extensions import connection
-from core.spatial.aoi import AOI
+from core.db.catalog_cache import CatalogCache
+from core.db.connector import PostgresConnector
+from core.db.schema_manager import Layer
+from core.spatial.aoi import AOI, SRID, aoi_sql_param
+from core.spatial.aoi_stage import AOIStage
+from core.spatial.intersection_run import Correspondencia, IntersectionRun
+from core.spatial.query_planner import QueryPlanner
+from utils.run_profiler import RunProfiler
 
 
 class GPKGExporter:
-    def __init__(self, conn: connection, aoi_wkt: str, schema: str):
+    def __init__(self, conn: connection, aoi: AOI | str, schema: str, staging: bool = True,
+                 max_vertices: int | None = None, batch_size: int = 10000,
+                 workers: int = 1, pool: PostgresConnector | None = None,
+                 execucao: IntersectionRun | None = None, reparar: bool = False,
+                 tempos: RunProfiler | None = None):
+        """
+        Parâmetros:
+        - staging / max_vertices: ver AOIStage
+        - batch_size: número de feições lidas e gravadas por lote
+        - workers: número de conexões lendo camadas em paralelo
+        - pool: conector de onde são retiradas as conexões de leitura (sem pool, a leitura é serial)
+        - execucao: registro da interseção com a mesma AOI, cujas chaves são reaproveitadas
+        - reparar: corrige geometrias inválidas com make_valid em vez de descartá-las
+        - tempos: recebe os tempos por etapa e por camada (padrão: o da AOI, se houver)
+        """
         self.conn = conn
-        self.aoi_wkt = aoi_wkt
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self.pool = pool
+        self.reparar = reparar
+        self.aoi = aoi
         self.schema = schema
+        self._aoi_sql, self._aoi_param = aoi_sql_param(aoi)
+        # AOI carregada uma vez na sessão, em tabela temporária indexada
+        self.stage = AOIStage(aoi, max_vertices=max_vertices) if staging and isinstance(aoi, AOI) else None
+        self.planner = QueryPlanner(self.stage, self._aoi_sql, self._aoi_param)
+        self.execucao = execucao
+        self.tempos = tempos or (aoi.tempos if isinstance(aoi, AOI) else RunProfiler(ativo=False))
+        self._chaves: dict[Layer, Correspondencia] = {}
 
-    def export_layers(self, layer_names: list[str], output_path: str, log_func=print, aoi_path: str = None):
+    def export_layers(self, layer_names: list[Layer | str], output_path: str, log_func=print,
+                      aoi_path: str = None) -> dict[str, dict]:
         """
         Exporta as camadas selecionadas para um GeoPackage.
+        Retorna, por camada, as contagens da exportação ('gravadas', 'lidas',
+        'reparadas', 'descartadas', 'zm', 'm') ou {'erro': mensagem}; se a falha
+        ocorreu depois de parte da camada ter sido gravada, o relatório traz também
+        'gravadas' e 'incompleta': True.
 
         Parâmetros:
-        - layer_names: lista com os nomes das tabelas selecionadas
+        - layer_names: descritores (ou nomes) das camadas selecionadas
         - output_path: caminho final do arquivo .gpkg
         - log_func: função opcional de log (ex: self.log_box.append)
             """
@@ -33,56 +96,363 @@ class GPKGExporter:
         # Se tiver caminho da AOI, adiciona como primeira camada
         if aoi_path:
             try:
-                aoi_gdf = gpd.read_file(aoi_path).to_crs(epsg=4674)
-                aoi_gdf.to_file(output_path, layer="AOI", driver="GPKG")
+                if isinstance(self.aoi, AOI) and self.aoi.filepath == aoi_path:
+                    aoi_gdf = self.aoi.gdf  # já lida e reprojetada
+                else:
+                    aoi_gdf = gpd.read_file(aoi_path).to_crs(epsg=4674)
+                with self.tempos.medir("exportacao.aoi"):
+                    aoi_gdf.to_file(output_path, layer="AOI", driver="GPKG")
                 log_func("[OK] Camada 'AOI' exportada para o GeoPackage.")
             except Exception as e:
                 log_func(f"[Erro] Falha ao exportar camada 'AOI': {e}")
                                 
                 
-        for tabela in layer_names:
+        layers = [Layer.de(self.schema, l) for l in layer_names]
+        self._chaves = self._correspondencias(layers)
+        if self._chaves:
+            log_func(f"[Info] {len(self._chaves)} camadas lidas pelas chaves da última interseção.")
+        # A AOI só precisa ser carregada na sessão para as camadas sem chaves
+        self._srids = {layer.srid for layer in layers if layer not in self._chaves}
+
+        if self.workers > 1 and self.pool is not None and len(layers) > 1:
+            return self._exportar_paralelo(layers, output_path, log_func)
+
+        relatorio = {}
+
+        # Carga presa à transação de quem usa a conexão: conferida a cada camada,
+        # pois o rollback de uma falha a desfaz (ver AOIStage.garantir)
+        duravel = self.stage is None or not self._srids
+
+        for layer in layers:
+            gravadas = 0
+            tentou = False
+
+            def gravar(gdf):
+                nonlocal gravadas, tentou
+                anexar, tentou = tentou, True
+                self._gravar(gdf, layer, output_path, anexar)
+                gravadas += len(gdf)
+
             try:
-                query = f'''
-                    SELECT * FROM "{self.schema}"."{tabela}"
-                    WHERE ST_Intersects(geom, ST_GeomFromText(%s, 4674))
-                '''
-                gdf = gpd.read_postgis(query, self.conn, geom_col="geom", params=[self.aoi_wkt])
-
-                if gdf.empty:
-                    log_func(f"[Aviso] Tabela '{tabela}' não possui feições para exportar.")
-                    continue
-
-                gdf = gdf[gdf.is_valid & ~gdf.is_empty]
-                if gdf.empty:
-                    log_func(f"[Aviso] Tabela '{tabela}' só possui geometrias inválidas ou vazias.")
-                    continue
-
-                if any("ZM" in str(geom) for geom in gdf.geometry):
-                    log_func(f"[Aviso] Geometrias ZM convertidas para Z na camada '{tabela}'.")
-                    gdf["geometry"] = gdf["geometry"].apply(self._remove_m)
-
-                gdf.to_file(
-                    output_path,
-                    layer=tabela,
-                    driver="GPKG",
-                    encoding="utf-8",
-                    geometry_type=None
-                )
+                if not duravel:
+                    with self.tempos.medir("preparacao.aoi_na_sessao"):
+                        duravel = self.stage.garantir(self.conn, self._srids)
+                estatisticas = self._produzir(layer, self.conn, gravar)
+                log_camada(layer, estatisticas, gravadas, log_func)
+                relatorio[layer.nome] = {"gravadas": gravadas, **estatisticas}
+            except Exception as e:
+                self.conn.rollback()
+                log_func(f"[Erro] Falha ao exportar '{layer.nome}': {e}")
+                relatorio[layer.nome] = self._relatorio_falha(layer, e, tentou, gravadas, log_func)
+        return relatorio
+
+    @staticmethod
+    def _relatorio_falha(layer: Layer, erro, tentou: bool, gravadas: int, log_func) -> dict:
+        """
+        Relatório de uma camada que falhou. Se algum lote chegou a ser gravado
+        (ou a gravação falhou no meio), a camada fica marcada como incompleta.
+        """
+        if not tentou:
+            return {"erro": str(erro)}
+        log_func(f"[Aviso] Camada '{layer.nome}' ficou incompleta no GeoPackage ({gravadas} feições gravadas).")
+        return {"erro": str(erro), "gravadas": gravadas, "incompleta": True}
 
-                log_func(f"[OK] Camada '{tabela}' exportada para GeoPackage.")
+    def _correspondencias(self, layers: list[Layer]) -> dict[Layer, Correspondencia]:
+        """
+        Chaves registradas na execução para as camadas cuja tabela não mudou desde
+        então. Só valem para a mesma AOI.
+        """
+        if self.execucao is None or not isinstance(self.aoi, AOI) \
+                or self.execucao.aoi_hash != self.aoi.hash:
+            return {}
+        try:
+            marcadores = {
+                schema: CatalogCache.marcadores_tabelas(self.conn, schema)
+                for schema in {layer.schema for layer in layers}
+            }
+        except Exception:
+            self.conn.rollback()
+            return {}
+        chaves = {}
+        for layer in layers:
+            registro = self.execucao.correspondencia(layer, marcadores[layer.schema].get(layer.table))
+            if registro is not None:
+                chaves[layer] = registro
+        return chaves
 
+    def _exportar_paralelo(self, layers: list[Layer], output_path: str, log_func) -> dict[str, dict]:
+        """
+        Pipeline produtor/consumidor: até `workers` conexões do pool leem e
+        decodificam camadas em paralelo, enquanto esta thread, a única que escreve
+        no GeoPackage, consome os lotes de uma fila limitada. Cada camada é lida
+        por um único produtor, o que preserva a ordem dos seus lotes.
+        """
+        fila: Queue = Queue(maxsize=2 * self.workers)
+        pendentes: Queue = Queue()
+        for layer in layers:
+            pendentes.put(layer)
+
+        def produtor():
+            try:
+                conn = self.pool.acquire()
             except Exception as e:
-                log_func(f"[Erro] Falha ao exportar '{tabela}': {e}")
+                fila.put(("falha", None, e))
+                fila.put(("saiu", None, None))
+                return
+            try:
+                if self.stage is not None and self._srids:
+                    with self.tempos.medir("preparacao.aoi_na_sessao"):
+                        self.stage.garantir(conn, self._srids)
+                while True:
+                    try:
+                        layer = pendentes.get_nowait()
+                    except Empty:
+                        break
+                    try:
+                        estatisticas = self._produzir(layer, conn, lambda gdf: fila.put(("lote", layer, gdf)))
+                        fila.put(("fim", layer, estatisticas))
+                    except Exception as e:
+                        conn.rollback()
+                        fila.put(("erro", layer, e))
+            except Exception as e:
+                fila.put(("falha", None, e))
+            finally:
+                self.pool.release(conn)
+                fila.put(("saiu", None, None))
+
+        n = min(self.workers, len(layers))
+        threads = [
+            threading.Thread(target=produtor, name=f"exportacao-{i}", daemon=True)
+            for i in range(n)
+        ]
+        for t in threads:
+            t.start()
 
-    def _remove_m(self, geom):
+        gravadas: dict[Layer, int] = {}
+        # Camadas com alguma gravação tentada: os lotes seguintes são anexados
+        tentadas: set[Layer] = set()
+        falhas: dict[Layer, str] = {}
+        relatorio = {}
+        ativos = n
+        while ativos:
+            tipo, layer, dado = fila.get()
+            if tipo == "lote":
+                if layer in falhas:
+                    continue  # a camada já está incompleta; os lotes restantes são descartados
+                anexar = layer in tentadas
+                tentadas.add(layer)
+                try:
+                    self._gravar(dado, layer, output_path, anexar)
+                    gravadas[layer] = gravadas.get(layer, 0) + len(dado)
+                except Exception as e:
+                    log_func(f"[Erro] Falha ao gravar lote de '{layer.nome}': {e}")
+                    falhas[layer] = str(e)
+            elif tipo == "fim":
+                if layer in falhas:
+                    relatorio[layer.nome] = self._relatorio_falha(
+                        layer, falhas[layer], True, gravadas.get(layer, 0), log_func
+                    )
+                else:
+                    log_camada(layer, dado, gravadas.get(layer, 0), log_func)
+                    relatorio[layer.nome] = {"gravadas": gravadas.get(layer, 0), **dado}
+            elif tipo == "erro":
+                log_func(f"[Erro] Falha ao exportar '{layer.nome}': {dado}")
+                relatorio[layer.nome] = self._relatorio_falha(
+                    layer, dado, layer in tentadas, gravadas.get(layer, 0), log_func
+                )
+            elif tipo == "falha":
+                log_func(f"[Erro] Falha em uma conexão de exportação: {dado}")
+            elif tipo == "saiu":
+                ativos -= 1
+
+        for t in threads:
+            t.join()
+        # Camadas não lidas porque uma conexão de exportação falhou
+        for layer in layers:
+            relatorio.setdefault(layer.nome, {"erro": "camada não exportada"})
+        return relatorio
+
+    @staticmethod
+    def _pode_ter_m(layer: Layer) -> bool:
+        # geometry_columns informa colunas ZM com o tipo sem sufixo (POLYGON) e
+        # coord_dimension 4; só as M (dim 3) trazem o sufixo (POLYGONM).
+        # Colunas genéricas podem misturar dimensões
+        return layer.dim == 4 \
+            or layer.geom_type.upper() in ("GEOMETRY", "GEOMETRYCOLLECTION") \
+            or layer.geom_type.upper().endswith("M")
+
+    def _select(self, conn: connection, layer: Layer) -> tuple[str, bool]:
+        """
+        Lista de colunas da leitura. Em camadas que podem ter M, a geometria é
+        normalizada no servidor (ZM -> Z com ST_Force3DZ, M -> 2D com ST_Force2D)
+        e a coluna auxiliar __zmflag informa a dimensão original de cada feição.
         """
-        Remove a componente M das geometrias do tipo ZM.
+        if not self._pode_ter_m(layer):
+            return "t.*", False
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT * FROM {layer.tabela_sql} t LIMIT 0")
+            nomes = [desc[0] for desc in cur.description]
+        g = f't."{layer.geom_col}"'
+        normalizada = (
+            f"CASE ST_Zmflag({g}) WHEN 3 THEN ST_Force3DZ({g}) "
+            f"WHEN 1 THEN ST_Force2D({g}) ELSE {g} END"
+        )
+        colunas = []
+        for nome in nomes:
+            coluna = '"' + nome.replace('"', '""') + '"'
+            colunas.append(f"{normalizada} AS {coluna}" if nome == layer.geom_col else f"t.{coluna}")
+        colunas.append(f'ST_Zmflag({g}) AS "__zmflag"')
+        return ", ".join(colunas), True
+
+    def _lotes(self, layer: Layer, conn: connection):
+        """
+        Lê as feições da camada que intersectam a AOI por um cursor nomeado
+        (do lado do servidor), entregando pares (GeoDataFrame de até batch_size
+        linhas, dimensões originais ou None).
+        Camadas com chaves registradas são lidas pelas chaves, sem filtro espacial.
         """
-        geom_dict = mapping(geom)
-        if "coordinates" in geom_dict:
-            def strip_m(coords):
-                if isinstance(coords[0], (float, int)):
-                    return coords[:3]  # ponto
-                return [strip_m(c) for c in coords]
-            geom_dict["coordinates"] = strip_m(geom_dict["coordinates"])
-        return shape(geom_dict)
+        registro = self._chaves.get(layer)
+        if registro is not None:
+            if not registro.ids:
+                return
+            filtro = self.planner.filtro_chaves(registro.coluna)
+            params = (list(registro.ids),)
+        else:
+            filtro, params = self.planner.filtro_camada(layer)
+        select, com_flag = self._select(conn, layer)
+        query = f"""
+            SELECT {select} FROM {layer.tabela_sql} t
+            WHERE {filtro}
+        """
+        crs = f"EPSG:{layer.srid or SRID}"
+
+        with conn.cursor(name=f"exportacao_{uuid.uuid4().hex}") as cur:
+            cur.itersize = self.batch_size
+            # O tempo de leitura de cada lote exclui o processamento de quem o consome
+            inicio = time.perf_counter()
+            cur.execute(query, params or None)
+            while True:
+                linhas = cur.fetchmany(self.batch_size)
+                if not linhas:
+                    break
+                colunas = [desc[0] for desc in cur.description]
+                gdf, zmflag, recebidos = montar_lote(linhas, colunas, layer.geom_col, crs, com_flag)
+                if self.tempos.ativo:
+                    self.tempos.registrar(
+                        "exportacao.leitura", time.perf_counter() - inicio, layer.nome,
+                        len(gdf), recebidos
+                    )
+                yield gdf, zmflag
+                inicio = time.perf_counter()
+
+    def _produzir(self, layer: Layer, conn: connection, entregar) -> dict:
+        """
+        Lê e prepara a camada lote a lote (reprojeção e limpeza das geometrias),
+        entregando cada lote não vazio à função `entregar`.
+
+        Retorna as contagens da camada: 'lidas', 'reparadas', 'descartadas',
+        'zm' (ZM convertidas para Z) e 'm' (M convertidas para 2D).
+        """
+        estatisticas = {"lidas": 0, "reparadas": 0, "descartadas": 0, "zm": 0, "m": 0}
+
+        for gdf, zmflag in self._lotes(layer, conn):
+            estatisticas["lidas"] += len(gdf)
+            if zmflag is not None:
+                estatisticas["zm"] += int((zmflag == 3).sum())
+                estatisticas["m"] += int((zmflag == 1).sum())
+
+            with self.tempos.medir("exportacao.limpeza", layer.nome):
+                # O GeoPackage é sempre gravado em 4674
+                if layer.srid not in (SRID, 0):
+                    gdf = gdf.to_crs(epsg=SRID)
+                gdf, reparadas, descartadas = limpar_geometrias(gdf, self.reparar)
+            estatisticas["reparadas"] += reparadas
+            estatisticas["descartadas"] += descartadas
+            if not gdf.empty:
+                entregar(gdf)
+
+        return estatisticas
+
+    def _gravar(self, gdf, layer: Layer, output_path: str, anexar: bool):
+        """
+        Grava um lote: o primeiro cria a camada no GeoPackage, os seguintes
+        (anexar) são anexados.
+        """
+        with self.tempos.medir("exportacao.gravacao", layer.nome) as medida:
+            gdf.to_file(
+                output_path,
+                layer=layer.nome,
+                driver="GPKG",
+                encoding="utf-8",
+                geometry_type=None,
+                mode="a" if anexar else "w"
+            )
+            medida["linhas"] = len(gdf)
+
+
+def montar_lote(linhas: list, colunas: list[str], geom_col: str, crs: str, com_flag: bool = False):
+    """
+    Monta o GeoDataFrame de um lote lido do banco. A geometria (EWKB em
+    hexadecimal, como o psycopg2 a entrega) é decodificada na própria coluna
+    geom_col, de modo que um atributo da tabela chamado 'geometry' não colide
+    com a coluna geométrica. A coluna auxiliar __zmflag (com_flag) é retirada.
+
+    Retorna (GeoDataFrame, dimensões originais ou None, bytes de geometria recebidos).
+    """
+    df = pd.DataFrame.from_records(linhas, columns=colunas)
+    zmflag = df.pop("__zmflag").to_numpy() if com_flag else None
+    wkb_hex = df.pop(geom_col)
+    df[geom_col] = shapely.from_wkb(wkb_hex.to_numpy())
+    gdf = gpd.GeoDataFrame(df, geometry=geom_col, crs=crs)
+    return gdf, zmflag, int(wkb_hex.str.len().sum()) // 2
+
+
+def limpar_geometrias(gdf, reparar: bool = False):
+    """
+    Limpeza vetorizada de um lote: geometrias nulas ou vazias são descartadas;
+    as inválidas são corrigidas com make_valid (se `reparar` estiver ativo) ou descartadas.
+
+    Retorna (lote limpo, reparadas, descartadas).
+    """
+    geometrias = gdf.geometry.to_numpy()
+    validas = shapely.is_valid(geometrias)  # False também para nulas
+    reparadas = 0
+
+    if reparar and not validas.all():
+        invalidas = ~validas & ~shapely.is_missing(geometrias)
+        if invalidas.any():
+            geometrias = geometrias.copy()
+            geometrias[invalidas] = shapely.make_valid(geometrias[invalidas])
+            reparadas = int(invalidas.sum())
+            validas = shapely.is_valid(geometrias)
+            gdf = gdf.set_geometry(
+                gpd.GeoSeries(geometrias, index=gdf.index, crs=gdf.crs, name=gdf.geometry.name)
+            )
+
+    manter = validas & ~shapely.is_empty(geometrias)
+    descartadas = int((~manter).sum())
+    if descartadas:
+        gdf = gdf[manter]
+    return gdf, reparadas, descartadas
+
+
+def log_camada(layer: Layer, estatisticas: dict, gravadas: int, log_func):
+    """
+    Registra no log o resultado da exportação de uma camada.
+    """
+    tabela = layer.nome
+    if estatisticas["zm"]:
+        log_func(f"[Aviso] {estatisticas['zm']} geometrias ZM convertidas para Z na camada '{tabela}'.")
+    if estatisticas["m"]:
+        log_func(f"[Aviso] {estatisticas['m']} geometrias M convertidas para 2D na camada '{tabela}'.")
+    if estatisticas["reparadas"]:
+        log_func(f"[Aviso] {estatisticas['reparadas']} geometrias inválidas corrigidas na camada '{tabela}'.")
+    if estatisticas["descartadas"]:
+        log_func(f"[Aviso] {estatisticas['descartadas']} geometrias inválidas ou vazias descartadas na camada '{tabela}'.")
+
+    if estatisticas["lidas"] == 0:
+        log_func(f"[Aviso] Tabela '{tabela}' não possui feições para exportar.")
+    elif gravadas == 0:
+        log_func(f"[Aviso] Tabela '{tabela}' só possui geometrias inválidas ou vazias.")
+    else:
+        log_func(f"[OK] Camada '{tabela}' exportada para GeoPackage ({gravadas} feições).")
@@ -4,28 +4,117 @@ de uma Área de Interesse (AOI) a partir de um arquivo GeoJSON.
 
 Ela garante que:
 - A geometria seja convertida para EPSG:4674
-- Uma geometria unificada em WKT esteja disponível
+- A geometria unificada seja calculada uma única vez e reaproveitada
+- As representações WKT, WKB e EWKB fiquem em cache, junto com um hash do conteúdo
 - A AOI possa ser exportada para GeoPackage (opcional)
+- Os tempos de leitura, reprojeção e dissolução sejam medidos (RunProfiler, opcional)
+- Uma AOI com várias áreas identificadas por um campo (ex: imóveis de um
+  município) possa ser dividida por identificador, para o modo em lote
 """
 
+import hashlib
+from functools import cached_property
+
 import geopandas as gpd
+import shapely
+from utils.run_profiler import RunProfiler
+
+SRID = 4674
 
 
 class AOI:
-    def __init__(self, filepath: str):
+    def __init__(self, filepath: str, gdf: gpd.GeoDataFrame | None = None, tempos: RunProfiler | None = None):
         """
         Lê o arquivo GeoJSON e converte o sistema de referência para EPSG:4674.
+        Se `gdf` for informado, ele é usado no lugar da leitura do arquivo.
+        `tempos` recebe a duração de cada etapa (leitura, reprojeção, dissolução).
         """
         self.filepath = filepath
-        self.gdf = gpd.read_file(filepath).to_crs(epsg=4674)
+        self.tempos = tempos or RunProfiler(ativo=False)
+        if gdf is None:
+            with self.tempos.medir("aoi.leitura") as medida:
+                gdf = gpd.read_file(filepath)
+                medida["linhas"] = len(gdf)
+        with self.tempos.medir("aoi.reprojecao"):
+            self.gdf = gdf.to_crs(epsg=SRID)
+        self._bounds: dict[int, tuple[float, float, float, float]] = {}
 
-    @property
+    @cached_property
+    def geometry(self):
+        """
+        Geometria da AOI dissolvida (union_all), calculada uma única vez.
+        """
+        with self.tempos.medir("aoi.uniao"):
+            return self.gdf.geometry.union_all()
+
+    @cached_property
     def wkt(self) -> str:
         """
         Retorna a geometria da AOI unificada como WKT.
         Ideal para uso em consultas ST_Intersects.
         """
-        return self.gdf.geometry.union_all().wkt
+        return self.geometry.wkt
+
+    @cached_property
+    def wkb(self) -> bytes:
+        """
+        Geometria unificada em WKB, para envio binário ao banco (ST_GeomFromWKB).
+        """
+        return shapely.to_wkb(self.geometry)
+
+    @cached_property
+    def ewkb(self) -> bytes:
+        """
+        Geometria unificada em EWKB (WKB com o SRID embutido).
+        """
+        return shapely.to_wkb(shapely.set_srid(self.geometry, SRID), include_srid=True)
+
+    @cached_property
+    def hash(self) -> str:
+        """
+        Hash SHA-256 do EWKB. Identifica o conteúdo da AOI independentemente
+        do arquivo de origem.
+        """
+        return hashlib.sha256(self.ewkb).hexdigest()
+
+    def bounds(self, srid: int = SRID) -> tuple[float, float, float, float]:
+        """
+        Bounding box (xmin, ymin, xmax, ymax) da AOI no SRID indicado, em cache.
+        Para outros SRIDs transforma apenas a envoltória convexa densificada,
+        e não a geometria completa.
+        """
+        if srid not in self._bounds:
+            if srid == SRID:
+                self._bounds[srid] = tuple(self.geometry.bounds)
+            else:
+                casca = self.geometry.convex_hull
+                xmin, ymin, xmax, ymax = casca.bounds
+                passo = max(xmax - xmin, ymax - ymin) / 100 or 1.0
+                casca = shapely.segmentize(casca, passo)
+                serie = gpd.GeoSeries([casca], crs=f"EPSG:{SRID}").to_crs(epsg=srid)
+                self._bounds[srid] = tuple(float(v) for v in serie.total_bounds)
+        return self._bounds[srid]
+
+    def ids(self, campo: str) -> list[str]:
+        """
+        Identificadores distintos das áreas da AOI no campo indicado, como texto.
+        """
+        if campo not in self.gdf.columns:
+            raise ValueError(f"Campo '{campo}' não existe na AOI.")
+        return list(dict.fromkeys(str(v) for v in self.gdf[campo] if v is not None))
+
+    def subconjunto(self, campo: str, valor: str) -> "AOI":
+        """
+        Nova AOI apenas com as feições cujo campo tem o valor indicado.
+        """
+        return AOI(self.filepath, self.gdf[self.gdf[campo].astype(str) == valor], self.tempos)
+
+    def sql_param(self) -> tuple[str, bytes]:
+        """
+        Retorna o trecho SQL e o parâmetro para usar a AOI em uma consulta,
+        enviando a geometria em binário em vez de texto.
+        """
+        return f"ST_GeomFromWKB(%s, {SRID})", self.wkb
 
     def save_to_geopackage(self, output_path: str, layer_name: str = "AOI"):
         """
@@ -37,3 +126,13 @@ class AOI:
             driver="GPKG",
             encoding="utf-8"
         )
+
+
+def aoi_sql_param(aoi: "AOI | str") -> tuple[str, object]:
+    """
+    Aceita uma AOI ou uma geometria em WKT e retorna o trecho SQL e o parâmetro
+    correspondentes. AOIs são enviadas como WKB; textos continuam como WKT.
+    """
+    if isinstance(aoi, AOI):
+        return aoi.sql_param()
+    return f"ST_GeomFromText(%s, {SRID})", aoi
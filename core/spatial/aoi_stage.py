@@ -0,0 +1,352 @@
+"""
+Este módulo define a classe AOIStage, que carrega a AOI uma única vez por sessão
+em uma tabela temporária do PostgreSQL, com índice espacial (GiST).
+
+Em vez de enviar a geometria completa da AOI como parâmetro em cada consulta,
+as interseções e exportações fazem um EXISTS contra essa tabela, de modo que a
+geometria atravessa a rede apenas uma vez por conexão.
+
+A carga usa COPY binário com a geometria em EWKB. O nome da tabela inclui o hash
+do conteúdo carregado (as geometrias e, por feição, os identificadores), o que
+permite reaproveitar a tabela já carregada em conexões do pool; o hash completo
+fica no comentário da tabela e é conferido antes do reaproveitamento.
+
+AOIs muito complexas (milhares de vértices ou buracos) podem ser subdivididas
+no servidor com ST_Subdivide em pedaços de no máximo N vértices. Cada pedaço tem
+uma bbox justa, o que torna o pré-filtro do índice seletivo e o teste exato
+barato; o EXISTS das consultas garante que uma feição que toca vários pedaços
+seja contada uma única vez.
+
+No modo em lote, cada feição é carregada com o identificador da sua área
+(coluna aoi_id, lida de um campo da AOI), para que uma única junção com
+GROUP BY aoi_id conte as feições de cada área.
+
+Para camadas armazenadas em outro SRID, a AOI é transformada uma única vez no
+servidor para uma tabela temporária derivada (também indexada), de modo que a
+comparação ocorre sempre no SRID nativo da camada e o índice dela é usado.
+
+Os comandos da carga são montados uma única vez (passos) e executados por
+garantir, em conexões psycopg2, ou por garantir_async, em conexões assíncronas
+do psycopg 3 (AsyncIntersectionRunner).
+"""
+
+import hashlib
+import io
+import struct
+from functools import cached_property
+
+import shapely
+from psycopg2.extensions import connection, TRANSACTION_STATUS_IDLE
+
+from core.spatial.aoi import AOI, SRID
+
+PREFIXO = "postintersect_aoi_"
+MIN_VERTICES = 5  # mínimo aceito por ST_Subdivide
+
+
+class AOIStage:
+    def __init__(self, aoi: AOI, por_feicao: bool = False, max_vertices: int | None = None,
+                 campo_id: str | None = None):
+        """
+        Parâmetros:
+        - aoi: instância de AOI
+        - por_feicao: se True, carrega cada feição da AOI em uma linha; caso contrário,
+          carrega apenas a geometria dissolvida
+        - max_vertices: se informado, subdivide a AOI (ST_Subdivide) em pedaços com
+          no máximo esse número de vértices
+        - campo_id: campo da AOI gravado na coluna aoi_id (modo em lote); implica por_feicao
+        """
+        if max_vertices is not None and max_vertices < MIN_VERTICES:
+            raise ValueError(f"max_vertices deve ser no mínimo {MIN_VERTICES}.")
+        if campo_id is not None and campo_id not in aoi.gdf.columns:
+            raise ValueError(f"Campo '{campo_id}' não existe na AOI.")
+        self.aoi = aoi
+        self.campo_id = campo_id
+        self.por_feicao = por_feicao or campo_id is not None
+        self.max_vertices = max_vertices
+
+    @cached_property
+    def conteudo_hash(self) -> str:
+        """
+        Hash SHA-256 do que é carregado na tabela: o identificador e o EWKB de
+        cada linha (a AOI dissolvida ou cada feição), e a subdivisão. Duas AOIs
+        com o mesmo contorno, mas divididas em feições ou identificadores
+        diferentes, têm hashes diferentes.
+        """
+        h = hashlib.sha256()
+        h.update(f"{'f' if self.por_feicao else 'u'}:{self.max_vertices or 0}".encode("utf-8"))
+        for aoi_id, ewkb in zip(*self._registros_ewkb):
+            texto = b"\x00" if aoi_id is None else b"\x01" + aoi_id.encode("utf-8")
+            h.update(struct.pack("!i", len(texto)) + texto)
+            h.update(struct.pack("!i", len(ewkb)) + ewkb)
+        return h.hexdigest()
+
+    @cached_property
+    def table_name(self) -> str:
+        sufixo = "f" if self.por_feicao else "u"
+        if self.max_vertices:
+            sufixo += f"s{self.max_vertices}"
+        return f"{PREFIXO}{self.conteudo_hash[:16]}{sufixo}"
+
+    def nome_tabela(self, srid: int = SRID) -> str:
+        """
+        Nome da tabela temporária com a AOI no SRID indicado.
+        SRID 0 (não declarado) usa a própria AOI em 4674.
+        """
+        if srid in (SRID, 0):
+            return self.table_name
+        return f"{self.table_name}_{srid}"
+
+    def tabela_sql(self, srid: int = SRID) -> str:
+        return f'pg_temp."{self.nome_tabela(srid)}"'
+
+    def predicado(self, geom_col: str, srid: int = SRID) -> str:
+        """
+        Trecho SQL que verifica se geom_col intersecta alguma geometria da AOI carregada.
+        O EXISTS evita contar duas vezes feições que tocam mais de uma parte da AOI;
+        o && explícito garante o pré-filtro por bbox no índice antes do teste exato.
+        """
+        return (
+            f"EXISTS (SELECT 1 FROM {self.tabela_sql(srid)} a "
+            f"WHERE {geom_col} && a.geom AND ST_Intersects({geom_col}, a.geom))"
+        )
+
+    def _registros(self) -> tuple[list, list]:
+        """
+        Identificadores (ou None) e geometrias a carregar, na mesma ordem.
+        """
+        if not self.por_feicao:
+            return [None], list(shapely.set_srid([self.aoi.geometry], SRID))
+        ids, geoms = [], []
+        valores = self.aoi.gdf[self.campo_id] if self.campo_id else [None] * len(self.aoi.gdf)
+        for valor, g in zip(valores, self.aoi.gdf.geometry):
+            if g is None or g.is_empty:
+                continue
+            ids.append(None if valor is None else str(valor))
+            geoms.append(g)
+        return ids, list(shapely.set_srid(geoms, SRID))
+
+    @cached_property
+    def _registros_ewkb(self) -> tuple[list, list]:
+        """
+        Identificadores e geometrias em EWKB, exatamente como carregados (e
+        como entram no hash do conteúdo).
+        """
+        ids, geoms = self._registros()
+        return ids, list(shapely.to_wkb(geoms, include_srid=True))
+
+    def _copy_binario(self) -> io.BytesIO:
+        """
+        Monta o fluxo no formato COPY BINARY: cabeçalho, uma tupla (id, aoi_id, geom)
+        por geometria, com a geometria em EWKB, e o marcador de fim.
+        """
+        ids, ewkbs = self._registros_ewkb
+        buf = io.BytesIO()
+        buf.write(b"PGCOPY\n\xff\r\n\x00")
+        buf.write(struct.pack("!ii", 0, 0))
+        for i, (aoi_id, ewkb) in enumerate(zip(ids, ewkbs)):
+            buf.write(struct.pack("!hii", 3, 4, i))
+            if aoi_id is None:
+                buf.write(struct.pack("!i", -1))
+            else:
+                texto = aoi_id.encode("utf-8")
+                buf.write(struct.pack("!i", len(texto)))
+                buf.write(texto)
+            buf.write(struct.pack("!i", len(ewkb)))
+            buf.write(ewkb)
+        buf.write(struct.pack("!h", -1))
+        buf.seek(0)
+        return buf
+
+    # Tabelas temporárias de AOI da sessão, com o hash do conteúdo (comentário)
+    EXISTENTES_SQL = """
+        SELECT relname, obj_description(oid, 'pg_class') FROM pg_class
+        WHERE relnamespace = pg_my_temp_schema()
+        AND relkind = 'r'
+        AND relname LIKE %s
+    """
+
+    def _existentes(self, conn: connection) -> dict[str, str | None]:
+        """
+        Tabelas temporárias de AOI já presentes na sessão da conexão e o hash
+        do conteúdo de cada uma.
+        """
+        with conn.cursor() as cur:
+            cur.execute(self.EXISTENTES_SQL, (PREFIXO + "%",))
+            return dict(cur.fetchall())
+
+    def carregada(self, conn: connection) -> bool:
+        """
+        Indica se a tabela temporária desta AOI, com este conteúdo, já existe na
+        sessão da conexão.
+        """
+        return self._existentes(conn).get(self.table_name) == self.conteudo_hash
+
+    def _comentar(self, nome: str) -> tuple[str, None]:
+        return f"COMMENT ON TABLE pg_temp.\"{nome}\" IS '{self.conteudo_hash}'", None
+
+    def passos(self, existentes: dict[str, str | None], srids=()) -> list[tuple[str, bytes | None]]:
+        """
+        Comandos para carregar a AOI em uma sessão que já possui as tabelas
+        temporárias `existentes` ({nome: hash do conteúdo}): lista de (sql, dados),
+        em que dados é o fluxo COPY BINARY para os comandos COPY e None para os demais.
+        Lista vazia se a AOI já estiver carregada em todos os SRIDs.
+
+        Só são reaproveitadas as tabelas cujo hash é o desta AOI; uma tabela com
+        o nome desta AOI e outro conteúdo é descartada e recriada. Tabelas de
+        outras AOIs não são tocadas.
+        """
+        validas = {nome for nome, h in existentes.items() if h == self.conteudo_hash}
+        base_valida = self.table_name in validas
+        faltando = [
+            srid for srid in sorted(set(srids))
+            if not base_valida or self.nome_tabela(srid) not in validas
+        ]
+        if base_valida and not faltando:
+            return []
+
+        passos = []
+        # Tabelas com os nomes desta AOI que serão recriadas
+        for srid in faltando:
+            nome = self.nome_tabela(srid)
+            if nome in existentes and nome != self.table_name:
+                passos.append((f'DROP TABLE pg_temp."{nome}"', None))
+        if not base_valida:
+            if self.table_name in existentes:
+                passos.append((f'DROP TABLE pg_temp."{self.table_name}"', None))
+            passos.append((f"""
+                CREATE TEMPORARY TABLE "{self.table_name}" (
+                    id integer PRIMARY KEY,
+                    aoi_id text,
+                    geom geometry(Geometry, {SRID}) NOT NULL
+                )
+            """, None))
+            if self.max_vertices:
+                passos += self._passos_subdividida()
+            else:
+                passos.append((
+                    f'COPY {self.tabela_sql()} (id, aoi_id, geom) FROM STDIN WITH (FORMAT binary)',
+                    self._copy_binario().getvalue()
+                ))
+            passos.append((f'CREATE INDEX ON {self.tabela_sql()} USING GIST (geom)', None))
+            passos.append((f'ANALYZE {self.tabela_sql()}', None))
+            passos.append(self._comentar(self.table_name))
+
+        for srid in faltando:
+            nome = self.nome_tabela(srid)
+            if nome == self.table_name:
+                continue
+            passos.append((f"""
+                CREATE TEMPORARY TABLE "{nome}" AS
+                SELECT id, aoi_id, ST_Transform(geom, {int(srid)})::geometry(Geometry, {int(srid)}) AS geom
+                FROM {self.tabela_sql()}
+            """, None))
+            passos.append((f'CREATE INDEX ON pg_temp."{nome}" USING GIST (geom)', None))
+            passos.append((f'ANALYZE pg_temp."{nome}"', None))
+            passos.append(self._comentar(nome))
+        return passos
+
+    def garantir(self, conn: connection, srids=()) -> bool:
+        """
+        Carrega a AOI na sessão, se ainda não estiver carregada, e cria as versões
+        transformadas para cada SRID em srids. Só as tabelas desta AOI são criadas;
+        as de outras AOIs na mesma sessão (de outro runner ou perfil) ficam intactas.
+
+        Com a conexão ociosa, a carga usa uma transação própria, confirmada ao
+        final, para que as tabelas sobrevivam a um rollback de consultas
+        posteriores. Com uma transação em andamento, a carga é feita dentro dela,
+        em um savepoint, sem confirmar o trabalho de quem a abriu: as tabelas
+        seguem o destino dessa transação.
+
+        Retorna True se a AOI está carregada de forma duradoura na sessão.
+        """
+        ociosa = conn.autocommit or conn.get_transaction_status() == TRANSACTION_STATUS_IDLE
+        passos = self.passos(self._existentes(conn), srids)
+        if not passos:
+            if ociosa and not conn.autocommit:
+                conn.rollback()  # encerra a leitura do catálogo
+            return ociosa
+        with conn.cursor() as cur:
+            if not ociosa:
+                cur.execute("SAVEPOINT aoi_stage")
+            try:
+                for sql, dados in passos:
+                    if dados is None:
+                        cur.execute(sql)
+                    else:
+                        cur.copy_expert(sql, io.BytesIO(dados))
+            except Exception:
+                if ociosa:
+                    conn.rollback()
+                else:
+                    cur.execute("ROLLBACK TO SAVEPOINT aoi_stage")
+                raise
+            if not ociosa:
+                cur.execute("RELEASE SAVEPOINT aoi_stage")
+        if ociosa and not conn.autocommit:
+            conn.commit()
+        return ociosa
+
+    async def garantir_async(self, conn, srids=()):
+        """
+        Como garantir, em uma conexão assíncrona do psycopg 3 (AsyncConnection).
+        conn.transaction() abre uma transação própria em conexões com autocommit
+        e um savepoint se já houver uma transação em andamento.
+        """
+        async with conn.cursor() as cur:
+            await cur.execute(self.EXISTENTES_SQL, (PREFIXO + "%",))
+            existentes = dict(await cur.fetchall())
+        passos = self.passos(existentes, srids)
+        if not passos:
+            return
+        async with conn.transaction():
+            async with conn.cursor() as cur:
+                for sql, dados in passos:
+                    if dados is None:
+                        await cur.execute(sql)
+                    else:
+                        async with cur.copy(sql) as copia:
+                            await copia.write(dados)
+
+    def _passos_subdividida(self) -> list[tuple[str, bytes | None]]:
+        """
+        Carrega a AOI em uma tabela auxiliar e grava na tabela final os pedaços
+        gerados por ST_Subdivide.
+        """
+        bruta = f'pg_temp."{self.table_name}_bruta"'
+        return [
+            (f"""
+                CREATE TEMPORARY TABLE "{self.table_name}_bruta" (
+                    id integer,
+                    aoi_id text,
+                    geom geometry(Geometry, {SRID}) NOT NULL
+                )
+            """, None),
+            (f"COPY {bruta} (id, aoi_id, geom) FROM STDIN WITH (FORMAT binary)", self._copy_binario().getvalue()),
+            (f"""
+                INSERT INTO {self.tabela_sql()} (id, aoi_id, geom)
+                SELECT row_number() OVER (), aoi_id, pedaco
+                FROM (
+                    SELECT aoi_id, ST_Subdivide(geom, {int(self.max_vertices)}) AS pedaco FROM {bruta}
+                ) s
+            """, None),
+            (f"DROP TABLE {bruta}", None),
+        ]
+
+    def pedacos(self, conn: connection) -> int:
+        """
+        Número de geometrias (feições ou pedaços) carregadas na tabela da AOI.
+        """
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT COUNT(*) FROM {self.tabela_sql()}")
+            return cur.fetchone()[0]
+
+    def descartar(self, conn: connection):
+        """
+        Remove as tabelas temporárias desta AOI da sessão.
+        """
+        with conn.cursor() as cur:
+            for nome in self._existentes(conn):
+                if nome.startswith(self.table_name):
+                    cur.execute(f'DROP TABLE IF EXISTS pg_temp."{nome}"')
+        conn.commit()
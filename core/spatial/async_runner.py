@@ -0,0 +1,298 @@
+"""
+Este módulo define a classe AsyncIntersectionRunner, uma variante do
+IntersectionRunner que executa as consultas das camadas com asyncio, em
+conexões assíncronas do psycopg 3.
+
+Em esquemas com milhares de camadas pequenas, o tempo de cada consulta é
+dominado pela latência (ida e volta ao servidor), não pelo processamento. Em vez
+de uma thread por conexão, um único laço de eventos mantém N conexões ocupadas:
+assim que uma consulta termina, a conexão recebe a próxima camada, sem troca
+de threads.
+
+- workers: número de conexões assíncronas, isto é, o limite de consultas
+  simultâneas (as conexões não saem do pool do PostgresConnector; apenas os
+  parâmetros de conexão são os mesmos)
+- timeout_consulta / nova_tentativa: como no IntersectionRunner; o tempo da
+  consulta de contagem é controlado pelo laço de eventos (asyncio.wait_for), e
+  a consulta que o excede é cancelada no servidor
+- cancel(): interrompe o laço e cancela no servidor as consultas em andamento
+
+A interface é a mesma do IntersectionRunner (iter_resultados, iter_lote,
+perfil_camada, execucao, cancel, cancelado): os resultados são produzidos na
+ordem das camadas, por um iterador comum, e o laço de eventos roda em uma
+thread própria. A preparação (triagem por extensão, marcadores, colunas chave,
+índices), o perfil sob demanda e o EXPLAIN continuam na conexão principal.
+
+Cada conexão usa autocommit: a AOI é carregada uma vez por conexão em uma
+transação própria, e uma consulta cancelada não deixa a sessão em transação
+abortada.
+"""
+
+import asyncio
+import threading
+from collections import deque
+from queue import Queue
+
+from psycopg import errors, pq
+
+from core.db.schema_manager import Layer
+from core.spatial.intersection_runner import IntersectionRunner
+
+# Marca o fim dos resultados na fila entre o laço de eventos e o iterador
+_FIM = object()
+
+
+class AsyncIntersectionRunner(IntersectionRunner):
+    def __init__(self, *args, **kwargs):
+        """
+        Mesmos parâmetros do IntersectionRunner. O pool (PostgresConnector) é
+        obrigatório: dele vêm os parâmetros das conexões assíncronas.
+        """
+        super().__init__(*args, **kwargs)
+        if self.pool is None:
+            raise ValueError("O motor assíncrono exige o conector (pool) com os parâmetros de conexão.")
+        self._laco: tuple[asyncio.AbstractEventLoop, asyncio.Task] | None = None
+
+    def cancel(self):
+        """
+        Solicita o cancelamento: além do cancelamento da conexão principal,
+        interrompe o laço de eventos, cujas consultas em andamento são
+        canceladas no servidor pelo psycopg. Pode ser chamado de outra thread.
+        """
+        super().cancel()
+        with self._lock:
+            laco = self._laco
+        if laco is not None:
+            loop, tarefa = laco
+            try:
+                loop.call_soon_threadsafe(tarefa.cancel)
+            except RuntimeError:
+                pass  # o laço já terminou
+
+    # ------------------------------------------------------------------
+    # Iteração
+    # ------------------------------------------------------------------
+
+    def iter_resultados(self, amostras: bool = True):
+        """
+        Como IntersectionRunner.iter_resultados, com as consultas no laço de eventos.
+        """
+        self._preparar_execucao()
+        if amostras:
+            # As colunas vêm do catálogo, na conexão principal, antes do laço
+            for layer in self.layers:
+                self.colunas_camada(self.conn, layer)
+        async def processar(conn, layer):
+            return await self._processar_async(conn, layer, amostras)
+
+        yield from self._com_nova_tentativa(
+            lambda layers: self._percorrer_async(processar, {"count": 0}, layers), self._estimar
+        )
+
+    def iter_lote(self):
+        """
+        Como IntersectionRunner.iter_lote, com as consultas no laço de eventos.
+        """
+        if self.campo_id is None:
+            raise ValueError("Informe campo_id para usar o modo em lote.")
+        self._preparar_execucao(lote=True)
+        yield from self._com_nova_tentativa(
+            lambda layers: self._percorrer_async(self._processar_lote_async, {"por_aoi": {}}, layers)
+        )
+
+    def _percorrer_async(self, processar, vazio: dict, layers: list[Layer]):
+        """
+        Executa o laço de eventos em uma thread e devolve os resultados, na ordem
+        das camadas, à medida que chegam. Se o iterador for abandonado, o laço é
+        cancelado e as conexões fechadas.
+        """
+        if not layers or self._cancelado:
+            return
+        saida: Queue = Queue()
+        # SelectorEventLoop: o psycopg 3 não funciona com o ProactorEventLoop (padrão no Windows)
+        loop = asyncio.SelectorEventLoop()
+        tarefa = loop.create_task(self._executar(processar, vazio, layers, saida))
+
+        def rodar():
+            try:
+                loop.run_until_complete(tarefa)
+            except asyncio.CancelledError:
+                pass
+            except BaseException as e:
+                saida.put(e)
+            finally:
+                saida.put(_FIM)
+
+        with self._lock:
+            self._laco = (loop, tarefa)
+        thread = threading.Thread(target=rodar, name="intersecao-async", daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = saida.get()
+                if item is _FIM:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            loop.call_soon_threadsafe(tarefa.cancel)
+            thread.join()
+            with self._lock:
+                self._laco = None
+            loop.close()
+
+    async def _executar(self, processar, vazio: dict, layers: list[Layer], saida: Queue):
+        """
+        Abre as conexões, distribui as camadas entre elas (no máximo 2 * conexões
+        camadas pendentes) e coloca os resultados em `saida`, na ordem das camadas.
+        """
+        n = min(self.workers, len(layers))
+        livres: asyncio.Queue = asyncio.Queue()
+        abertas = []
+        pendentes = deque()
+        try:
+            for _ in range(n):
+                conn = await self._abrir()
+                abertas.append(conn)
+                livres.put_nowait(conn)
+
+            async def tarefa(layer: Layer):
+                conn = await livres.get()
+                try:
+                    r = await self._consultar_async(conn, layer, processar, vazio)
+                except asyncio.CancelledError:
+                    livres.put_nowait(conn)
+                    raise
+                # Uma consulta interrompida pelo tempo limite pode deixar a conexão inutilizável
+                if conn.closed or conn.info.transaction_status != pq.TransactionStatus.IDLE:
+                    conn = await self._reabrir(conn, abertas)
+                livres.put_nowait(conn)
+                return r
+
+            camadas = iter(layers)
+            for layer in camadas:
+                pendentes.append(asyncio.ensure_future(tarefa(layer)))
+                if len(pendentes) >= 2 * n:
+                    break
+
+            while pendentes:
+                r = await pendentes.popleft()
+                if r is None or self._cancelado:
+                    return
+                layer = next(camadas, None)
+                if layer is not None:
+                    pendentes.append(asyncio.ensure_future(tarefa(layer)))
+                saida.put(r)
+        finally:
+            for futuro in pendentes:
+                futuro.cancel()
+            await asyncio.gather(*pendentes, return_exceptions=True)
+            for conn in abertas:
+                await conn.close()
+
+    async def _abrir(self):
+        """
+        Abre uma conexão assíncrona e carrega nela a AOI, em todos os SRIDs das camadas.
+        """
+        conn = await self.pool.conectar_async()
+        if self.stage is not None:
+            try:
+                with self.tempos.medir("preparacao.aoi_na_sessao"):
+                    await self.stage.garantir_async(conn, self.srids)
+            except BaseException:
+                await conn.close()
+                raise
+        return conn
+
+    async def _reabrir(self, conn, abertas: list):
+        """
+        Substitui uma conexão quebrada (ou ainda ocupada) por uma nova. Se não for
+        possível, a antiga continua na fila, e as próximas camadas nela são
+        registradas com erro.
+        """
+        try:
+            nova = await self._abrir()
+        except Exception:
+            return conn
+        try:
+            await conn.close()
+        except Exception:
+            pass
+        abertas[abertas.index(conn)] = nova
+        return nova
+
+    async def _consultar_async(self, conn, layer: Layer, processar, vazio: dict) -> dict | None:
+        """
+        Executa processar(conn, layer) tratando erros como
+        IntersectionRunner._consultar_seguro. Retorna None se a execução foi cancelada.
+        """
+        if self._cancelado:
+            return None
+        try:
+            return await processar(conn, layer)
+        except asyncio.TimeoutError:
+            return self._esgotada(layer, vazio)
+        except errors.QueryCanceled:
+            if self._cancelado:
+                return None
+            return {"tabela": layer.nome, **vazio, "erro": "consulta cancelada"}
+        except Exception as e:
+            return {"tabela": layer.nome, **vazio, "erro": str(e)}
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    async def _executar_limitado(self, cur, sql: str, params):
+        """
+        Executa uma consulta com o limite em vigor; ao excedê-lo, a consulta é
+        cancelada no servidor e asyncio.TimeoutError é levantado.
+        """
+        await asyncio.wait_for(cur.execute(sql, params), self._limite)
+
+    async def _processar_async(self, conn, layer: Layer, amostras: bool) -> dict:
+        """
+        Como IntersectionRunner.processar_camada (contagem, chaves e, se pedido,
+        perfil dos campos), em uma conexão assíncrona.
+        """
+        chave = self._chave_cache(layer, amostras)
+        resultado = self._resultado_sem_consulta(layer, chave)
+        if resultado is not None:
+            return resultado
+
+        coluna = self.coluna_chave(layer)
+        sql, params = self.planner.count_sql(layer, coluna, self.max_chaves)
+        async with conn.cursor() as cur:
+            with self.tempos.medir("consulta", layer.nome) as medida:
+                await self._executar_limitado(cur, sql, params)
+                linha = await cur.fetchone()
+                medida["linhas"] = linha[0]
+            resultado = self._resultado_contagem(layer, coluna, linha)
+
+            if resultado["count"] > 0 and amostras:
+                colunas = self.colunas_camada(self.conn, layer)
+                resultado["colunas"] = colunas
+                with self.tempos.medir("consulta.perfil", layer.nome):
+                    linhas = []
+                    if colunas:
+                        sql, params = self.profiler.perfil_sql(layer, colunas)
+                        # O limite vale só para a contagem, já concluída
+                        await cur.execute(sql, params)
+                        linhas = await cur.fetchall()
+                    resultado["perfil"] = self.profiler.montar(colunas, linhas)
+        return self._concluir(layer, chave, resultado)
+
+    async def _processar_lote_async(self, conn, layer: Layer) -> dict:
+        """
+        Como IntersectionRunner.processar_camada_lote, em uma conexão assíncrona.
+        """
+        if layer in self.fora_extensao:
+            return {"tabela": layer.nome, "por_aoi": {}, "fora_extensao": True}
+        sql, params = self.planner.count_lote_sql(layer)
+        async with conn.cursor() as cur:
+            with self.tempos.medir("consulta", layer.nome) as medida:
+                await self._executar_limitado(cur, sql, params or None)
+                linhas = await cur.fetchall()
+                medida["linhas"] = sum(total for _, total, _ in linhas)
+        return self._resultado_lote(layer, linhas)
@@ -0,0 +1,145 @@
+"""
+Este módulo define a interface dos motores espaciais (SpatialBackend) e o motor
+PostGIS (PostGISBackend), que a implementa sobre IntersectionRunner e GPKGExporter.
+
+Um motor lista as camadas disponíveis e cria, para uma AOI:
+- o executor das interseções (runner), com iter_resultados, iter_lote,
+  perfil_camada, cancel e cancelado, produzindo os mesmos dicionários de resultado
+- o exportador (exporter), com export_layers e o mesmo relatório por camada
+
+Assim, a linha de comando e os benchmarks funcionam igualmente sobre um banco
+PostGIS ou sobre arquivos locais (ver LocalBackend, em local_engine).
+As opções específicas de cada motor são informadas no construtor do motor.
+"""
+
+import os
+import re
+
+from core.db.schema_manager import Layer
+from core.spatial.aoi import AOI
+from utils.run_profiler import RunProfiler
+
+
+class SpatialBackend:
+    # Identificação do motor (resumos, benchmarks)
+    nome = ""
+
+    def listar_camadas(self) -> list[Layer]:
+        """
+        Camadas espaciais disponíveis no motor.
+        """
+        raise NotImplementedError
+
+    def runner(self, aoi: AOI, layers: list[Layer], workers: int = 1, top_n: int = 5,
+               campo_id: str | None = None, tempos: RunProfiler | None = None):
+        """
+        Cria o executor das interseções da AOI com as camadas.
+        """
+        raise NotImplementedError
+
+    def exporter(self, aoi: AOI, runner=None, workers: int = 1, reparar: bool = False,
+                 tempos: RunProfiler | None = None):
+        """
+        Cria o exportador para GeoPackage. Com `runner` (da mesma AOI), o
+        exportador reaproveita o que a interseção já encontrou.
+        """
+        raise NotImplementedError
+
+    def exportar_por_aoi(self, aoi: AOI, campo_id: str, resultados: list[dict], layers: list[Layer],
+                         diretorio: str, log_func=print, **opcoes) -> dict[str, dict]:
+        """
+        Modo em lote: exporta um GeoPackage por área da AOI (<diretorio>/<aoi_id>.gpkg),
+        com a própria área e as camadas em que ela teve interseção.
+
+        Parâmetros:
+        - resultados: dicionários de iter_lote ('tabela', 'por_aoi')
+        - layers: descritores das camadas consultadas
+        - opcoes: repassadas a exporter (workers, reparar, tempos...)
+
+        Retorna, por área, o relatório de export_layers.
+        """
+        os.makedirs(diretorio, exist_ok=True)
+        por_nome = {layer.nome: layer for layer in layers}
+        camadas_por_aoi: dict[str, list[Layer]] = {}
+        for r in resultados:
+            for aoi_id in r.get("por_aoi", {}):
+                camadas_por_aoi.setdefault(aoi_id, []).append(por_nome[r["tabela"]])
+
+        relatorios = {}
+        for aoi_id, camadas in camadas_por_aoi.items():
+            caminho = os.path.join(diretorio, re.sub(r"[^\w.-]", "_", aoi_id) + ".gpkg")
+            log_func(f"[Info] Exportando área '{aoi_id}' ({len(camadas)} camadas).")
+            area = aoi.subconjunto(campo_id, aoi_id)
+            exporter = self.exporter(area, **opcoes)
+            relatorios[aoi_id] = exporter.export_layers(camadas, caminho, log_func=log_func, aoi_path=area.filepath)
+        return relatorios
+
+
+class PostGISBackend(SpatialBackend):
+    nome = "postgis"
+
+    def __init__(self, conn, schema: str, pool=None, catalogo=None, max_vertices: int | None = None,
+                 criar_indices: bool = False, cache_resultados=None, assincrono: bool = False,
+                 timeout_consulta: float | None = None, nova_tentativa: str | None = None,
+                 fator_nova_tentativa: float = 10.0):
+        """
+        Parâmetros:
+        - conn: conexão principal
+        - schema: esquema com as camadas espaciais
+        - pool: PostgresConnector de onde saem as conexões extras (modo paralelo)
+        - catalogo: CatalogCache para a lista de camadas, colunas e extensões
+        - max_vertices / criar_indices / cache_resultados: ver IntersectionRunner
+        - assincrono: usa o AsyncIntersectionRunner (psycopg 3, asyncio); workers
+          passa a ser o número de conexões assíncronas
+        - timeout_consulta / nova_tentativa / fator_nova_tentativa: tempo máximo de
+          cada consulta de uma camada e o tratamento das camadas de tempo esgotado
+          (ver IntersectionRunner)
+        """
+        self.conn = conn
+        self.schema = schema
+        self.pool = pool
+        self.catalogo = catalogo
+        self.max_vertices = max_vertices
+        self.criar_indices = criar_indices
+        self.cache_resultados = cache_resultados
+        self.assincrono = assincrono
+        self.timeout_consulta = timeout_consulta
+        self.nova_tentativa = nova_tentativa
+        self.fator_nova_tentativa = fator_nova_tentativa
+
+    def listar_camadas(self) -> list[Layer]:
+        if self.catalogo is not None:
+            return self.catalogo.list_layers(self.conn, self.schema)
+        from core.db.schema_manager import SchemaManager
+
+        return SchemaManager(self.conn).list_layers(self.schema)
+
+    def runner(self, aoi: AOI, layers: list[Layer], workers: int = 1, top_n: int = 5,
+               campo_id: str | None = None, tempos: RunProfiler | None = None):
+        from core.spatial.intersection_runner import IntersectionRunner
+
+        classe = IntersectionRunner
+        if self.assincrono:
+            from core.spatial.async_runner import AsyncIntersectionRunner
+
+            classe = AsyncIntersectionRunner
+        return classe(
+            self.conn, aoi, self.schema, layers,
+            workers=workers, pool=self.pool, max_vertices=self.max_vertices,
+            criar_indices=self.criar_indices, catalogo=self.catalogo,
+            # O modo em lote não usa o cache de resultados
+            cache_resultados=self.cache_resultados if campo_id is None else None,
+            campo_id=campo_id, top_n=top_n, tempos=tempos,
+            timeout_consulta=self.timeout_consulta, nova_tentativa=self.nova_tentativa,
+            fator_nova_tentativa=self.fator_nova_tentativa
+        )
+
+    def exporter(self, aoi: AOI, runner=None, workers: int = 1, reparar: bool = False,
+                 tempos: RunProfiler | None = None):
+        from core.exporter.gpkg_exporter import GPKGExporter
+
+        return GPKGExporter(
+            self.conn, aoi, self.schema, max_vertices=self.max_vertices,
+            workers=workers, pool=self.pool, execucao=runner.execucao if runner is not None else None,
+            reparar=reparar, tempos=tempos
+        )
@@ -0,0 +1,155 @@
+"""
+Este módulo define a classe ExtentScreen, que faz uma triagem das camadas pela
+extensão (bounding box) antes de qualquer consulta por feição.
+
+A extensão de cada camada é obtida uma única vez com ST_EstimatedExtent (lida das
+estatísticas do ANALYZE, sem varrer a tabela). Quando não há estatísticas, usa-se
+ST_Extent, cujo resultado fica em cache durante a execução do programa e, se houver
+um CatalogCache, também em disco; nos dois casos o cache é associado ao marcador
+de alteração da tabela e deixa de valer quando os dados mudam.
+
+Camadas cuja extensão não sobrepõe a bbox da AOI (no SRID da camada) não podem
+intersectá-la e são descartadas sem consulta.
+"""
+
+import threading
+
+from psycopg2.extensions import connection
+
+from core.db.catalog_cache import CatalogCache
+from core.db.schema_manager import Layer
+from core.spatial.aoi import AOI
+
+Extent = tuple[float, float, float, float]  # xmin, ymin, xmax, ymax
+
+
+class ExtentScreen:
+    # Extensões exatas (ST_Extent) já calculadas, por (dsn, esquema, tabela, coluna):
+    # (marcador de alteração da tabela no cálculo, extensão)
+    _cache_exato: dict[tuple, tuple[str, Extent | None]] = {}
+    _cache_lock = threading.Lock()
+
+    def __init__(self, conn: connection, margem: float = 0.1, exato: bool = False,
+                 catalogo: CatalogCache | None = None):
+        """
+        Parâmetros:
+        - conn: conexão usada para consultar as extensões
+        - margem: fração da largura/altura acrescentada a cada lado da extensão
+          estimada. ST_EstimatedExtent se baseia em uma amostra e pode ser
+          ligeiramente menor que a extensão real; a margem evita descartar camadas
+          cujas feições extremas ficaram fora da amostra
+        - exato: usa sempre ST_Extent (varre a tabela, com cache)
+        - catalogo: cache em disco para as extensões exatas
+        """
+        self.conn = conn
+        self.margem = margem
+        self.exato = exato
+        self.catalogo = catalogo
+        self._marcadores: dict[str, dict[str, str]] = {}
+
+    def _marcador(self, layer: Layer) -> str | None:
+        """
+        Marcador de alteração dos dados da tabela, lido uma vez por esquema a cada
+        triagem, ou None se a tabela não aparece nas estatísticas (views).
+        """
+        if layer.schema not in self._marcadores:
+            self._marcadores[layer.schema] = CatalogCache.marcadores_tabelas(self.conn, layer.schema)
+        return self._marcadores[layer.schema].get(layer.table)
+
+    @staticmethod
+    def _box(valor) -> Extent | None:
+        if valor is None:
+            return None
+        return tuple(float(v) for v in valor)
+
+    def _estimada(self, cur, layer: Layer) -> Extent | None:
+        cur.execute("SAVEPOINT extensao")
+        try:
+            cur.execute("""
+                SELECT ST_XMin(e), ST_YMin(e), ST_XMax(e), ST_YMax(e)
+                FROM (SELECT ST_EstimatedExtent(%s, %s, %s) AS e) s
+                WHERE e IS NOT NULL
+            """, (layer.schema, layer.table, layer.geom_col))
+            linha = cur.fetchone()
+            cur.execute("RELEASE SAVEPOINT extensao")
+        except Exception:
+            # Versões antigas do PostGIS levantam erro quando não há estatísticas
+            cur.execute("ROLLBACK TO SAVEPOINT extensao")
+            return None
+        if linha is None:
+            return None
+        xmin, ymin, xmax, ymax = self._box(linha)
+        dx = (xmax - xmin) * self.margem
+        dy = (ymax - ymin) * self.margem
+        return xmin - dx, ymin - dy, xmax + dx, ymax + dy
+
+    def _exata(self, cur, layer: Layer) -> Extent | None:
+        marcador = self._marcador(layer)
+        chave = (self.conn.dsn, layer.schema, layer.table, layer.geom_col)
+        with self._cache_lock:
+            entrada = self._cache_exato.get(chave)
+        if marcador is not None and entrada is not None and entrada[0] == marcador:
+            return entrada[1]
+
+        if self.catalogo is not None:
+            extensao, encontrada = self.catalogo.extensao(layer, marcador)
+            if encontrada:
+                with self._cache_lock:
+                    self._cache_exato[chave] = (marcador, extensao)
+                return extensao
+
+        cur.execute(f"""
+            SELECT ST_XMin(e), ST_YMin(e), ST_XMax(e), ST_YMax(e)
+            FROM (SELECT ST_Extent(t."{layer.geom_col}") AS e FROM {layer.tabela_sql} t) s
+        """)
+        linha = cur.fetchone()
+        extensao = None if linha is None or linha[0] is None else self._box(linha)
+        # Sem marcador não há como saber se a tabela mudou: nada fica em memória
+        with self._cache_lock:
+            if marcador is not None:
+                self._cache_exato[chave] = (marcador, extensao)
+            else:
+                self._cache_exato.pop(chave, None)
+        if self.catalogo is not None:
+            self.catalogo.guardar_extensao(layer, marcador, extensao, salvar=False)
+        return extensao
+
+    def extensao(self, cur, layer: Layer) -> Extent | None:
+        """
+        Extensão da camada no seu SRID nativo, ou None se a camada estiver vazia.
+        """
+        if not self.exato:
+            estimada = self._estimada(cur, layer)
+            if estimada is not None:
+                return estimada
+        return self._exata(cur, layer)
+
+    @staticmethod
+    def sobrepoe(a: Extent, b: Extent) -> bool:
+        return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+    def fora_da_aoi(self, aoi: AOI, layers: list[Layer]) -> set[Layer]:
+        """
+        Retorna as camadas que certamente não intersectam a AOI: camadas vazias
+        ou cuja extensão não sobrepõe a bbox da AOI. Camadas sem SRID declarado
+        e falhas na consulta de extensão nunca são descartadas.
+        """
+        descartar = set()
+        with self.conn.cursor() as cur:
+            for layer in layers:
+                if layer.srid == 0:
+                    continue
+                try:
+                    extensao = self.extensao(cur, layer)
+                    bbox_aoi = aoi.bounds(layer.srid)
+                except Exception:
+                    self.conn.rollback()
+                    continue
+                if extensao is None or not self.sobrepoe(extensao, bbox_aoi):
+                    descartar.add(layer)
+        if self.catalogo is not None:
+            try:
+                self.catalogo.salvar()
+            except OSError:
+                pass  # o cache em disco é opcional
+        return descartar
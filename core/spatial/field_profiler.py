@@ -0,0 +1,106 @@
+"""
+Este módulo define a classe FieldProfiler, que monta o perfil dos campos de uma
+camada para a aba de resultados: para cada coluna não geométrica, os N valores
+mais frequentes (com a frequência), o número de nulos e o número de valores
+distintos.
+
+O perfil considera apenas as feições que intersectam a AOI (mesmo filtro do
+QueryPlanner) e é calculado inteiramente no servidor, em uma única consulta por
+camada. As colunas geométricas nunca são lidas: a consulta seleciona apenas as
+colunas informadas, e só o resultado agregado atravessa a rede.
+
+Para limitar o custo em camadas com muitas feições encontradas, o perfil pode
+ser calculado sobre as primeiras `limite_feicoes` feições.
+"""
+
+from core.db.schema_manager import Layer
+from core.spatial.query_planner import QueryPlanner
+
+
+class FieldProfiler:
+    def __init__(self, planner: QueryPlanner, top_n: int = 5, limite_feicoes: int | None = 100_000,
+                 max_caracteres: int = 200):
+        """
+        Parâmetros:
+        - planner: fornece o filtro de interseção de cada camada
+        - top_n: número de valores mais frequentes por coluna
+        - limite_feicoes: máximo de feições consideradas por camada (None: todas)
+        - max_caracteres: valores mais longos são truncados no servidor
+        """
+        self.planner = planner
+        self.top_n = max(1, top_n)
+        self.limite_feicoes = limite_feicoes
+        self.max_caracteres = max_caracteres
+
+    def perfil_sql(self, layer: Layer, colunas: list[str]) -> tuple[str, tuple]:
+        """
+        Consulta do perfil: uma linha (coluna, valor, frequência, distintos) para
+        cada um dos top_n valores de cada coluna, mais uma linha com valor NULL
+        e o número de nulos, quando houver.
+
+        As linhas são transpostas com to_jsonb/jsonb_each_text, o que permite
+        agregar todas as colunas, de qualquer tipo, em uma única passada.
+        """
+        filtro, params = self.planner.filtro_camada(layer)
+        selecao = ", ".join('t."{}"'.format(c.replace('"', '""')) for c in colunas)
+        limite = "LIMIT %s" if self.limite_feicoes else ""
+        sql = f"""
+            WITH f AS (
+                SELECT {selecao} FROM {layer.tabela_sql} t
+                WHERE {filtro}
+                {limite}
+            ),
+            v AS (
+                SELECT e.key AS coluna, left(e.value, %s) AS valor
+                FROM f, jsonb_each_text(to_jsonb(f)) e
+            ),
+            g AS (
+                SELECT coluna, valor, COUNT(*) AS freq
+                FROM v
+                GROUP BY coluna, valor
+            ),
+            r AS (
+                SELECT coluna, valor, freq,
+                       row_number() OVER (PARTITION BY coluna ORDER BY valor IS NULL, freq DESC, valor) AS pos,
+                       COUNT(valor) OVER (PARTITION BY coluna) AS distintos
+                FROM g
+            )
+            SELECT coluna, valor, freq, distintos
+            FROM r
+            WHERE valor IS NULL OR pos <= %s
+            ORDER BY coluna, pos;
+        """
+        params = tuple(params)
+        if self.limite_feicoes:
+            params += (int(self.limite_feicoes),)
+        params += (int(self.max_caracteres), self.top_n)
+        return sql, params
+
+    def perfil(self, cur, layer: Layer, colunas: list[str]) -> dict[str, dict]:
+        """
+        Executa a consulta do perfil e retorna, na ordem de `colunas`:
+        {coluna: {"valores": [(valor, frequência), ...], "nulos": n, "distintos": n}}
+        """
+        if not colunas:
+            return self.montar(colunas, [])
+        sql, params = self.perfil_sql(layer, colunas)
+        cur.execute(sql, params)
+        return self.montar(colunas, cur.fetchall())
+
+    @staticmethod
+    def montar(colunas: list[str], linhas) -> dict[str, dict]:
+        """
+        Monta o perfil a partir das linhas (coluna, valor, frequência, distintos)
+        da consulta de perfil_sql.
+        """
+        perfil = {c: {"valores": [], "nulos": 0, "distintos": 0} for c in colunas}
+        for coluna, valor, freq, distintos in linhas:
+            entrada = perfil.get(coluna)
+            if entrada is None:
+                continue
+            if valor is None:
+                entrada["nulos"] = freq
+            else:
+                entrada["valores"].append((valor, freq))
+            entrada["distintos"] = distintos
+        return perfil
@@ -0,0 +1,54 @@
+"""
+Este módulo define a classe IntersectionRun, o registro de uma execução de
+interseção: para cada camada consultada, as chaves (chave primária ou ctid) das
+feições que intersectaram a AOI.
+
+Os exportadores usam esse registro para buscar as feições diretamente pelas
+chaves, sem repetir a consulta espacial. As chaves só são aproveitadas enquanto
+o marcador de alteração da tabela (pg_stat_user_tables + relfilenode) for o mesmo
+da execução; caso contrário, a camada volta a ser filtrada pela AOI.
+
+Observação: assim como no ResultCache, os contadores de pg_stat_user_tables são
+atualizados com um pequeno atraso; alterações feitas segundos antes da exportação
+podem ainda não ter mudado o marcador.
+"""
+
+from dataclasses import dataclass
+
+from core.db.schema_manager import Layer
+
+
+@dataclass(frozen=True)
+class Correspondencia:
+    """
+    Feições de uma camada que intersectaram a AOI.
+    """
+    coluna: str  # "ctid" ou o nome da chave primária
+    ids: tuple
+    marcador: str
+
+
+class IntersectionRun:
+    def __init__(self, aoi_hash: str | None):
+        """
+        Parâmetros:
+        - aoi_hash: hash do conteúdo da AOI usada na execução (AOI.hash)
+        """
+        self.aoi_hash = aoi_hash
+        self.camadas: dict[Layer, Correspondencia] = {}
+
+    def registrar(self, layer: Layer, coluna: str, ids, marcador: str):
+        self.camadas[layer] = Correspondencia(coluna, tuple(ids), marcador)
+
+    def correspondencia(self, layer: Layer, marcador_atual: str | None) -> Correspondencia | None:
+        """
+        Retorna as chaves registradas para a camada, ou None se não houver
+        registro ou se a tabela mudou desde a execução.
+        """
+        registro = self.camadas.get(layer)
+        if registro is None or marcador_atual is None or registro.marcador != marcador_atual:
+            return None
+        return registro
+
+    def __len__(self) -> int:
+        return len(self.camadas)
@@ -6,18 +6,146 @@ Cada tabela é verificada com a função ST_Intersects e o número de feições
 é contabilizado.
 
 Resultado: uma lista de dicionários contendo o nome da tabela, a contagem de interseções,
-as colunas não-geométricas e algumas linhas amostrais.
+as colunas não-geométricas e o perfil dos campos (valores mais frequentes entre as
+feições encontradas, ver FieldProfiler).
+
+As tabelas podem ser processadas em série, em uma única conexão, ou distribuídas
+entre várias conexões simultâneas (modo paralelo), mantendo sempre a ordem
+original das tabelas nos resultados.
+
+As chaves das feições encontradas em cada camada ficam registradas em um
+IntersectionRun (self.execucao), para que a exportação não repita a consulta espacial.
+
+Modo em lote (campo_id): a AOI contém várias áreas identificadas por um campo
+(ex: todos os imóveis rurais de um município). Todas são carregadas em uma única
+tabela temporária indexada e cada camada é consultada uma única vez, com uma
+junção agrupada por área (GROUP BY aoi_id), em vez de uma consulta por área.
+
+Os tempos de cada etapa e de cada camada são registrados em self.tempos
+(RunProfiler); explicar_mais_lentas captura o plano EXPLAIN (ANALYZE, BUFFERS)
+das camadas com a consulta mais demorada.
+
+Com timeout_consulta, a consulta de contagem de cada camada tem um tempo máximo
+(SET LOCAL statement_timeout): uma tabela grande sem índice não trava mais a
+execução inteira. As camadas com tempo esgotado saem com 'erro' e
+'tempo_esgotado' e ficam em self.esgotadas. Com nova_tentativa, elas são
+adiadas para o final da execução e repetidas com um limite maior ('ampliada')
+ou substituídas pela estimativa do planejador ('estimativa', sem executar a
+consulta), de modo que a execução termina em tempo previsível.
 """
 
-from psycopg2.extensions import connection
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+
+from psycopg2.extensions import connection, QueryCanceledError, TRANSACTION_STATUS_IDLE
+from core.db.catalog_cache import CatalogCache
+from core.db.connector import PostgresConnector
+from core.db.schema_manager import Layer, SchemaManager
+from core.spatial.aoi import AOI, aoi_sql_param
+from core.spatial.aoi_stage import AOIStage
+from core.spatial.extent_screen import ExtentScreen
+from core.spatial.field_profiler import FieldProfiler
+from core.spatial.intersection_run import IntersectionRun
+from core.spatial.query_planner import QueryPlanner
+from core.spatial.result_cache import ResultCache
+from utils.run_profiler import RunProfiler
+
+NOVAS_TENTATIVAS = (None, "ampliada", "estimativa")
 
 
 class IntersectionRunner:
-    def __init__(self, conn: connection, aoi_wkt: str, schema: str, tables: list[str]):
+    def __init__(self, conn: connection, aoi: AOI | str, schema: str, tables: list[Layer | str],
+                 workers: int = 1, pool: PostgresConnector | None = None,
+                 staging: bool = True, aoi_por_feicao: bool = False, max_vertices: int | None = None,
+                 criar_indices: bool = False, filtro_extensao: bool = True,
+                 catalogo: CatalogCache | None = None, cache_resultados: ResultCache | None = None,
+                 reter_chaves: bool = True, max_chaves: int = 1_000_000,
+                 campo_id: str | None = None, top_n: int = 5, tempos: RunProfiler | None = None,
+                 timeout_consulta: float | None = None, nova_tentativa: str | None = None,
+                 fator_nova_tentativa: float = 10.0):
+        """
+        Parâmetros:
+        - conn: conexão principal, usada no modo serial e como uma das conexões do modo paralelo
+        - aoi: instância de AOI (enviada em WKB) ou geometria em WKT
+        - tables: descritores de camada (SchemaManager.list_layers) ou nomes de tabela;
+          nomes assumem a coluna 'geom' em SRID 4674
+        - workers: número de conexões simultâneas; 1 mantém a execução serial
+        - pool: conector de onde são retiradas as conexões extras (obrigatório se workers > 1)
+        - staging: carrega a AOI em uma tabela temporária indexada em cada conexão
+          (apenas para instâncias de AOI), em vez de enviá-la a cada consulta
+        - aoi_por_feicao: na tabela temporária, mantém uma linha por feição da AOI
+        - max_vertices: subdivide a AOI na tabela temporária em pedaços de no máximo
+          esse número de vértices (ST_Subdivide); None desativa
+        - criar_indices: cria índices GiST nas camadas que não os possuem antes de consultar
+        - filtro_extensao: descarta sem consulta as camadas cuja extensão não sobrepõe
+          a bbox da AOI (apenas para instâncias de AOI)
+        - catalogo: cache do catálogo, usado para persistir as extensões das camadas
+        - cache_resultados: cache de resultados por camada; camadas cuja tabela não
+          mudou desde a última execução com a mesma AOI não são consultadas
+          (apenas para instâncias de AOI)
+        - reter_chaves: registra em self.execucao as chaves (chave primária ou ctid)
+          das feições encontradas, para a exportação buscá-las sem nova consulta espacial
+        - max_chaves: camadas com mais feições encontradas que isso não têm as chaves registradas
+        - campo_id: campo da AOI que identifica cada área, para o modo em lote (iter_lote)
+        - top_n: número de valores mais frequentes por campo no perfil das camadas
+        - tempos: recebe os tempos por etapa e por camada (padrão: o da AOI, se houver)
+        - timeout_consulta: tempo máximo, em segundos, da consulta de contagem de uma camada;
+          None desativa
+        - nova_tentativa: o que fazer, ao final, com as camadas de tempo esgotado:
+          'ampliada' (repete com um limite fator_nova_tentativa vezes maior) ou
+          'estimativa' (número de feições estimado pelo planejador; não se aplica
+          ao modo em lote). None mantém o erro
+        """
+        if campo_id is not None and not isinstance(aoi, AOI):
+            raise ValueError("O modo em lote exige uma instância de AOI.")
+        if nova_tentativa not in NOVAS_TENTATIVAS:
+            raise ValueError(f"nova_tentativa deve ser um de {NOVAS_TENTATIVAS}.")
+        if nova_tentativa is not None and timeout_consulta is None:
+            raise ValueError("nova_tentativa exige timeout_consulta.")
+        if nova_tentativa == "estimativa" and campo_id is not None:
+            raise ValueError("A nova tentativa 'estimativa' não se aplica ao modo em lote.")
         self.conn = conn
-        self.aoi_wkt = aoi_wkt
+        self.aoi = aoi
+        # Serializa a AOI uma única vez para todas as camadas
+        self._aoi_sql, self._aoi_param = aoi_sql_param(aoi)
+        self.campo_id = campo_id
+        self.stage = (
+            AOIStage(aoi, aoi_por_feicao, max_vertices, campo_id)
+            if (staging or campo_id is not None) and isinstance(aoi, AOI) else None
+        )
+        self._preparadas: set[int] = set()
+        self.planner = QueryPlanner(self.stage, self._aoi_sql, self._aoi_param)
+        self.profiler = FieldProfiler(self.planner, top_n)
+        self._colunas: dict[str, dict[str, list[str]]] = {}
+        self.criar_indices = criar_indices
+        self.sem_indice: set[Layer] = set()
+        self.filtro_extensao = filtro_extensao and isinstance(aoi, AOI)
+        self.fora_extensao: set[Layer] = set()
+        self.catalogo = catalogo
+        self.cache_resultados = cache_resultados if isinstance(aoi, AOI) else None
+        self._marcadores: dict[Layer, str] = {}
+        self.reter_chaves = reter_chaves
+        self.max_chaves = max_chaves
+        self._colunas_chave: dict[tuple[str, str], str | None] = {}
+        self.execucao = IntersectionRun(aoi.hash if isinstance(aoi, AOI) else None)
+        self.tempos = tempos or (aoi.tempos if isinstance(aoi, AOI) else RunProfiler(ativo=False))
         self.schema = schema
-        self.tables = tables
+        self.layers = [Layer.de(schema, t) for t in tables]
+        self.tables = [layer.nome for layer in self.layers]
+        self.workers = max(1, workers)
+        self.pool = pool
+        self.timeout_consulta = timeout_consulta
+        self.nova_tentativa = nova_tentativa
+        self.fator_nova_tentativa = max(1.0, fator_nova_tentativa)
+        self.esgotadas: set[Layer] = set()
+        # Limite em vigor (o da nova tentativa 'ampliada' é maior)
+        self._limite = timeout_consulta
+        self._cancelado = False
+        self._conexoes: list[connection] = [conn]
+        self._lock = threading.Lock()
 
     def run(self, conn, schema, aoi_geojson, include_zero=False, output_csv=None):
         """
@@ -93,6 +221,605 @@ class IntersectionRunner:
             self.logger.error(f"[Interseção] Erro ao executar interseções: {e}")
             return {}
 
+    @property
+    def cancelado(self) -> bool:
+        """
+        Indica se a execução foi cancelada pelo usuário.
+        """
+        return self._cancelado
+
+    def cancel(self):
+        """
+        Solicita o cancelamento da execução. Além de interromper o laço entre
+        camadas, envia um pedido de cancelamento ao servidor para a consulta
+        em andamento (equivalente a pg_cancel_backend), sem esperar que ela termine.
+        Pode ser chamado de outra thread.
+        """
+        self._cancelado = True
+        with self._lock:
+            conexoes = list(self._conexoes)
+        for conn in conexoes:
+            if conn is not None and conn.closed == 0:
+                conn.cancel()
+
+    def predicado(self, geom_col: str = "t.geom") -> tuple[str, tuple]:
+        """
+        Retorna o filtro de interseção com a AOI e seus parâmetros (ver QueryPlanner).
+        """
+        return self.planner.predicado(geom_col)
+
+    @property
+    def srids(self) -> set[int]:
+        """
+        SRIDs nativos das camadas consultadas.
+        """
+        return {layer.srid for layer in self.layers}
+
+    def verificar_indices(self) -> list[str]:
+        """
+        Identifica as camadas sem índice espacial na coluna geométrica e, se
+        criar_indices estiver ativo, cria os índices que faltam.
+        Retorna as camadas que continuam sem índice.
+        """
+        faltando = self.planner.camadas_sem_indice(self.conn, self.layers)
+        if self.criar_indices:
+            restantes = []
+            for layer in faltando:
+                if self._cancelado:
+                    restantes.append(layer)
+                    continue
+                try:
+                    self.planner.criar_indice(self.conn, layer)
+                except Exception:
+                    self.conn.rollback()
+                    restantes.append(layer)
+            faltando = restantes
+        self.sem_indice = set(faltando)
+        return faltando
+
+    def triagem_extensao(self) -> set[Layer]:
+        """
+        Identifica as camadas que não podem intersectar a AOI pela extensão.
+        """
+        if not self.filtro_extensao:
+            return set()
+        self.fora_extensao = ExtentScreen(self.conn, catalogo=self.catalogo).fora_da_aoi(self.aoi, self.layers)
+        return self.fora_extensao
+
+    def carregar_marcadores(self):
+        """
+        Lê o marcador de alteração de cada tabela consultada (uma consulta por esquema).
+        Camadas sem marcador (views, tabelas estrangeiras) nunca usam o cache nem
+        têm as chaves registradas.
+        """
+        if self.cache_resultados is None and not self.reter_chaves:
+            return
+        marcadores = {}
+        for schema in {layer.schema for layer in self.layers}:
+            marcadores[schema] = CatalogCache.marcadores_tabelas(self.conn, schema)
+        self._marcadores = {
+            layer: marcadores[layer.schema][layer.table]
+            for layer in self.layers
+            if layer.table in marcadores[layer.schema]
+        }
+
+    def carregar_colunas_chave(self):
+        """
+        Descobre a coluna que identifica as feições de cada tabela consultada
+        (ver QueryPlanner.chaves_tabelas).
+        """
+        if not self.reter_chaves:
+            return
+        for schema in {layer.schema for layer in self.layers}:
+            for tabela, coluna in self.planner.chaves_tabelas(self.conn, schema).items():
+                self._colunas_chave[(schema, tabela)] = coluna
+
+    def coluna_chave(self, layer: Layer) -> str | None:
+        """
+        Coluna usada para registrar as feições encontradas na camada: a chave
+        primária, ou o ctid. None se as chaves não são registradas para a camada.
+        """
+        if not self.reter_chaves or layer not in self._marcadores:
+            return None
+        return self._colunas_chave.get((layer.schema, layer.table))
+
+    def _chave_cache(self, layer: Layer, amostras: bool) -> str | None:
+        marcador = self._marcadores.get(layer)
+        if self.cache_resultados is None or marcador is None:
+            return None
+        return ResultCache.chave(
+            self.aoi.hash, layer, marcador, amostras=amostras, chaves=self.coluna_chave(layer),
+            # Limites que truncam as chaves registradas e a amostra do perfil
+            max_chaves=self.max_chaves, top_n=self.profiler.top_n,
+            limite_feicoes=self.profiler.limite_feicoes
+        )
+
+    def _registrar(self, layer: Layer, resultado: dict):
+        # As chaves ficam só no registro da execução (e no cache), não nos resultados
+        chaves = resultado.pop("chaves", None)
+        if chaves is not None and layer in self._marcadores:
+            self.execucao.registrar(layer, chaves["coluna"], chaves["ids"], self._marcadores[layer])
+
+    def preparar_conexao(self, conn: connection):
+        """
+        Garante que a AOI esteja carregada na sessão da conexão, em todos os SRIDs
+        das camadas (uma vez por execução). Se a carga ficou presa a uma transação
+        de quem usa a conexão (ver AOIStage.garantir), ela é conferida de novo a
+        cada camada, pois um rollback posterior a desfaz.
+        """
+        if self.stage is None or id(conn) in self._preparadas:
+            return
+        with self.tempos.medir("preparacao.aoi_na_sessao"):
+            duravel = self.stage.garantir(conn, self.srids)
+        if duravel:
+            with self._lock:
+                self._preparadas.add(id(conn))
+
+    def colunas_camada(self, conn: connection, layer: Layer) -> list[str]:
+        """
+        Colunas não geométricas da tabela da camada (uma consulta por esquema,
+        pelo cache do catálogo quando disponível).
+        """
+        with self._lock:
+            colunas = self._colunas.get(layer.schema)
+        if colunas is None:
+            if self.catalogo is not None:
+                colunas = self.catalogo.colunas(conn, layer.schema)
+            else:
+                colunas = SchemaManager(conn).list_columns(layer.schema)
+            with self._lock:
+                self._colunas[layer.schema] = colunas
+        return list(colunas.get(layer.table, []))
+
+    def processar_camada(self, cur, layer: Layer, amostras: bool = True) -> dict:
+        """
+        Conta as feições de uma tabela que intersectam a AOI e, se houver
+        interseção e `amostras` estiver ativo, calcula o perfil dos campos
+        sobre as feições encontradas para a aba de resultados.
+
+        Retorna um dicionário com 'tabela' e 'count' (feições válidas) e, quando
+        aplicável, 'invalidas', 'sem_indice', 'chaves', 'colunas' e 'perfil'.
+        """
+        coluna = self.coluna_chave(layer)
+        sql, params = self.planner.count_sql(layer, coluna, self.max_chaves)
+        with self._limitado(cur), self.tempos.medir("consulta", layer.nome) as medida:
+            cur.execute(sql, params)
+            linha = cur.fetchone()
+            medida["linhas"] = linha[0]
+
+        resultado = self._resultado_contagem(layer, coluna, linha)
+        if resultado["count"] > 0 and amostras:
+            colunas = self.colunas_camada(cur.connection, layer)
+            resultado["colunas"] = colunas
+            with self.tempos.medir("consulta.perfil", layer.nome):
+                resultado["perfil"] = self.profiler.perfil(cur, layer, colunas)
+        return resultado
+
+    @contextmanager
+    def _limitado(self, cur):
+        """
+        Aplica o limite em vigor apenas às consultas do bloco (SET LOCAL
+        statement_timeout); ao sair, o valor anterior é restaurado, de modo que
+        o perfil dos campos não é interrompido pelo limite da contagem. Se a
+        consulta falhar, a transação é desfeita e o limite, com ela.
+        """
+        if self._limite is None:
+            yield
+            return
+        cur.execute(
+            "SELECT current_setting('statement_timeout'), set_config('statement_timeout', %s, true)",
+            (str(max(1, int(self._limite * 1000))),)
+        )
+        anterior = cur.fetchone()[0]
+        yield
+        cur.execute("SELECT set_config('statement_timeout', %s, true)", (anterior,))
+
+    def _esgotada(self, layer: Layer, vazio: dict) -> dict:
+        """
+        Resultado de uma camada cuja consulta excedeu o limite em vigor.
+        """
+        with self._lock:
+            self.esgotadas.add(layer)
+        resultado = {
+            "tabela": layer.nome, **vazio, "tempo_esgotado": True,
+            "erro": f"tempo limite de {self._limite:g} s excedido",
+        }
+        if layer in self.sem_indice:
+            resultado["sem_indice"] = True
+        return resultado
+
+    def _resultado_contagem(self, layer: Layer, coluna: str | None, linha) -> dict:
+        """
+        Resultado de uma camada a partir da linha da consulta de contagem
+        (total, inválidas[, chaves]).
+        """
+        total, invalidas, *ids = linha
+        resultado = {"tabela": layer.nome, "count": total - invalidas}
+        if ids and ids[0] is not None:
+            resultado["chaves"] = {"coluna": coluna, "ids": ids[0]}
+        elif coluna is not None and total == 0:
+            resultado["chaves"] = {"coluna": coluna, "ids": []}
+        if invalidas:
+            resultado["invalidas"] = invalidas
+        if layer in self.sem_indice:
+            resultado["sem_indice"] = True
+        return resultado
+
+    def perfil_camada(self, conn: connection, layer: Layer) -> dict:
+        """
+        Calcula sob demanda o perfil dos campos de uma camada (ver FieldProfiler),
+        carregando a AOI na sessão da conexão se necessário.
+
+        Retorna {"colunas": [...], "perfil": {...}}.
+        """
+        if self.stage is not None:
+            self.stage.garantir(conn, self.srids)
+        colunas = self.colunas_camada(conn, layer)
+        with conn.cursor() as cur:
+            perfil = self.profiler.perfil(cur, layer, colunas)
+        conn.rollback()
+        return {"colunas": colunas, "perfil": perfil}
+
+    def _resultado_sem_consulta(self, layer: Layer, chave: str | None) -> dict | None:
+        """
+        Resultado das camadas que não precisam ser consultadas: descartadas pela
+        triagem de extensão (count 0) ou presentes no cache de resultados.
+        None se a camada precisa ser consultada.
+        """
+        if layer in self.fora_extensao:
+            coluna = self.coluna_chave(layer)
+            if coluna is not None:
+                self.execucao.registrar(layer, coluna, (), self._marcadores[layer])
+            return {"tabela": layer.nome, "count": 0, "fora_extensao": True}
+
+        if chave is not None:
+            em_cache = self.cache_resultados.get(chave)
+            if em_cache is not None:
+                em_cache["tabela"] = layer.nome
+                em_cache["cache"] = True
+                em_cache.pop("sem_indice", None)
+                if layer in self.sem_indice:
+                    em_cache["sem_indice"] = True
+                self._registrar(layer, em_cache)
+                return em_cache
+        return None
+
+    def _concluir(self, layer: Layer, chave: str | None, resultado: dict) -> dict:
+        """
+        Guarda no cache o resultado consultado e registra as chaves encontradas.
+        """
+        if chave is not None:
+            self.cache_resultados.put(chave, resultado)
+        self._registrar(layer, resultado)
+        return resultado
+
+    def _processar_seguro(self, conn: connection, cur, layer: Layer, amostras: bool) -> dict | None:
+        """
+        Processa uma camada tratando erros. Retorna None se a execução foi cancelada.
+        Camadas descartadas pela triagem de extensão retornam count 0 sem consulta.
+        """
+        chave = self._chave_cache(layer, amostras)
+        resultado = self._resultado_sem_consulta(layer, chave)
+        if resultado is not None:
+            return resultado
+        return self._consultar_seguro(
+            conn, layer, lambda: self._concluir(layer, chave, self.processar_camada(cur, layer, amostras)),
+            {"count": 0}
+        )
+
+    def _consultar_seguro(self, conn: connection, layer: Layer, consultar, vazio: dict) -> dict | None:
+        """
+        Executa a consulta de uma camada tratando erros: a camada é registrada com
+        os valores de `vazio` e a chave 'erro'. Retorna None se a execução foi cancelada.
+        """
+        try:
+            # A AOI só é carregada na sessão quando alguma camada precisa ser consultada
+            self.preparar_conexao(conn)
+            return consultar()
+        except QueryCanceledError:
+            conn.rollback()
+            if self._cancelado:
+                return None
+            if self._limite is not None:
+                return self._esgotada(layer, vazio)
+            return {"tabela": layer.nome, **vazio, "erro": "consulta cancelada"}
+        except Exception as e:
+            # Uma falha aborta a transação; desfaz para seguir nas próximas tabelas
+            conn.rollback()
+            return {"tabela": layer.nome, **vazio, "erro": str(e)}
+
+    def processar_camada_lote(self, cur, layer: Layer) -> dict:
+        """
+        Modo em lote: conta, em uma única consulta, as feições da camada que
+        intersectam cada área da AOI.
+
+        Retorna um dicionário com 'tabela', 'por_aoi' ({aoi_id: feições válidas},
+        apenas áreas com interseção) e, quando aplicável, 'invalidas' ({aoi_id: n})
+        e 'sem_indice'.
+        """
+        sql, params = self.planner.count_lote_sql(layer)
+        with self._limitado(cur), self.tempos.medir("consulta", layer.nome) as medida:
+            cur.execute(sql, params or None)
+            linhas = cur.fetchall()
+            medida["linhas"] = sum(total for _, total, _ in linhas)
+        return self._resultado_lote(layer, linhas)
+
+    def _resultado_lote(self, layer: Layer, linhas) -> dict:
+        """
+        Resultado do modo em lote a partir das linhas (aoi_id, total, inválidas).
+        """
+        por_aoi, invalidas = {}, {}
+        for aoi_id, total, n_invalidas in linhas:
+            if total - n_invalidas:
+                por_aoi[aoi_id] = total - n_invalidas
+            if n_invalidas:
+                invalidas[aoi_id] = n_invalidas
+
+        resultado = {"tabela": layer.nome, "por_aoi": por_aoi}
+        if invalidas:
+            resultado["invalidas"] = invalidas
+        if layer in self.sem_indice:
+            resultado["sem_indice"] = True
+        return resultado
+
+    def _processar_lote_seguro(self, conn: connection, cur, layer: Layer) -> dict | None:
+        if layer in self.fora_extensao:
+            return {"tabela": layer.nome, "por_aoi": {}, "fora_extensao": True}
+        return self._consultar_seguro(
+            conn, layer, lambda: self.processar_camada_lote(cur, layer), {"por_aoi": {}}
+        )
+
+    def _preparar_execucao(self, lote: bool = False):
+        """
+        Etapas anteriores às consultas: triagem por extensão, marcadores de
+        alteração, colunas chave e índices. Falhas aqui não interrompem a execução.
+        """
+        # Se a conexão estava ociosa, a transação aberta pelas leituras do catálogo
+        # é desta etapa e é encerrada ao final (a AOI é então carregada em uma
+        # transação própria, ver preparar_conexao)
+        ociosa = self.conn.get_transaction_status() == TRANSACTION_STATUS_IDLE
+        try:
+            with self.tempos.medir("preparacao.triagem_extensao"):
+                self.triagem_extensao()
+        except Exception:
+            self.conn.rollback()
+            self.fora_extensao = set()
+
+        if not lote:
+            # O modo em lote não usa o cache de resultados nem registra chaves
+            try:
+                with self.tempos.medir("preparacao.marcadores"):
+                    self.carregar_marcadores()
+            except Exception:
+                self.conn.rollback()
+                self._marcadores = {}
+
+            try:
+                with self.tempos.medir("preparacao.colunas_chave"):
+                    self.carregar_colunas_chave()
+            except Exception:
+                # Sem as colunas chave, a exportação volta a usar o filtro espacial
+                self.conn.rollback()
+
+        try:
+            with self.tempos.medir("preparacao.indices"):
+                self.verificar_indices()
+        except Exception:
+            # A inspeção do catálogo é apenas informativa
+            self.conn.rollback()
+        if ociosa:
+            self.conn.rollback()
+
+    def iter_resultados(self, amostras: bool = True):
+        """
+        Percorre as tabelas, produzindo o resultado de cada camada assim que ele
+        fica pronto, sempre na ordem de self.tables. Erros em uma camada não
+        interrompem as demais: a camada é registrada com count 0 e a chave 'erro'.
+
+        Com workers > 1 as camadas são distribuídas entre várias conexões.
+        Interrompe a iteração se cancel() for chamado.
+        """
+        self._preparar_execucao()
+
+        def processar(conn, cur, layer):
+            return self._processar_seguro(conn, cur, layer, amostras)
+
+        yield from self._com_nova_tentativa(lambda layers: self._percorrer(processar, layers), self._estimar)
+
+    def iter_lote(self):
+        """
+        Modo em lote: como iter_resultados, mas cada resultado traz a contagem
+        por área da AOI ('por_aoi'), obtida com uma única consulta por camada.
+        """
+        if self.campo_id is None:
+            raise ValueError("Informe campo_id para usar o modo em lote.")
+        self._preparar_execucao(lote=True)
+        yield from self._com_nova_tentativa(lambda layers: self._percorrer(self._processar_lote_seguro, layers))
+
+    def _com_nova_tentativa(self, percorrer, estimar=None):
+        """
+        Percorre todas as camadas com percorrer(layers). Com nova_tentativa, as
+        camadas de tempo esgotado são adiadas para o final (fora da ordem das
+        tabelas) e repetidas com o limite ampliado ou substituídas por
+        estimar(layer, resultado); as demais seguem na ordem original.
+        """
+        adiadas = []
+        for r in percorrer(self.layers):
+            if r.get("tempo_esgotado") and self.nova_tentativa is not None:
+                adiadas.append(r)
+            else:
+                yield r
+        if not adiadas or self._cancelado:
+            return
+
+        por_nome = {layer.nome: layer for layer in self.layers}
+        if self.nova_tentativa == "ampliada":
+            self._limite = self.timeout_consulta * self.fator_nova_tentativa
+            try:
+                for r in percorrer([por_nome[r["tabela"]] for r in adiadas]):
+                    r["nova_tentativa"] = True
+                    yield r
+            finally:
+                self._limite = self.timeout_consulta
+        elif estimar is not None:
+            for r in adiadas:
+                if self._cancelado:
+                    return
+                yield estimar(por_nome[r["tabela"]], r)
+        else:
+            yield from adiadas
+
+    def _estimar(self, layer: Layer, esgotado: dict) -> dict:
+        """
+        Nova tentativa 'estimativa': número de feições que o planejador prevê
+        para o filtro espacial da camada (EXPLAIN, sem executar a consulta).
+        Se a estimativa falhar, mantém o resultado de tempo esgotado.
+        """
+        sql, params = self.planner.estimativa_sql(layer)
+        try:
+            self.preparar_conexao(self.conn)
+            with self.conn.cursor() as cur:
+                cur.execute("EXPLAIN (FORMAT JSON) " + sql.strip(), params or None)
+                plano = cur.fetchone()[0]
+            self.conn.rollback()
+            estimado = int(plano[0]["Plan"]["Plan Rows"])
+        except Exception:
+            self.conn.rollback()
+            return esgotado
+        resultado = {"tabela": layer.nome, "count": estimado, "estimado": True, "tempo_esgotado": True}
+        if layer in self.sem_indice:
+            resultado["sem_indice"] = True
+        return resultado
+
+    def _percorrer(self, processar, layers: list[Layer]):
+        """
+        Aplica processar(conn, cur, layer) a cada camada, em série ou em paralelo.
+        """
+        try:
+            if self.workers > 1 and self.pool is not None and len(layers) > 1:
+                yield from self._iter_paralelo(processar, layers)
+                return
+
+            with self.conn.cursor() as cur:
+                for layer in layers:
+                    if self._cancelado:
+                        return
+                    r = processar(self.conn, cur, layer)
+                    if r is None:
+                        return
+                    yield r
+        finally:
+            if self._limite is not None and self.conn.closed == 0:
+                # Desfaz o SET LOCAL statement_timeout da conexão principal
+                self.conn.rollback()
+
+    def _iter_paralelo(self, processar, layers: list[Layer]):
+        """
+        Modo paralelo: cada thread usa uma conexão própria do pool, retirada de uma fila
+        de conexões livres. No máximo 2 * workers camadas ficam pendentes por vez,
+        e os resultados são devolvidos na ordem original das tabelas.
+        """
+        n = min(self.workers, len(layers), self.pool.max_size)
+        extras = []
+        try:
+            for _ in range(n - 1):
+                extras.append(self.pool.acquire())
+        except Exception:
+            for conn in extras:
+                self.pool.release(conn)
+            raise
+
+        with self._lock:
+            self._conexoes = [self.conn] + extras
+        livres: Queue = Queue()
+        for conn in self._conexoes:
+            livres.put(conn)
+
+        def tarefa(layer):
+            if self._cancelado:
+                return None
+            conn = livres.get()
+            try:
+                with conn.cursor() as cur:
+                    return processar(conn, cur, layer)
+            finally:
+                livres.put(conn)
+
+        pendentes = deque()
+        tabelas = iter(layers)
+        executor = ThreadPoolExecutor(max_workers=n, thread_name_prefix="intersecao")
+        try:
+            for tabela in tabelas:
+                pendentes.append(executor.submit(tarefa, tabela))
+                if len(pendentes) >= 2 * n:
+                    break
+
+            while pendentes:
+                r = pendentes.popleft().result()
+                if r is None or self._cancelado:
+                    return
+                tabela = next(tabelas, None)
+                if tabela is not None:
+                    pendentes.append(executor.submit(tarefa, tabela))
+                yield r
+        finally:
+            for futuro in pendentes:
+                futuro.cancel()
+            executor.shutdown(wait=True)
+            with self._lock:
+                self._conexoes = [self.conn]
+            for conn in extras:
+                self.pool.release(conn)
+
+    def explicar_mais_lentas(self, n: int) -> dict[str, object]:
+        """
+        Repete, com EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON), a consulta das n
+        camadas que mais demoraram e registra os planos em self.tempos.
+        As consultas são executadas de novo, na conexão principal; as camadas de
+        tempo esgotado recebem apenas o plano estimado (EXPLAIN sem ANALYZE).
+
+        Retorna {camada: plano} (ou {'erro': mensagem} para a camada).
+        """
+        por_nome = {layer.nome: layer for layer in self.layers}
+        planos = {}
+        for nome in self.tempos.mais_lentas(n, "consulta"):
+            layer = por_nome.get(nome)
+            if layer is None or self._cancelado:
+                continue
+            if self.campo_id is not None:
+                sql, params = self.planner.count_lote_sql(layer)
+            else:
+                sql, params = self.planner.count_sql(layer, self.coluna_chave(layer), self.max_chaves)
+            explain = "EXPLAIN (FORMAT JSON) " if layer in self.esgotadas else "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) "
+            try:
+                self.preparar_conexao(self.conn)
+                with self.conn.cursor() as cur:
+                    cur.execute(explain + sql.strip(), params or None)
+                    plano = cur.fetchone()[0]
+                self.conn.rollback()
+            except Exception as e:
+                self.conn.rollback()
+                plano = {"erro": str(e)}
+            planos[nome] = plano
+            self.tempos.registrar_plano(nome, plano)
+        return planos
+
+    def diagnostico_lote(self, include_zero: bool = False) -> list[dict]:
+        """
+        Diagnóstico do modo em lote em formato longo: uma linha 'AOI', 'Tabela',
+        'Feições Encontradas' por área e camada com interseção (ou para todos os
+        pares, com include_zero).
+        """
+        ids = self.aoi.ids(self.campo_id) if include_zero else []
+        linhas = []
+        for r in self.iter_lote():
+            if "erro" in r:
+                linhas.append({"AOI": "", "Tabela": r["tabela"], "Feições Encontradas": 0, "erro": r["erro"]})
+                continue
+            por_aoi = r["por_aoi"]
+            for aoi_id in ids or por_aoi:
+                linhas.append({"AOI": aoi_id, "Tabela": r["tabela"], "Feições Encontradas": por_aoi.get(aoi_id, 0)})
+        return linhas
 
     def diagnostico_counts(self, include_zero=True) -> list[dict]:
         """
@@ -100,22 +827,10 @@ class IntersectionRunner:
         Retorna exatamente o que queremos ver no log e exportar em CSV.
         """
         resultados = []
-        for tabela in self.tabelas:  # use 'self.tables' se esse for o nome no seu __init__
-            try:
-                query = f"""
-                    SELECT COUNT(*)
-                    FROM "{self.schema}"."{tabela}"
-                    WHERE geom IS NOT NULL
-                    AND ST_IsValid(geom)
-                    AND ST_SRID(geom) = 4674
-                    AND ST_Intersects(geom, ST_GeomFromText(%s, 4674));
-                """
-                with self.conn.cursor() as cur:
-                    cur.execute(query, (self.aoi_wkt,))
-                    count = cur.fetchone()[0]
-                if include_zero or count > 0:
-                    resultados.append({"Tabela": tabela, "Feições Encontradas": count})
-            except Exception as e:
+        for r in self.iter_resultados(amostras=False):
+            if "erro" in r:
                 # Se der erro na camada, registramos 0 e o erro (opcional)
-                resultados.append({"Tabela": tabela, "Feições Encontradas": 0, "erro": str(e)})
+                resultados.append({"Tabela": r["tabela"], "Feições Encontradas": 0, "erro": r["erro"]})
+            elif include_zero or r["count"] > 0:
+                resultados.append({"Tabela": r["tabela"], "Feições Encontradas": r["count"]})
         return resultados
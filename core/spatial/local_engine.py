@@ -0,0 +1,509 @@
+"""
+Este módulo define o motor espacial local (LocalBackend), que executa o
+diagnóstico e a exportação sobre arquivos vetoriais em disco (GeoPackage ou
+Shapefile), sem banco de dados.
+
+Para cada camada:
+- A extensão do arquivo (pyogrio.read_info) é comparada com a da AOI, e camadas
+  que não podem intersectá-la são descartadas sem leitura
+- Apenas as feições dentro da bbox da AOI são lidas (leitura filtrada por bbox,
+  pelo pyogrio ou Fiona via geopandas)
+- Um índice STRtree (shapely 2) é montado sobre as feições lidas e consultado com
+  o predicado intersects contra a AOI reprojetada para o SRID da camada, uma única
+  vez por SRID
+
+Os resultados, o perfil dos campos e o relatório da exportação têm a mesma
+estrutura do motor PostGIS (IntersectionRunner / GPKGExporter). As feições
+encontradas ficam em memória para o perfil e a exportação não relerem o arquivo.
+
+As camadas são descritas por Layer, com o caminho do arquivo em `schema` e o
+nome da camada no arquivo em `table`.
+"""
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from core.db.schema_manager import Layer
+from core.exporter.gpkg_exporter import limpar_geometrias, log_camada
+from core.spatial.aoi import AOI, SRID
+from core.spatial.backend import SpatialBackend
+from utils.run_profiler import RunProfiler
+
+try:
+    import pyogrio
+except ImportError:  # sem pyogrio, a leitura usa o Fiona e não há triagem por extensão
+    pyogrio = None
+
+EXTENSOES = (".gpkg", ".shp")
+
+
+def _info_camada(arquivo: str, camada: str) -> tuple[int, tuple | None]:
+    """
+    SRID (EPSG, ou 0 se desconhecido) e extensão da camada, sem ler as feições.
+    A extensão só está disponível com o pyogrio.
+    """
+    if pyogrio is not None:
+        info = pyogrio.read_info(arquivo, layer=camada, force_total_bounds=True)
+        crs = info.get("crs")
+        extensao = info.get("total_bounds")
+        extensao = tuple(float(v) for v in extensao) if extensao is not None else None
+        if extensao is not None and not np.all(np.isfinite(extensao)):
+            extensao = None
+    else:
+        crs = gpd.read_file(arquivo, layer=camada, rows=0).crs
+        extensao = None
+    srid = 0
+    if crs:
+        from pyproj import CRS
+
+        srid = CRS.from_user_input(crs).to_epsg() or 0
+    return srid, extensao
+
+
+def listar_camadas_locais(fontes: list[str]) -> list[Layer]:
+    """
+    Camadas espaciais dos arquivos indicados (GeoPackage, Shapefile, ou diretórios
+    com esses arquivos). Nomes de camada repetidos entre arquivos recebem o nome
+    do arquivo como prefixo ('arquivo.camada').
+    """
+    arquivos = []
+    for fonte in fontes:
+        if os.path.isdir(fonte):
+            arquivos += sorted(
+                os.path.join(fonte, nome) for nome in os.listdir(fonte)
+                if nome.lower().endswith(EXTENSOES)
+            )
+        else:
+            arquivos.append(fonte)
+
+    entradas = []
+    for arquivo in arquivos:
+        camadas = gpd.list_layers(arquivo)
+        for nome, tipo in zip(camadas["name"], camadas["geometry_type"]):
+            if tipo:  # tabelas sem geometria
+                entradas.append((arquivo, nome, str(tipo)))
+
+    repetidos = pd.Series([nome for _, nome, _ in entradas]).duplicated(keep=False).to_numpy()
+    layers = []
+    for (arquivo, nome, tipo), repetido in zip(entradas, repetidos):
+        srid, _ = _info_camada(arquivo, nome)
+        prefixo = os.path.splitext(os.path.basename(arquivo))[0]
+        # Ex: '3D Polygon' (Fiona) ou 'PolygonZ' (pyogrio)
+        tipo = tipo.upper().replace(" ", "")
+        layers.append(Layer(
+            schema=arquivo,
+            table=nome,
+            geom_col="geometry",
+            srid=srid,
+            geom_type=tipo,
+            dim=3 if tipo.startswith("3D") or tipo.endswith("Z") else 2,
+            nome=f"{prefixo}.{nome}" if repetido else nome,
+        ))
+    return layers
+
+
+class LocalRunner:
+    def __init__(self, aoi: AOI, layers: list[Layer], workers: int = 1, top_n: int = 5,
+                 campo_id: str | None = None, tempos: RunProfiler | None = None,
+                 filtro_extensao: bool = True, reter_feicoes: bool = True,
+                 limite_feicoes: int | None = 100_000, max_caracteres: int = 200):
+        """
+        Parâmetros:
+        - aoi: área de interesse
+        - layers: camadas locais (listar_camadas_locais)
+        - workers: número de camadas processadas simultaneamente
+        - top_n: número de valores mais frequentes por campo no perfil das camadas
+        - campo_id: campo da AOI que identifica cada área, para o modo em lote (iter_lote)
+        - tempos: recebe os tempos por etapa e por camada (padrão: o da AOI)
+        - filtro_extensao: descarta sem leitura as camadas fora da extensão da AOI
+        - reter_feicoes: mantém em memória as feições encontradas, para o perfil e a exportação
+        - limite_feicoes / max_caracteres: ver FieldProfiler
+        """
+        self.aoi = aoi
+        self.layers = list(layers)
+        self.tables = [layer.nome for layer in self.layers]
+        self.workers = max(1, workers)
+        self.top_n = max(1, top_n)
+        self.campo_id = campo_id
+        self.tempos = tempos or aoi.tempos
+        self.filtro_extensao = filtro_extensao
+        self.reter_feicoes = reter_feicoes
+        self.limite_feicoes = limite_feicoes
+        self.max_caracteres = max_caracteres
+        # Sem chaves de banco: a exportação usa as feições retidas
+        self.execucao = None
+        self.fora_extensao: set[Layer] = set()
+        self._encontradas: dict[Layer, gpd.GeoDataFrame] = {}
+        self._aoi_por_srid: dict[int, object] = {}
+        self._areas_por_srid: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+        self._cancelado = False
+        self._lock = threading.Lock()
+
+    @property
+    def cancelado(self) -> bool:
+        """
+        Indica se a execução foi cancelada pelo usuário.
+        """
+        return self._cancelado
+
+    def cancel(self):
+        """
+        Solicita o cancelamento: nenhuma camada nova é iniciada.
+        """
+        self._cancelado = True
+
+    # ------------------------------------------------------------------
+    # AOI no SRID de cada camada
+    # ------------------------------------------------------------------
+
+    def _aoi_no_srid(self, srid: int):
+        """
+        Geometria dissolvida da AOI no SRID da camada, preparada para consultas
+        repetidas (calculada uma vez por SRID).
+        """
+        with self._lock:
+            geometria = self._aoi_por_srid.get(srid)
+            if geometria is None:
+                if srid in (SRID, 0):
+                    # Cópia, para não preparar a geometria compartilhada da AOI
+                    geometria = shapely.from_wkb(self.aoi.wkb)
+                else:
+                    serie = gpd.GeoSeries([self.aoi.geometry], crs=f"EPSG:{SRID}").to_crs(epsg=srid)
+                    geometria = serie.iloc[0]
+                shapely.prepare(geometria)
+                self._aoi_por_srid[srid] = geometria
+        return geometria
+
+    def _areas_no_srid(self, srid: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Modo em lote: identificadores e geometrias das áreas da AOI no SRID da camada.
+        """
+        with self._lock:
+            areas = self._areas_por_srid.get(srid)
+            if areas is None:
+                gdf = self.aoi.gdf if srid in (SRID, 0) else self.aoi.gdf.to_crs(epsg=srid)
+                manter = gdf[self.campo_id].notna().to_numpy()
+                areas = (
+                    gdf[self.campo_id].astype(str).to_numpy()[manter],
+                    gdf.geometry.to_numpy()[manter],
+                )
+                self._areas_por_srid[srid] = areas
+        return areas
+
+    def _fora_da_extensao(self, layer: Layer, bbox: tuple) -> bool:
+        if not self.filtro_extensao or pyogrio is None:
+            return False
+        _, extensao = _info_camada(layer.schema, layer.table)
+        if extensao is None:
+            return False
+        xmin, ymin, xmax, ymax = extensao
+        return xmax < bbox[0] or xmin > bbox[2] or ymax < bbox[1] or ymin > bbox[3]
+
+    # ------------------------------------------------------------------
+    # Leitura e consulta
+    # ------------------------------------------------------------------
+
+    def _ler(self, layer: Layer, bbox: tuple) -> gpd.GeoDataFrame:
+        """
+        Lê apenas as feições da camada dentro da bbox (no SRID da camada).
+        """
+        with self.tempos.medir("local.leitura", layer.nome) as medida:
+            gdf = gpd.read_file(layer.schema, layer=layer.table, bbox=bbox)
+            medida["linhas"] = len(gdf)
+        return gdf
+
+    def _consultar(self, layer: Layer) -> tuple[gpd.GeoDataFrame, int]:
+        """
+        Feições da camada que intersectam a AOI e quantas delas são inválidas.
+        """
+        geometria_aoi = self._aoi_no_srid(layer.srid)
+        gdf = self._ler(layer, tuple(geometria_aoi.bounds))
+        with self.tempos.medir("consulta", layer.nome) as medida:
+            geometrias = gdf.geometry.to_numpy()
+            arvore = shapely.STRtree(geometrias)
+            indices = np.sort(arvore.query(geometria_aoi, predicate="intersects"))
+            encontradas = gdf.iloc[indices]
+            invalidas = int((~shapely.is_valid(geometrias[indices])).sum())
+            medida["linhas"] = len(encontradas)
+        return encontradas, invalidas
+
+    def encontradas(self, layer: Layer) -> gpd.GeoDataFrame:
+        """
+        Feições da camada que intersectam a AOI (retidas na execução ou lidas de novo).
+        """
+        gdf = self._encontradas.get(layer)
+        if gdf is None:
+            if layer in self.fora_extensao:
+                return gpd.GeoDataFrame(geometry=[], crs=f"EPSG:{layer.srid or SRID}")
+            gdf, _ = self._consultar(layer)
+        return gdf
+
+    def processar_camada(self, layer: Layer, amostras: bool = True) -> dict:
+        """
+        Conta as feições da camada que intersectam a AOI e, se houver interseção
+        e `amostras` estiver ativo, calcula o perfil dos campos.
+        Mesmo formato de IntersectionRunner.processar_camada.
+        """
+        geometria_aoi = self._aoi_no_srid(layer.srid)
+        if self._fora_da_extensao(layer, geometria_aoi.bounds):
+            with self._lock:
+                self.fora_extensao.add(layer)
+            return {"tabela": layer.nome, "count": 0, "fora_extensao": True}
+
+        encontradas, invalidas = self._consultar(layer)
+        if self.reter_feicoes:
+            with self._lock:
+                self._encontradas[layer] = encontradas
+        count = len(encontradas) - invalidas
+        resultado = {"tabela": layer.nome, "count": count}
+        if invalidas:
+            resultado["invalidas"] = invalidas
+        if count > 0 and amostras:
+            resultado.update(self._perfil(layer, encontradas))
+        return resultado
+
+    def processar_camada_lote(self, layer: Layer) -> dict:
+        """
+        Modo em lote: feições da camada que intersectam cada área da AOI, com uma
+        única consulta ao índice para todas as áreas.
+        Mesmo formato de IntersectionRunner.processar_camada_lote.
+        """
+        ids, areas = self._areas_no_srid(layer.srid)
+        bbox = tuple(shapely.total_bounds(areas))
+        if self._fora_da_extensao(layer, bbox):
+            with self._lock:
+                self.fora_extensao.add(layer)
+            return {"tabela": layer.nome, "por_aoi": {}, "fora_extensao": True}
+
+        gdf = self._ler(layer, bbox)
+        with self.tempos.medir("consulta", layer.nome) as medida:
+            geometrias = gdf.geometry.to_numpy()
+            arvore = shapely.STRtree(geometrias)
+            areas_idx, feicoes = arvore.query(areas, predicate="intersects")
+            pares = pd.DataFrame({"aoi_id": ids[areas_idx], "feicao": feicoes}).drop_duplicates()
+            pares["invalida"] = ~shapely.is_valid(geometrias[pares["feicao"].to_numpy()])
+            grupos = pares.groupby("aoi_id")["invalida"].agg(["size", "sum"])
+            medida["linhas"] = len(pares)
+
+        por_aoi, invalidas = {}, {}
+        for aoi_id, total, n_invalidas in zip(grupos.index, grupos["size"], grupos["sum"]):
+            if total - n_invalidas:
+                por_aoi[aoi_id] = int(total - n_invalidas)
+            if n_invalidas:
+                invalidas[aoi_id] = int(n_invalidas)
+        resultado = {"tabela": layer.nome, "por_aoi": por_aoi}
+        if invalidas:
+            resultado["invalidas"] = invalidas
+        return resultado
+
+    # ------------------------------------------------------------------
+    # Perfil dos campos
+    # ------------------------------------------------------------------
+
+    def _perfil(self, layer: Layer, gdf: gpd.GeoDataFrame) -> dict:
+        """
+        Perfil dos campos das feições encontradas, no formato de FieldProfiler.perfil:
+        {"colunas": [...], "perfil": {coluna: {"valores", "nulos", "distintos"}}}
+        """
+        with self.tempos.medir("consulta.perfil", layer.nome):
+            colunas = [c for c in gdf.columns if c != gdf.geometry.name]
+            amostra = gdf.iloc[:self.limite_feicoes] if self.limite_feicoes else gdf
+            perfil = {}
+            for coluna in colunas:
+                serie = amostra[coluna]
+                texto = serie.dropna().astype(str).str.slice(0, self.max_caracteres)
+                frequencias = texto.value_counts().rename_axis("valor").reset_index(name="freq")
+                frequencias = frequencias.sort_values(["freq", "valor"], ascending=[False, True])
+                perfil[coluna] = {
+                    "valores": [
+                        (valor, int(freq))
+                        for valor, freq in frequencias.head(self.top_n).itertuples(index=False)
+                    ],
+                    "nulos": int(serie.isna().sum()),
+                    "distintos": len(frequencias),
+                }
+        return {"colunas": colunas, "perfil": perfil}
+
+    def perfil_camada(self, conn, layer: Layer) -> dict:
+        """
+        Perfil dos campos sob demanda (mesma assinatura do motor PostGIS; `conn`
+        é ignorado). Retorna {"colunas": [...], "perfil": {...}}.
+        """
+        return self._perfil(layer, self.encontradas(layer))
+
+    def explicar_mais_lentas(self, n: int) -> dict:
+        """
+        Não se aplica ao motor local (não há planos de consulta).
+        """
+        return {}
+
+    # ------------------------------------------------------------------
+    # Iteração
+    # ------------------------------------------------------------------
+
+    def _seguro(self, processar, layer: Layer, vazio: dict) -> dict | None:
+        if self._cancelado:
+            return None
+        try:
+            return processar(layer)
+        except Exception as e:
+            return {"tabela": layer.nome, **vazio, "erro": str(e)}
+
+    def iter_resultados(self, amostras: bool = True):
+        """
+        Percorre as camadas, produzindo o resultado de cada uma na ordem de
+        self.tables. Erros em uma camada não interrompem as demais.
+        """
+        yield from self._percorrer(
+            lambda layer: self._seguro(lambda l: self.processar_camada(l, amostras), layer, {"count": 0})
+        )
+
+    def iter_lote(self):
+        """
+        Modo em lote: como iter_resultados, com a contagem por área ('por_aoi').
+        """
+        if self.campo_id is None:
+            raise ValueError("Informe campo_id para usar o modo em lote.")
+        if self.campo_id not in self.aoi.gdf.columns:
+            raise ValueError(f"Campo '{self.campo_id}' não existe na AOI.")
+        yield from self._percorrer(
+            lambda layer: self._seguro(self.processar_camada_lote, layer, {"por_aoi": {}})
+        )
+
+    def _percorrer(self, processar):
+        """
+        Aplica processar(layer) a cada camada, em série ou em várias threads
+        (leitura e consultas do shapely liberam o GIL), mantendo a ordem das camadas
+        e no máximo 2 * workers camadas pendentes.
+        """
+        if self.workers == 1 or len(self.layers) < 2:
+            for layer in self.layers:
+                r = processar(layer)
+                if r is None:
+                    return
+                yield r
+            return
+
+        pendentes = deque()
+        camadas = iter(self.layers)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="local") as executor:
+            try:
+                for layer in camadas:
+                    pendentes.append(executor.submit(processar, layer))
+                    if len(pendentes) >= 2 * self.workers:
+                        break
+                while pendentes:
+                    r = pendentes.popleft().result()
+                    if r is None or self._cancelado:
+                        return
+                    layer = next(camadas, None)
+                    if layer is not None:
+                        pendentes.append(executor.submit(processar, layer))
+                    yield r
+            finally:
+                for futuro in pendentes:
+                    futuro.cancel()
+
+
+class LocalExporter:
+    def __init__(self, aoi: AOI, layers: list[Layer], runner: LocalRunner | None = None,
+                 reparar: bool = False, tempos: RunProfiler | None = None):
+        """
+        Parâmetros:
+        - aoi: área de interesse
+        - layers: camadas locais disponíveis (para resolver nomes)
+        - runner: execução com a mesma AOI, cujas feições encontradas são reaproveitadas
+        - reparar: corrige geometrias inválidas com make_valid em vez de descartá-las
+        - tempos: recebe os tempos por etapa e por camada (padrão: o da AOI)
+        """
+        self.aoi = aoi
+        self.tempos = tempos or aoi.tempos
+        self.reparar = reparar
+        if runner is None or runner.aoi.hash != aoi.hash:
+            runner = LocalRunner(aoi, layers, tempos=self.tempos, reter_feicoes=False)
+        self.runner = runner
+        self._por_nome = {layer.nome: layer for layer in layers}
+
+    def export_layers(self, layer_names: list[Layer | str], output_path: str, log_func=print,
+                      aoi_path: str = None) -> dict[str, dict]:
+        """
+        Exporta as camadas selecionadas para um GeoPackage, com o mesmo relatório
+        por camada de GPKGExporter.export_layers.
+        """
+        if aoi_path:
+            try:
+                with self.tempos.medir("exportacao.aoi"):
+                    self.aoi.gdf.to_file(output_path, layer="AOI", driver="GPKG")
+                log_func("[OK] Camada 'AOI' exportada para o GeoPackage.")
+            except Exception as e:
+                log_func(f"[Erro] Falha ao exportar camada 'AOI': {e}")
+
+        relatorio = {}
+        for camada in layer_names:
+            layer = camada if isinstance(camada, Layer) else self._por_nome.get(camada)
+            if layer is None:
+                log_func(f"[Erro] Camada '{camada}' não encontrada.")
+                relatorio[str(camada)] = {"erro": "camada não encontrada"}
+                continue
+            try:
+                estatisticas, gravadas = self._exportar_camada(layer, output_path)
+                log_camada(layer, estatisticas, gravadas, log_func)
+                relatorio[layer.nome] = {"gravadas": gravadas, **estatisticas}
+            except Exception as e:
+                log_func(f"[Erro] Falha ao exportar '{layer.nome}': {e}")
+                relatorio[layer.nome] = {"erro": str(e)}
+        return relatorio
+
+    def _exportar_camada(self, layer: Layer, output_path: str) -> tuple[dict, int]:
+        gdf = self.runner.encontradas(layer)
+        estatisticas = {"lidas": len(gdf), "reparadas": 0, "descartadas": 0, "zm": 0, "m": 0}
+        if gdf.empty:
+            return estatisticas, 0
+
+        with self.tempos.medir("exportacao.limpeza", layer.nome):
+            # O GeoPackage é sempre gravado em 4674
+            if layer.srid not in (SRID, 0):
+                gdf = gdf.to_crs(epsg=SRID)
+            gdf, estatisticas["reparadas"], estatisticas["descartadas"] = limpar_geometrias(gdf, self.reparar)
+        if gdf.empty:
+            return estatisticas, 0
+
+        with self.tempos.medir("exportacao.gravacao", layer.nome) as medida:
+            gdf.to_file(output_path, layer=layer.nome, driver="GPKG", encoding="utf-8", geometry_type=None)
+            medida["linhas"] = len(gdf)
+        return estatisticas, len(gdf)
+
+
+class LocalBackend(SpatialBackend):
+    nome = "local"
+
+    def __init__(self, fontes: list[str], filtro_extensao: bool = True):
+        """
+        Parâmetros:
+        - fontes: arquivos GeoPackage/Shapefile ou diretórios com esses arquivos
+        - filtro_extensao: descarta sem leitura as camadas fora da extensão da AOI
+        """
+        self.fontes = list(fontes)
+        self.filtro_extensao = filtro_extensao
+        self._layers: list[Layer] | None = None
+
+    def listar_camadas(self) -> list[Layer]:
+        if self._layers is None:
+            self._layers = listar_camadas_locais(self.fontes)
+        return list(self._layers)
+
+    def runner(self, aoi: AOI, layers: list[Layer], workers: int = 1, top_n: int = 5,
+               campo_id: str | None = None, tempos: RunProfiler | None = None):
+        return LocalRunner(aoi, layers, workers=workers, top_n=top_n, campo_id=campo_id,
+                           tempos=tempos, filtro_extensao=self.filtro_extensao)
+
+    def exporter(self, aoi: AOI, runner=None, workers: int = 1, reparar: bool = False,
+                 tempos: RunProfiler | None = None):
+        return LocalExporter(aoi, self.listar_camadas(), runner=runner, reparar=reparar, tempos=tempos)
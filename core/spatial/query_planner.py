@@ -0,0 +1,215 @@
+"""
+Este módulo define a classe QueryPlanner, que monta as consultas de interseção
+usadas pelo IntersectionRunner de forma que o PostgreSQL possa usar o índice
+espacial de cada camada:
+
+- O filtro espacial vem primeiro e sozinho no WHERE (bbox com && e ST_Intersects),
+  sem funções aplicadas linha a linha antes dele
+- A validade das geometrias (ST_IsValid) é verificada apenas nas feições que
+  intersectam a AOI, e as inválidas são contadas à parte
+
+- A AOI é levada ao SRID nativo de cada camada (uma vez por consulta ou por
+  sessão), nunca o contrário, para que nenhuma transformação linha a linha seja
+  necessária
+
+Também inspeciona o catálogo para descobrir quais camadas não possuem índice
+GiST na coluna geométrica e, opcionalmente, cria esses índices, e as chaves
+(chave primária de uma coluna, ou ctid) usadas para buscar de novo as feições encontradas.
+"""
+
+from psycopg2.extensions import connection
+
+from core.db.schema_manager import Layer
+from core.spatial.aoi import SRID
+from core.spatial.aoi_stage import AOIStage
+
+
+class QueryPlanner:
+    def __init__(self, stage: AOIStage | None, aoi_sql: str, aoi_param):
+        """
+        Parâmetros:
+        - stage: AOI carregada em tabela temporária (ou None para enviar a AOI como parâmetro)
+        - aoi_sql / aoi_param: trecho SQL e parâmetro da AOI, usados quando não há stage
+        """
+        self.stage = stage
+        self.aoi_sql = aoi_sql
+        self.aoi_param = aoi_param
+
+    def predicado(self, geom_col: str = "t.geom", srid: int = SRID) -> tuple[str, tuple]:
+        """
+        Filtro de interseção com a AOI, no SRID da camada, e seus parâmetros.
+        """
+        if self.stage is not None:
+            return self.stage.predicado(geom_col, srid), ()
+        aoi = self.aoi_sql
+        if srid not in (SRID, 0):
+            # Expressão constante: o PostgreSQL a avalia uma única vez por consulta
+            aoi = f"ST_Transform({aoi}, {int(srid)})"
+        return f"ST_Intersects({geom_col}, {aoi})", (self.aoi_param,)
+
+    def filtro_camada(self, layer: Layer, alias: str = "t") -> tuple[str, tuple]:
+        """
+        Filtro completo de uma camada. Colunas sem SRID declarado (0) podem misturar
+        sistemas; nelas apenas as feições em 4674 são consideradas, como antes.
+        """
+        geom = f'{alias}."{layer.geom_col}"'
+        filtro, params = self.predicado(geom, layer.srid)
+        if layer.srid == 0:
+            filtro = f"ST_SRID({geom}) = {SRID} AND {filtro}"
+        return filtro, params
+
+    def count_sql(self, layer: Layer, chave: str | None = None,
+                  max_chaves: int = 1_000_000) -> tuple[str, tuple]:
+        """
+        Consulta de contagem: retorna (total de feições que intersectam, quantas
+        delas são inválidas). ST_IsValid só é avaliado sobre as feições encontradas.
+
+        Com `chave`, retorna também a lista das chaves das feições encontradas
+        (NULL se forem mais de max_chaves). A própria agregação é limitada: só as
+        primeiras max_chaves feições (row_number) entram no array, de modo que
+        o servidor não monta listas enormes apenas para descartá-las.
+        """
+        filtro, params = self.filtro_camada(layer)
+        if chave is None:
+            sql = f"""
+                SELECT COUNT(*), COUNT(*) FILTER (WHERE NOT ST_IsValid(t."{layer.geom_col}"))
+                FROM {layer.tabela_sql} t
+                WHERE {filtro};
+            """
+            return sql, params
+        sql = f"""
+            SELECT COUNT(*), COUNT(*) FILTER (WHERE NOT p.valida),
+                   CASE WHEN COUNT(*) <= %s THEN array_agg(p.chave) FILTER (WHERE p.n <= %s) END
+            FROM (
+                SELECT {self.expressao_chave(chave)} AS chave, ST_IsValid(t."{layer.geom_col}") AS valida,
+                       row_number() OVER () AS n
+                FROM {layer.tabela_sql} t
+                WHERE {filtro}
+            ) p;
+        """
+        return sql, (int(max_chaves), int(max_chaves)) + tuple(params)
+
+    def estimativa_sql(self, layer: Layer) -> tuple[str, tuple]:
+        """
+        Consulta cujo plano (EXPLAIN, sem ANALYZE) traz, em 'Plan Rows', o número
+        de feições que o planejador estima para o filtro espacial da camada.
+        """
+        filtro, params = self.filtro_camada(layer)
+        return f"SELECT 1 FROM {layer.tabela_sql} t WHERE {filtro};", params
+
+    def count_lote_sql(self, layer: Layer) -> tuple[str, tuple]:
+        """
+        Consulta do modo em lote: uma única junção da camada com a AOI carregada
+        (uma linha por área, coluna aoi_id) e, por área, (aoi_id, total de feições
+        que intersectam, quantas delas são inválidas).
+
+        Uma feição que toca vários pedaços da mesma área é contada uma vez
+        (identificada por tableoid + ctid; por isso views não são suportadas).
+        """
+        if self.stage is None or self.stage.campo_id is None:
+            raise ValueError("O modo em lote exige a AOI carregada com um campo identificador.")
+        g = f't."{layer.geom_col}"'
+        filtro_srid = f"WHERE ST_SRID({g}) = {SRID}" if layer.srid == 0 else ""
+        sql = f"""
+            SELECT p.aoi_id, COUNT(*), COUNT(*) FILTER (WHERE NOT p.valida)
+            FROM (
+                SELECT DISTINCT a.aoi_id, t.tableoid, t.ctid, ST_IsValid({g}) AS valida
+                FROM {layer.tabela_sql} t
+                JOIN {self.stage.tabela_sql(layer.srid)} a
+                  ON {g} && a.geom AND ST_Intersects({g}, a.geom)
+                {filtro_srid}
+            ) p
+            GROUP BY p.aoi_id;
+        """
+        return sql, ()
+
+    @staticmethod
+    def expressao_chave(chave: str, alias: str = "t") -> str:
+        # tid[] não tem conversão no psycopg2; o ctid trafega como texto
+        if chave == "ctid":
+            return f"{alias}.ctid::text"
+        return f'{alias}."{chave}"'
+
+    @staticmethod
+    def filtro_chaves(chave: str, alias: str = "t") -> str:
+        """
+        Filtro que seleciona as feições pelas chaves (parâmetro: lista de chaves).
+        Uma lista de ctids é resolvida por TID Scan, sem índice.
+        """
+        if chave == "ctid":
+            return f"{alias}.ctid = ANY(%s::tid[])"
+        return f'{alias}."{chave}" = ANY(%s)'
+
+    @staticmethod
+    def chaves_tabelas(conn: connection, schema: str) -> dict[str, str | None]:
+        """
+        Retorna, por tabela do esquema, a coluna que identifica as feições: a chave
+        primária de uma única coluna de tipo inteiro ou texto, ou então o ctid.
+        Tabelas particionadas sem essa chave ficam com None (o ctid se repete
+        entre as partições).
+        """
+        query = """
+            SELECT c.relname, c.relkind, (
+                SELECT a.attname
+                FROM pg_index i
+                JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+                JOIN pg_type ty ON ty.oid = a.atttypid
+                WHERE i.indrelid = c.oid
+                AND i.indisprimary
+                AND i.indnatts = 1
+                AND ty.typname IN ('int2', 'int4', 'int8', 'text', 'varchar')
+            )
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = %s
+            AND c.relkind IN ('r', 'm', 'p');
+        """
+        with conn.cursor() as cur:
+            cur.execute(query, (schema,))
+            return {
+                tabela: pk or (None if relkind == "p" else "ctid")
+                for tabela, relkind, pk in cur.fetchall()
+            }
+
+    @staticmethod
+    def indices_espaciais(conn: connection, schema: str) -> set[tuple[str, str]]:
+        """
+        Retorna os pares (tabela, coluna) do esquema que possuem índice GiST
+        (ou SP-GiST) cuja primeira coluna é a coluna geométrica.
+        """
+        query = """
+            SELECT c.relname, a.attname
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            JOIN pg_class ic ON ic.oid = i.indexrelid
+            JOIN pg_am am ON am.oid = ic.relam
+            JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = i.indkey[0]
+            WHERE n.nspname = %s
+            AND am.amname IN ('gist', 'spgist');
+        """
+        with conn.cursor() as cur:
+            cur.execute(query, (schema,))
+            return {(row[0], row[1]) for row in cur.fetchall()}
+
+    def camadas_sem_indice(self, conn: connection, layers: list[Layer]) -> list[Layer]:
+        """
+        Lista as camadas cuja coluna geométrica não possui índice espacial.
+        """
+        indexadas = set()
+        for schema in {layer.schema for layer in layers}:
+            indexadas |= {(schema, t, c) for t, c in self.indices_espaciais(conn, schema)}
+        return [l for l in layers if (l.schema, l.table, l.geom_col) not in indexadas]
+
+    @staticmethod
+    def criar_indice(conn: connection, layer: Layer):
+        """
+        Cria um índice GiST na coluna geométrica da camada e atualiza as estatísticas.
+        """
+        nome = f"{layer.table}_{layer.geom_col}_gist"[:63]
+        with conn.cursor() as cur:
+            cur.execute(
+                f'CREATE INDEX IF NOT EXISTS "{nome}" ON {layer.tabela_sql} USING GIST ("{layer.geom_col}")'
+            )
+            cur.execute(f"ANALYZE {layer.tabela_sql}")
+        conn.commit()
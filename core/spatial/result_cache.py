@@ -0,0 +1,139 @@
+"""
+Este módulo define a classe ResultCache, um cache em disco (SQLite) dos resultados
+de interseção por camada, usado pelo IntersectionRunner para não consultar de novo
+camadas que não mudaram desde a última execução com a mesma AOI.
+
+A chave de cada entrada combina:
+- O hash do conteúdo da AOI (AOI.hash)
+- O descritor da camada (esquema, tabela, coluna, SRID, tipo)
+- O marcador de alteração da tabela (pg_stat_user_tables + relfilenode)
+- As opções que alteram o resultado (ex: perfil dos campos e seu tamanho,
+  limites de chaves registradas e de feições do perfil)
+
+As entradas são descartadas por LRU quando o número de entradas ou o tamanho
+total ultrapassa os limites configurados.
+
+Observação: os contadores de pg_stat_user_tables são atualizados pelo servidor com
+um pequeno atraso; alterações feitas segundos antes de uma execução podem ainda
+não ter mudado o marcador.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from dataclasses import asdict
+
+from core.db.schema_manager import Layer
+
+DIRETORIO_PADRAO = os.path.join(os.path.expanduser("~"), ".postintersect", "cache")
+
+
+class ResultCache:
+    def __init__(self, path: str | None = None, max_entradas: int = 20000,
+                 max_bytes: int = 256 * 1024 * 1024):
+        """
+        Parâmetros:
+        - path: arquivo SQLite do cache (padrão: ~/.postintersect/cache/resultados.sqlite)
+        - max_entradas: número máximo de entradas mantidas
+        - max_bytes: tamanho total máximo dos resultados serializados
+        """
+        self.path = path or os.path.join(DIRETORIO_PADRAO, "resultados.sqlite")
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS resultados (
+                chave TEXT PRIMARY KEY,
+                valor BLOB NOT NULL,
+                tamanho INTEGER NOT NULL,
+                acesso REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS resultados_acesso ON resultados (acesso)")
+        self._db.commit()
+
+    @staticmethod
+    def chave(aoi_hash: str, layer: Layer, marcador: str, **opcoes) -> str:
+        """
+        Monta a chave de uma entrada a partir da AOI, da camada, do marcador
+        de alteração da tabela e das opções da execução.
+        """
+        partes = {"aoi": aoi_hash, "layer": asdict(layer), "marcador": marcador, "opcoes": opcoes}
+        return hashlib.sha256(json.dumps(partes, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, chave: str) -> dict | None:
+        """
+        Retorna o resultado em cache (atualizando seu último acesso) ou None.
+        """
+        with self._lock:
+            linha = self._db.execute(
+                "SELECT valor FROM resultados WHERE chave = ?", (chave,)
+            ).fetchone()
+            if linha is None:
+                return None
+            self._db.execute(
+                "UPDATE resultados SET acesso = ? WHERE chave = ?", (time.time(), chave)
+            )
+            self._db.commit()
+        try:
+            return pickle.loads(linha[0])
+        except Exception:
+            return None
+
+    def put(self, chave: str, resultado: dict):
+        """
+        Armazena um resultado e aplica os limites de entradas e tamanho.
+        """
+        try:
+            valor = pickle.dumps(resultado, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return  # valores não serializáveis: a camada simplesmente não é armazenada
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO resultados (chave, valor, tamanho, acesso) VALUES (?, ?, ?, ?)",
+                (chave, valor, len(valor), time.time())
+            )
+            self._despejar()
+            self._db.commit()
+
+    def _despejar(self):
+        """
+        Remove as entradas menos recentemente usadas até respeitar os limites.
+        Deve ser chamado com o lock adquirido.
+        """
+        total, tamanho = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM resultados"
+        ).fetchone()
+        if total <= self.max_entradas and tamanho <= self.max_bytes:
+            return
+
+        excesso_bytes = tamanho - self.max_bytes
+        excesso_entradas = total - self.max_entradas
+        remover = []
+        for chave, tam in self._db.execute("SELECT chave, tamanho FROM resultados ORDER BY acesso"):
+            if excesso_bytes <= 0 and excesso_entradas <= 0:
+                break
+            remover.append((chave,))
+            excesso_bytes -= tam
+            excesso_entradas -= 1
+        self._db.executemany("DELETE FROM resultados WHERE chave = ?", remover)
+
+    def clear(self):
+        """
+        Remove todas as entradas do cache.
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM resultados")
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -9,17 +9,17 @@ de entrada da aplicação. Esta aba inclui:
 
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QLabel, QLineEdit, QHBoxLayout, QComboBox,
-    QPushButton, QFileDialog, QMessageBox, QFrame, QTextEdit
+    QPushButton, QFileDialog, QMessageBox, QFrame, QTextEdit, QProgressBar, QSpinBox, QCheckBox
 )
 from PyQt6.QtCore import Qt
-from core.db.connector import PostgresConnector
-from core.db.schema_manager import SchemaManager
-from core.spatial.aoi import AOI
-from core.spatial.intersection_runner import IntersectionRunner
-from core.exporter.csv_exporter import CSVExporter
+from core.db.catalog_cache import CatalogCache
+from core.db.connector import PostgresConnector, carregar_credenciais
+from core.spatial.result_cache import ResultCache
+from gui.workers.intersection_worker import IntersectionWorker
 from utils.logger import Logger
 import json
 import os
+import time
 
 
 class InputTab(QWidget):
@@ -28,9 +28,18 @@ class InputTab(QWidget):
         self.parent_window = parent  # referência à MainWindow
 
         self.conn = None
+        self.connector = None
+        self.catalogo = None
+        self.cache_resultados = None
         self.aoi_path = None
+        self.aoi = None
+        self.execucao = None
+        self.tempos = None
+        self.runner = None
         self.resultados = []
         self.tabelas_com_geometria = []
+        self.worker = None
+        self._inicio_execucao = 0.0
 
         self._setup_ui()
 
@@ -61,8 +70,69 @@ class InputTab(QWidget):
         self.schema_combo.setEnabled(False)
         schema_row.addWidget(QLabel("Esquema:"))
         schema_row.addWidget(self.schema_combo)
+
+        # Número de conexões simultâneas usadas na interseção
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, 32)
+        self.workers_spin.setValue(4)
+        self.workers_spin.setToolTip("Número de conexões simultâneas usadas na interseção")
+        schema_row.addWidget(QLabel("Conexões:"))
+        schema_row.addWidget(self.workers_spin)
         layout.addLayout(schema_row)
 
+        # Opções de execução
+        opcoes_row = QHBoxLayout()
+        self.criar_indices_check = QCheckBox("Criar índices espaciais ausentes")
+        self.criar_indices_check.setToolTip("Cria índices GiST nas camadas sem índice na coluna geométrica antes da interseção")
+        opcoes_row.addWidget(self.criar_indices_check)
+
+        self.usar_cache_check = QCheckBox("Usar cache de resultados")
+        self.usar_cache_check.setChecked(True)
+        self.usar_cache_check.setToolTip("Reaproveita os resultados de camadas que não mudaram desde a última execução com a mesma AOI")
+        opcoes_row.addWidget(self.usar_cache_check)
+
+        self.assincrono_check = QCheckBox("Motor assíncrono")
+        self.assincrono_check.setToolTip("Executa as consultas com asyncio (psycopg 3), indicado para esquemas "
+                                         "com muitas camadas pequenas; requer o pacote psycopg")
+        opcoes_row.addWidget(self.assincrono_check)
+
+        # Tempo máximo da consulta de cada camada; 0 desativa
+        self.timeout_spin = QSpinBox()
+        self.timeout_spin.setRange(0, 3600)
+        self.timeout_spin.setValue(0)
+        self.timeout_spin.setSuffix(" s")
+        self.timeout_spin.setSpecialValueText("Sem limite")
+        self.timeout_spin.setToolTip("Cancela a consulta de uma camada que exceder este tempo; "
+                                     "a camada é marcada com tempo esgotado")
+        opcoes_row.addWidget(QLabel("Tempo por camada:"))
+        opcoes_row.addWidget(self.timeout_spin)
+
+        self.nova_tentativa_combo = QComboBox()
+        self.nova_tentativa_combo.addItem("Sem nova tentativa", None)
+        self.nova_tentativa_combo.addItem("Repetir com limite maior", "ampliada")
+        self.nova_tentativa_combo.addItem("Estimar pelo planejador", "estimativa")
+        self.nova_tentativa_combo.setToolTip("Tratamento, ao final da execução, das camadas de tempo esgotado")
+        opcoes_row.addWidget(self.nova_tentativa_combo)
+
+        # Subdivisão da AOI (ST_Subdivide); 0 desativa
+        self.max_vertices_spin = QSpinBox()
+        self.max_vertices_spin.setRange(0, 100000)
+        self.max_vertices_spin.setSingleStep(64)
+        self.max_vertices_spin.setValue(0)
+        self.max_vertices_spin.setSpecialValueText("Desativado")
+        self.max_vertices_spin.setToolTip("Subdivide a AOI em pedaços com no máximo N vértices (ST_Subdivide)")
+        opcoes_row.addWidget(QLabel("Máx. vértices da AOI:"))
+        opcoes_row.addWidget(self.max_vertices_spin)
+
+        # Tamanho do perfil dos campos na aba de resultados
+        self.top_n_spin = QSpinBox()
+        self.top_n_spin.setRange(1, 100)
+        self.top_n_spin.setValue(5)
+        self.top_n_spin.setToolTip("Número de valores mais frequentes exibidos por campo")
+        opcoes_row.addWidget(QLabel("Valores por campo:"))
+        opcoes_row.addWidget(self.top_n_spin)
+        layout.addLayout(opcoes_row)
+
         # Seletor de GeoJSON
         geo_row = QHBoxLayout()
         self.geojson_input = QLineEdit(); self.geojson_input.setReadOnly(True)
@@ -83,10 +153,24 @@ class InputTab(QWidget):
         self.executar_btn.setEnabled(False)
         self.executar_btn.clicked.connect(self._executar_intersecoes)
 
+        self.cancelar_btn = QPushButton("Cancelar")
+        self.cancelar_btn.setVisible(False)
+        self.cancelar_btn.clicked.connect(self._cancelar_intersecoes)
+
         btn_row.addWidget(self.buscar_btn)
         btn_row.addWidget(self.executar_btn)
+        btn_row.addWidget(self.cancelar_btn)
         layout.addLayout(btn_row)
 
+        # Progresso da execução
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setVisible(False)
+        layout.addWidget(self.progress_bar)
+
+        self.eta_label = QLabel()
+        self.eta_label.setVisible(False)
+        layout.addWidget(self.eta_label)
+
         # Log visual
         self.log_box = QTextEdit()
         self.log_box.setReadOnly(True)
@@ -94,7 +178,8 @@ class InputTab(QWidget):
         self.log_box.setStyleSheet("font-family: 'Consolas'; font-size: 10pt;")
         layout.addWidget(self.log_box)
 
-        self.logger = Logger(self.log_box)
+        # POSTINTERSECT_LOG_JSONL: arquivo opcional com o log estruturado da sessão
+        self.logger = Logger(self.log_box, arquivo_jsonl=os.environ.get("POSTINTERSECT_LOG_JSONL") or None)
 
         layout.addStretch()
 
@@ -147,12 +232,7 @@ class InputTab(QWidget):
             return
 
         try:
-            with open(caminho, "r", encoding="utf-8") as f:
-                dados = json.load(f)
-
-            for campo in ["host", "port", "dbname", "user", "password"]:
-                if campo not in dados:
-                    raise ValueError(f"Campo ausente: {campo}")
+            dados = carregar_credenciais(caminho)
 
             self.host_input.setText(dados["host"])
             self.port_input.setText(str(dados["port"]))
@@ -203,9 +283,12 @@ class InputTab(QWidget):
         }
 
         try:
-            self.conn = PostgresConnector(config).connect()
-            manager = SchemaManager(self.conn)
-            esquemas = manager.list_schemas()
+            if self.connector is not None:
+                self.connector.close()
+            self.connector = PostgresConnector(config, max_size=self.workers_spin.maximum())
+            self.conn = self.connector.connect()
+            self.catalogo = CatalogCache(config)
+            esquemas = self.catalogo.list_schemas(self.conn)
             self.schema_combo.clear()
             self.schema_combo.addItems(esquemas)
             self.schema_combo.setEnabled(True)
@@ -234,10 +317,10 @@ class InputTab(QWidget):
         """
         esquema = self.schema_combo.currentText()
         try:
-            manager = SchemaManager(self.conn)
-            self.tabelas_com_geometria = manager.list_geometry_tables(esquema)
+            self.tabelas_com_geometria = self.catalogo.list_layers(self.conn, esquema)
             self.executar_btn.setEnabled(bool(self.tabelas_com_geometria))
-            self.logger.log(f"[Tabelas] Encontradas no esquema '{esquema}': {self.tabelas_com_geometria}")
+            nomes = [layer.nome for layer in self.tabelas_com_geometria]
+            self.logger.log(f"[Tabelas] Encontradas no esquema '{esquema}': {nomes}")
         except Exception as e:
             QMessageBox.warning(self, "Erro", f"Erro ao buscar tabelas:\n{e}")
             self.logger.log(f"[Erro] Falha ao buscar tabelas: {e}")
@@ -245,67 +328,186 @@ class InputTab(QWidget):
     def _executar_intersecoes(self):
         """
         Executa ST_Intersects entre a AOI e todas as tabelas com geometria.
+        As consultas rodam em uma thread separada (IntersectionWorker); esta aba
+        apenas acompanha o progresso e recebe os resultados por sinais.
         """
         if not self.aoi_path:
             QMessageBox.warning(self, "Erro", "Selecione uma AOI antes de executar.")
             return
 
-        try:
-            from core.spatial.aoi import AOI
-            aoi = AOI(self.aoi_path)
-            esquema = self.schema_combo.currentText()
-
-            resultados_filtrados = []   # Para ResultsTab
-            resultados_diagnostico = [] # Para CSV e log
-
-            with self.conn.cursor() as cur:
-                for tabela in self.tabelas_com_geometria:
-                    try:
-                        # Conta feições
-                        cur.execute(f"""
-                            SELECT COUNT(*) 
-                            FROM "{esquema}"."{tabela}"
-                            WHERE geom IS NOT NULL
-                            AND ST_IsValid(geom)
-                            AND ST_SRID(geom) = 4674
-                            AND ST_Intersects(geom, ST_GeomFromText(%s, 4674));
-                        """, (aoi.wkt,))
-                        count = cur.fetchone()[0]
-
-                        # Salva no diagnóstico (todas as tabelas)
-                        resultados_diagnostico.append({"tabela": tabela, "count": count})
-
-                        # Loga no painel
-                        if count > 0:
-                            self.logger.log(f"[OK] {tabela} -> {count} feições intersectam")
-
-                            # Busca dados de exemplo para ResultsTab
-                            cur.execute(f"""SELECT * FROM "{esquema}"."{tabela}" LIMIT 5""")
-                            colunas = [desc[0] for desc in cur.description if desc[0] != "geom"]
-                            linhas = cur.fetchall()
-
-                            resultados_filtrados.append({
-                                "tabela": tabela,
-                                "count": count,
-                                "colunas": colunas,
-                                "linhas": linhas
-                            })
-                        else:
-                            self.logger.log(f"[Info] {tabela} -> 0 feições intersectam")
-
-                    except Exception as e:
-                        self.logger.log(f"[Erro] Falha ao processar '{tabela}': {e}")
-                        resultados_diagnostico.append({"tabela": tabela, "count": 0})
-
-            # Guarda listas para exportação
-            self.resultados_intersecao = resultados_diagnostico  # Para CSV
-            self.parent_window.results_tab.carregar_resultados(resultados_filtrados)  # Para interface
-            self.parent_window.mostrar_aba_resultados()
-
-            # Síntese
-            total_com_intersecao = sum(1 for r in resultados_diagnostico if r["count"] > 0)
-            self.logger.log(f"[Interseção] {total_com_intersecao} camadas com interseção encontrada.")
+        if self.worker is not None and self.worker.isRunning():
+            return
 
+        esquema = self.schema_combo.currentText()
+        total = len(self.tabelas_com_geometria)
+
+        try:
+            self.conn = self.connector.connect()  # reconecta se a conexão principal caiu
         except Exception as e:
-            QMessageBox.critical(self, "Erro", f"Erro ao executar interseções:\n{e}")
-            self.logger.log(f"[Erro] Falha na interseção: {e}")
+            QMessageBox.critical(self, "Erro", f"Erro ao conectar:\n{e}")
+            self.logger.log(f"[Erro] Falha na conexão: {e}")
+            return
+
+        self.worker = IntersectionWorker(
+            self.conn, self.aoi_path, esquema, self.tabelas_com_geometria,
+            workers=self.workers_spin.value(),
+            criar_indices=self.criar_indices_check.isChecked(),
+            max_vertices=self.max_vertices(),
+            catalogo=self.catalogo,
+            cache_resultados=self._cache_resultados(),
+            top_n=self.top_n_spin.value(),
+            amostras=False,  # o perfil dos campos é buscado ao expandir a camada
+            assincrono=self.assincrono_check.isChecked(),
+            timeout_consulta=self.timeout_spin.value() or None,
+            nova_tentativa=self.nova_tentativa_combo.currentData() if self.timeout_spin.value() else None,
+            pool=self.connector,
+            parent=self
+        )
+        self.worker.camada_concluida.connect(self._camada_concluida)
+        self.worker.concluido.connect(self._intersecoes_concluidas)
+        self.worker.falhou.connect(self._intersecoes_falharam)
+
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+        self.eta_label.setText(f"0/{total} camadas")
+        self.eta_label.setVisible(True)
+        self._set_executando(True)
+
+        self._inicio_execucao = time.monotonic()
+        self.logger.log(f"[Interseção] Iniciando em {total} camadas do esquema '{esquema}'...")
+        self.worker.start()
+
+    def _cancelar_intersecoes(self):
+        """
+        Cancela a execução em andamento, abortando a consulta atual no servidor.
+        """
+        if self.worker is not None and self.worker.isRunning():
+            self.cancelar_btn.setEnabled(False)
+            self.logger.log("[Interseção] Cancelando...")
+            self.worker.cancelar()
+
+    def _set_executando(self, executando: bool):
+        """
+        Alterna os botões entre o estado de execução e o estado ocioso.
+        """
+        self.executar_btn.setEnabled(not executando)
+        self.buscar_btn.setEnabled(not executando)
+        self.conectar_btn.setEnabled(not executando)
+        self.workers_spin.setEnabled(not executando)
+        self.criar_indices_check.setEnabled(not executando)
+        self.max_vertices_spin.setEnabled(not executando)
+        self.usar_cache_check.setEnabled(not executando)
+        self.assincrono_check.setEnabled(not executando)
+        self.timeout_spin.setEnabled(not executando)
+        self.nova_tentativa_combo.setEnabled(not executando)
+        self.top_n_spin.setEnabled(not executando)
+        self.cancelar_btn.setEnabled(executando)
+        self.cancelar_btn.setVisible(executando)
+
+    def max_vertices(self) -> int | None:
+        """
+        Limite de vértices por pedaço da AOI, ou None se a subdivisão estiver desativada.
+        """
+        valor = self.max_vertices_spin.value()
+        return max(valor, 5) if valor else None
+
+    def _cache_resultados(self) -> ResultCache | None:
+        """
+        Abre o cache de resultados na primeira execução com o cache ativado.
+        """
+        if not self.usar_cache_check.isChecked():
+            return None
+        if self.cache_resultados is None:
+            try:
+                self.cache_resultados = ResultCache()
+            except Exception as e:
+                self.logger.log(f"[Aviso] Cache de resultados indisponível: {e}")
+                return None
+        return self.cache_resultados
+
+    def _camada_concluida(self, r: dict, concluidas: int, total: int):
+        """
+        Atualiza log, barra de progresso e estimativa de tempo restante
+        a cada camada processada pelo worker.
+        """
+        tabela = r["tabela"]
+        if "erro" in r:
+            self.logger.log(f"[Erro] Falha ao processar '{tabela}': {r['erro']}")
+        elif r.get("estimado"):
+            self.logger.log(f"[Aviso] {tabela} -> tempo esgotado, ~{r['count']} feições (estimativa do planejador)")
+        elif r["count"] > 0:
+            origem = " (cache)" if r.get("cache") else ""
+            self.logger.log(f"[OK] {tabela} -> {r['count']} feições intersectam{origem}")
+        elif r.get("fora_extensao"):
+            self.logger.log(f"[Info] {tabela} -> 0 feições (fora da extensão da AOI)")
+        else:
+            self.logger.log(f"[Info] {tabela} -> 0 feições intersectam")
+        if r.get("invalidas"):
+            self.logger.log(f"[Aviso] {tabela} -> {r['invalidas']} feições com geometria inválida ignoradas")
+        if r.get("sem_indice"):
+            self.logger.log(f"[Aviso] {tabela} não possui índice espacial (GiST) na coluna geométrica")
+
+        self.progress_bar.setValue(concluidas)
+
+        decorrido = time.monotonic() - self._inicio_execucao
+        restante = decorrido / concluidas * (total - concluidas)
+        self.eta_label.setText(f"{concluidas}/{total} camadas — restante ~{self._formatar_tempo(restante)}")
+
+    @staticmethod
+    def _formatar_tempo(segundos: float) -> str:
+        minutos, segundos = divmod(int(segundos), 60)
+        horas, minutos = divmod(minutos, 60)
+        if horas:
+            return f"{horas}h{minutos:02d}m"
+        if minutos:
+            return f"{minutos}m{segundos:02d}s"
+        return f"{segundos}s"
+
+    def _intersecoes_concluidas(self, resultados: list, cancelado: bool):
+        """
+        Recebe a lista completa de resultados do worker e alimenta a aba de visualização.
+        """
+        self._set_executando(False)
+        self.progress_bar.setVisible(False)
+        self.eta_label.setVisible(False)
+
+        if cancelado:
+            self.logger.log(f"[Interseção] Execução cancelada após {len(resultados)} camadas.")
+            return
+
+        resultados_diagnostico = [  # Para CSV e log
+            {
+                "tabela": r["tabela"], "count": r["count"], "fora_extensao": r.get("fora_extensao", False),
+                "tempo_esgotado": r.get("tempo_esgotado", False), "estimado": r.get("estimado", False)
+            }
+            for r in resultados
+        ]
+        resultados_filtrados = [r for r in resultados if r["count"] > 0]  # Para ResultsTab
+
+        # Guarda a AOI já processada e as listas para exportação
+        self.aoi = self.worker.aoi
+        self.runner = self.worker.runner
+        self.execucao = self.runner.execucao if self.runner else None
+        self.tempos = self.aoi.tempos if self.aoi else None
+        self.resultados_intersecao = resultados_diagnostico  # Para CSV
+        self.parent_window.results_tab.carregar_resultados(resultados_filtrados)  # Para interface
+        self.parent_window.mostrar_aba_resultados()
+
+        # Síntese
+        total_com_intersecao = sum(1 for r in resultados_diagnostico if r["count"] > 0)
+        decorrido = self._formatar_tempo(time.monotonic() - self._inicio_execucao)
+        self.logger.log(f"[Interseção] {total_com_intersecao} camadas com interseção encontrada ({decorrido}).")
+        esgotadas = [r["tabela"] for r in resultados if r.get("tempo_esgotado")]
+        if esgotadas:
+            self.logger.log(f"[Aviso] {len(esgotadas)} camadas excederam o tempo limite: {', '.join(esgotadas)}.")
+            sem_indice = [r["tabela"] for r in resultados if r.get("tempo_esgotado") and r.get("sem_indice")]
+            if sem_indice:
+                self.logger.log(f"[Aviso] Considere criar índices espaciais em: {', '.join(sem_indice)}.")
+
+    def _intersecoes_falharam(self, erro: str):
+        self._set_executando(False)
+        self.progress_bar.setVisible(False)
+        self.eta_label.setVisible(False)
+        QMessageBox.critical(self, "Erro", f"Erro ao executar interseções:\n{erro}")
+        self.logger.log(f"[Erro] Falha na interseção: {erro}")
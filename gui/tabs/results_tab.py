@@ -1,16 +1,21 @@
 """
 Este módulo define a aba de resultados (ResultsTab), responsável por exibir os
-resultados da interseção espacial com a AOI. Os dados são apresentados em um
-QTreeWidget com opções de exportação para CSV e GeoPackage.
+resultados da interseção espacial com a AOI. Os dados são apresentados em uma
+QTreeView sobre um modelo com carga sob demanda (ResultsModel): os campos e o
+perfil de cada camada só são buscados quando a camada é expandida. Um campo de
+busca filtra camadas e campos sem reconstruir a árvore. Oferece exportação para
+CSV e GeoPackage, e do perfil de tempos da execução (JSON ou HTML).
 """
 
 from PyQt6.QtWidgets import (
-    QWidget, QVBoxLayout, QTreeWidget, QTreeWidgetItem,
-    QHBoxLayout, QPushButton, QFileDialog, QMessageBox
+    QWidget, QVBoxLayout, QTreeView, QLineEdit,
+    QHBoxLayout, QPushButton, QFileDialog, QMessageBox, QCheckBox
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QSortFilterProxyModel
 from core.exporter.csv_exporter import CSVExporter
 from core.exporter.gpkg_exporter import GPKGExporter
+from gui.widgets.results_model import ResultsModel
+from gui.workers.profile_worker import ProfileWorker
 from utils.logger import Logger
 from core.spatial.aoi import AOI
 
@@ -22,6 +27,8 @@ class ResultsTab(QWidget):
         self.conn = None
         self.resultados = []
         self.aoi_path = None
+        # Buscas de perfil em andamento, por (runner de origem, camada)
+        self._perfis: dict[tuple[int, str], ProfileWorker] = {}
 
         self._setup_ui()
 
@@ -29,8 +36,27 @@ class ResultsTab(QWidget):
         layout = QVBoxLayout()
         self.setLayout(layout)
 
-        self.tree = QTreeWidget()
-        self.tree.setHeaderLabels(["Camada"])
+        # Busca por camada ou campo (apenas nós já carregados)
+        self.filtro_input = QLineEdit()
+        self.filtro_input.setPlaceholderText("Filtrar camadas e campos...")
+        self.filtro_input.setClearButtonEnabled(True)
+        layout.addWidget(self.filtro_input)
+
+        self.model = ResultsModel(self)
+        self.model.perfil_solicitado.connect(self._buscar_perfil)
+
+        self.proxy = QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setRecursiveFilteringEnabled(True)
+        self.proxy.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.proxy.setFilterKeyColumn(0)
+        self.filtro_input.textChanged.connect(self.proxy.setFilterFixedString)
+
+        self.tree = QTreeView()
+        self.tree.setModel(self.proxy)
+        self.tree.setUniformRowHeights(True)
+        self.tree.header().setStretchLastSection(False)
+        self.tree.setColumnWidth(0, 380)
         layout.addWidget(self.tree)
 
         # Botões de exportação
@@ -44,6 +70,17 @@ class ResultsTab(QWidget):
         self.export_gpkg_btn.clicked.connect(self._exportar_gpkg)
 
         btns.addWidget(self.export_gpkg_btn)
+
+        self.export_perfil_btn = QPushButton("Exportar Perfil da Execução")
+        self.export_perfil_btn.setToolTip("Tempos por etapa e por camada da última interseção e exportações")
+        self.export_perfil_btn.clicked.connect(self._exportar_perfil_execucao)
+        btns.addWidget(self.export_perfil_btn)
+
+        self.reparar_check = QCheckBox("Corrigir geometrias inválidas")
+        self.reparar_check.setToolTip(
+            "Corrige as geometrias inválidas com make_valid em vez de descartá-las na exportação"
+        )
+        btns.addWidget(self.reparar_check)
         btns.addStretch()
         layout.addLayout(btns)
 
@@ -51,43 +88,51 @@ class ResultsTab(QWidget):
 
     def carregar_resultados(self, resultados: list[dict]):
         """
-        Preenche a árvore de visualização com os resultados.
+        Exibe os resultados. Apenas as camadas são criadas; campos e valores
+        são carregados ao expandir cada nó. Perfis ainda em busca de uma
+        execução anterior são descartados quando chegarem.
         """
         self.resultados = resultados
-        self.tree.clear()
-
-        for r in resultados:
-            if "erro" in r:
-                continue
-
-            tabela = r['tabela']
-            colunas = r['colunas']
-            linhas = r['linhas']
-
-            item = QTreeWidgetItem([tabela])
-            item.setCheckState(0, Qt.CheckState.Checked)
-
-            registros = [
-                {col: val for col, val in zip(colunas, linha)}
-                for linha in linhas
-            ]
+        self.filtro_input.clear()
+        self.model.carregar(resultados)
 
-            for campo in colunas:
-                campo_item = QTreeWidgetItem([f" {campo}"])
-                valores_unicos = []
-                for reg in registros:
-                    val = reg.get(campo)
-                    if val is not None:
-                        val_str = str(val).strip()
-                        if val_str and val_str not in valores_unicos:
-                            valores_unicos.append(val_str)
-                    if len(valores_unicos) >= 5:
-                        break
-                for v in valores_unicos:
-                    campo_item.addChild(QTreeWidgetItem([f"  → {v[:100]}"]))
-                item.addChild(campo_item)
-
-            self.tree.addTopLevelItem(item)
+    def _buscar_perfil(self, tabela: str):
+        """
+        Busca no banco, em segundo plano, o perfil dos campos de uma camada expandida.
+        """
+        input_tab = self.parent_window.input_tab
+        runner = self._runner_atual()
+        if runner is None:
+            self.model.falha_perfil(tabela)
+            return
+        chave = (id(runner), tabela)
+        if chave in self._perfis:
+            return  # a busca já está em andamento
+
+        worker = ProfileWorker(runner, tabela, pool=input_tab.connector, parent=self)
+        worker.concluido.connect(
+            lambda tabela, colunas, perfil: self._perfil_concluido(runner, tabela, colunas, perfil)
+        )
+        worker.falhou.connect(lambda tabela, erro: self._perfil_falhou(runner, tabela, erro))
+        # Ao terminar, a thread sai das buscas em andamento e é destruída
+        worker.finished.connect(lambda: self._perfis.pop(chave, None))
+        worker.finished.connect(worker.deleteLater)
+        self._perfis[chave] = worker
+        worker.start()
+
+    def _runner_atual(self):
+        return getattr(self.parent_window.input_tab, "runner", None)
+
+    def _perfil_concluido(self, runner, tabela: str, colunas: list, perfil: dict):
+        if runner is not self._runner_atual():
+            return  # perfil de uma execução anterior
+        self.model.definir_perfil(tabela, colunas, perfil)
+
+    def _perfil_falhou(self, runner, tabela: str, erro: str):
+        if runner is not self._runner_atual():
+            return
+        self.model.falha_perfil(tabela)
+        self.logger.log(f"[Erro] Falha ao buscar o perfil de '{tabela}': {erro}")
 
     def _exportar_csv_diagnostico(self):
         if not hasattr(self.parent_window.input_tab, "resultados_intersecao") \
@@ -100,19 +145,34 @@ class ResultsTab(QWidget):
             return
 
         try:
-            import pandas as pd
-            dados = [
-                {"Tabela": r["tabela"], "Feições Encontradas": r["count"]}
-                for r in self.parent_window.input_tab.resultados_intersecao
-            ]
-            df = pd.DataFrame(dados)
-            df.to_csv(caminho, index=False, encoding="utf-8-sig")
+            CSVExporter.export(
+                self.parent_window.input_tab.resultados_intersecao, caminho,
+                tempos=getattr(self.parent_window.input_tab, "tempos", None)
+            )
             QMessageBox.information(self, "Sucesso", "Diagnóstico exportado com sucesso!")
             self.logger.log(f"[Export] Diagnóstico salvo em: {caminho}")
         except Exception as e:
             QMessageBox.critical(self, "Erro", f"Erro ao exportar CSV:\n{e}")
 
 
+    def _exportar_perfil_execucao(self):
+        tempos = getattr(self.parent_window.input_tab, "tempos", None)
+        if tempos is None:
+            QMessageBox.warning(self, "Aviso", "Nenhuma execução para exportar.")
+            return
+
+        caminho, _ = QFileDialog.getSaveFileName(
+            self, "Salvar Perfil da Execução", "", "HTML (*.html);;JSON (*.json)"
+        )
+        if not caminho:
+            return
+
+        try:
+            tempos.salvar(caminho)
+            self.logger.log(f"[Export] Perfil da execução salvo em: {caminho}")
+        except Exception as e:
+            QMessageBox.critical(self, "Erro", f"Erro ao exportar o perfil:\n{e}")
+
     def _exportar_gpkg(self):
         if not self.resultados:
             QMessageBox.warning(self, "Aviso", "Nenhum resultado para exportar.")
@@ -123,12 +183,8 @@ class ResultsTab(QWidget):
             return
 
         try:
-            # Determina as camadas marcadas pelo usuário
-            selecionadas = []
-            for i in range(self.tree.topLevelItemCount()):
-                item = self.tree.topLevelItem(i)
-                if item.checkState(0) == Qt.CheckState.Checked:
-                    selecionadas.append(item.text(0))
+            # Determina as camadas marcadas pelo usuário (mesmo as ocultas pelo filtro)
+            selecionadas = self.model.selecionadas()
 
             if not selecionadas:
                 QMessageBox.warning(self, "Aviso", "Nenhuma camada selecionada.")
@@ -142,9 +198,28 @@ class ResultsTab(QWidget):
             conn = self.parent_window.input_tab.conn
             schema = self.parent_window.input_tab.schema_combo.currentText()
 
-            exporter = GPKGExporter(conn, AOI(aoi_path).wkt, schema)
+            # Reaproveita a AOI já dissolvida na última interseção, se for a mesma
+            aoi = getattr(self.parent_window.input_tab, "aoi", None)
+            if aoi is None or aoi.filepath != aoi_path:
+                aoi = AOI(aoi_path, tempos=getattr(self.parent_window.input_tab, "tempos", None))
+
+            # Usa os descritores de camada (coluna geométrica, SRID) da busca de tabelas
+            camadas = [
+                layer for layer in self.parent_window.input_tab.tabelas_com_geometria
+                if layer.nome in selecionadas
+            ]
+
+            input_tab = self.parent_window.input_tab
+            exporter = GPKGExporter(
+                conn, aoi, schema,
+                max_vertices=input_tab.max_vertices(),
+                workers=input_tab.workers_spin.value(),
+                pool=input_tab.connector,
+                execucao=input_tab.execucao,
+                reparar=self.reparar_check.isChecked()
+            )
             exporter.export_layers(
-                selecionadas,
+                camadas,
                 caminho,
                 log_func=self.logger.log,
                 aoi_path=aoi_path
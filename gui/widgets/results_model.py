@@ -0,0 +1,240 @@
+"""
+Este módulo define a classe ResultsModel, um QAbstractItemModel com os resultados
+da interseção em três níveis: camada -> campo -> valores mais frequentes.
+
+Apenas as camadas são criadas ao carregar os resultados. Os campos de uma camada
+e os valores de um campo só são materializados quando o nó é expandido
+(canFetchMore/fetchMore), em blocos. Se o perfil de uma camada ainda não foi
+calculado, o modelo emite perfil_solicitado e os campos aparecem quando o perfil
+chega (definir_perfil), sem reconstruir a árvore.
+
+Para filtrar, use um QSortFilterProxyModel com filtragem recursiva sobre este modelo.
+"""
+
+from PyQt6.QtCore import QAbstractItemModel, QModelIndex, Qt, pyqtSignal
+
+CAMADA, CAMPO, VALOR = range(3)
+BLOCO = 100  # nós filhos inseridos por fetchMore
+
+
+class _No:
+    __slots__ = ("tipo", "texto", "valor", "pai", "linha", "filhos", "dados", "pendentes", "marcado")
+
+    def __init__(self, tipo: int, texto: str, valor=None, pai: "_No | None" = None, linha: int = 0):
+        self.tipo = tipo
+        self.texto = texto
+        self.valor = valor  # segunda coluna (feições, distintos ou frequência)
+        self.pai = pai
+        self.linha = linha
+        self.filhos: list[_No] = []
+        self.dados = None  # camada: resultado; campo: perfil do campo
+        self.pendentes: list | None = None  # filhos ainda não materializados
+        self.marcado = True
+
+
+class ResultsModel(QAbstractItemModel):
+    # nome da camada cujo perfil precisa ser buscado no banco
+    perfil_solicitado = pyqtSignal(str)
+
+    CABECALHOS = ("Camada", "Feições")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._raiz = _No(-1, "")
+        self._camadas: dict[str, _No] = {}
+        self._solicitados: set[str] = set()
+
+    # ------------------------------------------------------------------
+    # Carga
+    # ------------------------------------------------------------------
+
+    def carregar(self, resultados: list[dict]):
+        """
+        Substitui os resultados exibidos. Só os nós de camada são criados aqui.
+        """
+        self.beginResetModel()
+        self._raiz.filhos = []
+        self._camadas = {}
+        self._solicitados = set()
+        for r in resultados:
+            if "erro" in r:
+                continue
+            no = _No(CAMADA, r["tabela"], r.get("count", 0), self._raiz, len(self._raiz.filhos))
+            no.dados = r
+            self._raiz.filhos.append(no)
+            self._camadas[no.texto] = no
+        self.endResetModel()
+
+    def definir_perfil(self, tabela: str, colunas: list[str], perfil: dict):
+        """
+        Recebe o perfil de uma camada buscado sob demanda e materializa o
+        primeiro bloco dos seus campos.
+        """
+        no = self._camadas.get(tabela)
+        self._solicitados.discard(tabela)
+        if no is None:
+            return
+        no.dados = {**no.dados, "colunas": colunas, "perfil": perfil}
+        no.pendentes = None
+        self.fetchMore(self._indice(no))
+
+    def falha_perfil(self, tabela: str):
+        """
+        Libera uma nova tentativa de buscar o perfil da camada.
+        """
+        self._solicitados.discard(tabela)
+
+    def _filhos_pendentes(self, no: _No) -> list | None:
+        """
+        Filhos ainda não materializados de um nó, ou None se o perfil da camada
+        ainda não está disponível.
+        """
+        if no.pendentes is not None:
+            return no.pendentes
+        if no.tipo == CAMADA:
+            if "perfil" not in no.dados:
+                return None
+            perfil = no.dados["perfil"]
+            no.pendentes = [
+                (CAMPO, campo, perfil.get(campo, {}))
+                for campo in no.dados.get("colunas", [])
+            ]
+        elif no.tipo == CAMPO:
+            dados = no.dados or {}
+            no.pendentes = [(VALOR, f"→ {str(valor).strip()[:100]}", freq) for valor, freq in dados.get("valores", [])]
+            if dados.get("nulos"):
+                no.pendentes.append((VALOR, "→ (nulo)", dados["nulos"]))
+        else:
+            no.pendentes = []
+        return no.pendentes
+
+    # ------------------------------------------------------------------
+    # Seleção
+    # ------------------------------------------------------------------
+
+    def selecionadas(self) -> list[str]:
+        """
+        Nomes das camadas marcadas, independentemente do filtro aplicado na view.
+        """
+        return [no.texto for no in self._raiz.filhos if no.marcado]
+
+    def marcar_todas(self, marcado: bool):
+        for no in self._raiz.filhos:
+            no.marcado = marcado
+        if self._raiz.filhos:
+            self.dataChanged.emit(
+                self.index(0, 0), self.index(len(self._raiz.filhos) - 1, 0),
+                [Qt.ItemDataRole.CheckStateRole]
+            )
+
+    # ------------------------------------------------------------------
+    # Interface do QAbstractItemModel
+    # ------------------------------------------------------------------
+
+    def _no(self, indice: QModelIndex) -> _No:
+        return indice.internalPointer() if indice.isValid() else self._raiz
+
+    def _indice(self, no: _No, coluna: int = 0) -> QModelIndex:
+        if no is self._raiz:
+            return QModelIndex()
+        return self.createIndex(no.linha, coluna, no)
+
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        pai = self._no(parent)
+        if not (0 <= row < len(pai.filhos)) or not (0 <= column < len(self.CABECALHOS)):
+            return QModelIndex()
+        return self.createIndex(row, column, pai.filhos[row])
+
+    def parent(self, index: QModelIndex = QModelIndex()) -> QModelIndex:
+        if not index.isValid():
+            return QModelIndex()
+        pai = index.internalPointer().pai
+        return self._indice(pai) if pai is not None else QModelIndex()
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.column() > 0:
+            return 0
+        return len(self._no(parent).filhos)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return len(self.CABECALHOS)
+
+    def hasChildren(self, parent: QModelIndex = QModelIndex()) -> bool:
+        no = self._no(parent)
+        if no is self._raiz or no.filhos:
+            return True
+        if no.tipo == VALOR:
+            return False
+        pendentes = self._filhos_pendentes(no)
+        return pendentes is None or bool(pendentes)
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        no = self._no(parent)
+        if no is self._raiz or no.tipo == VALOR:
+            return False
+        pendentes = self._filhos_pendentes(no)
+        return pendentes is None or len(no.filhos) < len(pendentes)
+
+    def fetchMore(self, parent: QModelIndex):
+        no = self._no(parent)
+        if no is self._raiz:
+            return
+        pendentes = self._filhos_pendentes(no)
+        if pendentes is None:
+            # Perfil ainda não calculado: busca no banco uma única vez
+            if no.texto not in self._solicitados:
+                self._solicitados.add(no.texto)
+                self.perfil_solicitado.emit(no.texto)
+            return
+
+        inicio = len(no.filhos)
+        fim = min(inicio + BLOCO, len(pendentes))
+        if fim <= inicio:
+            return
+        self.beginInsertRows(parent, inicio, fim - 1)
+        for linha in range(inicio, fim):
+            tipo, texto, dados = pendentes[linha]
+            if tipo == CAMPO:
+                filho = _No(CAMPO, texto, dados.get("distintos", 0), no, linha)
+                filho.dados = dados
+            else:
+                filho = _No(VALOR, texto, dados, no, linha)
+            no.filhos.append(filho)
+        self.endInsertRows()
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        no = index.internalPointer()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if index.column() == 0:
+                return no.texto
+            return "" if no.valor is None else str(no.valor)
+        if role == Qt.ItemDataRole.CheckStateRole and no.tipo == CAMADA and index.column() == 0:
+            return Qt.CheckState.Checked if no.marcado else Qt.CheckState.Unchecked
+        if role == Qt.ItemDataRole.ToolTipRole and no.tipo == CAMPO and index.column() == 1:
+            return "Valores distintos"
+        return None
+
+    def setData(self, index: QModelIndex, value, role: int = Qt.ItemDataRole.EditRole) -> bool:
+        if not index.isValid() or role != Qt.ItemDataRole.CheckStateRole:
+            return False
+        no = index.internalPointer()
+        if no.tipo != CAMADA:
+            return False
+        no.marcado = Qt.CheckState(value) == Qt.CheckState.Checked
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.CheckStateRole])
+        return True
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlag:
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        if index.internalPointer().tipo == CAMADA and index.column() == 0:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable
+        return flags
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.CABECALHOS[section]
+        return None
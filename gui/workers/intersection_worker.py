@@ -0,0 +1,96 @@
+"""
+Este módulo define a classe IntersectionWorker, uma QThread que executa as
+interseções espaciais fora da thread da interface gráfica.
+
+A cada camada processada é emitido um sinal com o resultado parcial, permitindo
+atualizar o log e a barra de progresso sem congelar a janela. A execução pode
+ser cancelada a qualquer momento, inclusive no meio de uma consulta.
+
+Com `assincrono`, as consultas usam o AsyncIntersectionRunner (psycopg 3).
+`timeout_consulta` e `nova_tentativa` limitam o tempo da consulta de cada
+camada (ver IntersectionRunner).
+"""
+
+from PyQt6.QtCore import QThread, pyqtSignal
+from core.spatial.aoi import AOI
+from core.spatial.intersection_runner import IntersectionRunner
+from utils.run_profiler import RunProfiler
+
+
+class IntersectionWorker(QThread):
+    # resultado da camada, número de camadas concluídas, total de camadas
+    camada_concluida = pyqtSignal(dict, int, int)
+    # lista completa de resultados, True se a execução foi cancelada
+    concluido = pyqtSignal(list, bool)
+    falhou = pyqtSignal(str)
+
+    def __init__(self, conn, aoi_path: str, schema: str, tables: list[str],
+                 workers: int = 1, pool=None, criar_indices: bool = False,
+                 max_vertices: int | None = None, catalogo=None, cache_resultados=None,
+                 top_n: int = 5, amostras: bool = True, assincrono: bool = False,
+                 timeout_consulta: float | None = None, nova_tentativa: str | None = None, parent=None):
+        super().__init__(parent)
+        self.conn = conn
+        self.aoi_path = aoi_path
+        self.schema = schema
+        self.tables = tables
+        self.workers = workers
+        self.pool = pool
+        self.criar_indices = criar_indices
+        self.max_vertices = max_vertices
+        self.catalogo = catalogo
+        self.cache_resultados = cache_resultados
+        self.top_n = top_n
+        self.amostras = amostras
+        self.assincrono = assincrono
+        self.timeout_consulta = timeout_consulta
+        self.nova_tentativa = nova_tentativa
+        self.aoi: AOI | None = None
+        self.runner: IntersectionRunner | None = None
+        self._cancelado = False
+
+    def run(self):
+        """
+        Lê a AOI e percorre as camadas, emitindo um sinal por camada concluída.
+        """
+        try:
+            aoi = AOI(self.aoi_path, tempos=RunProfiler())
+            aoi.wkb  # dissolve e serializa a AOI ainda na thread de trabalho
+            self.aoi = aoi
+            if self._cancelado:
+                self.concluido.emit([], True)
+                return
+
+            classe = IntersectionRunner
+            if self.assincrono:
+                from core.spatial.async_runner import AsyncIntersectionRunner
+
+                classe = AsyncIntersectionRunner
+            self.runner = classe(
+                self.conn, aoi, self.schema, self.tables,
+                workers=self.workers, pool=self.pool, criar_indices=self.criar_indices,
+                max_vertices=self.max_vertices, catalogo=self.catalogo,
+                cache_resultados=self.cache_resultados, top_n=self.top_n,
+                timeout_consulta=self.timeout_consulta, nova_tentativa=self.nova_tentativa
+            )
+            if self._cancelado:
+                self.runner.cancel()
+            total = len(self.tables)
+            resultados = []
+
+            for r in self.runner.iter_resultados(amostras=self.amostras):
+                resultados.append(r)
+                self.camada_concluida.emit(r, len(resultados), total)
+
+            self.concluido.emit(resultados, self.runner.cancelado)
+
+        except Exception as e:
+            self.falhou.emit(str(e))
+
+    def cancelar(self):
+        """
+        Cancela a execução, abortando também a consulta em andamento no servidor.
+        """
+        self._cancelado = True
+        if self.runner is not None:
+            self.runner.cancel()
@@ -0,0 +1,46 @@
+"""
+Este módulo define a classe ProfileWorker, uma QThread que busca no banco o
+perfil dos campos de uma camada (valores mais frequentes entre as feições que
+intersectam a AOI) quando o usuário expande a camada na aba de resultados.
+
+Usa uma conexão do pool, para não disputar a conexão principal com
+interseções ou exportações em andamento.
+"""
+
+from PyQt6.QtCore import QThread, pyqtSignal
+from core.spatial.intersection_runner import IntersectionRunner
+
+
+class ProfileWorker(QThread):
+    # nome da camada, colunas, perfil
+    concluido = pyqtSignal(str, list, dict)
+    # nome da camada, mensagem de erro
+    falhou = pyqtSignal(str, str)
+
+    def __init__(self, runner: IntersectionRunner, tabela: str, pool=None, parent=None):
+        super().__init__(parent)
+        self.runner = runner
+        self.tabela = tabela
+        self.pool = pool
+
+    def run(self):
+        layer = next((l for l in self.runner.layers if l.nome == self.tabela), None)
+        if layer is None:
+            self.falhou.emit(self.tabela, "camada não encontrada")
+            return
+
+        try:
+            conn = self.pool.acquire() if self.pool is not None else self.runner.conn
+        except Exception as e:
+            self.falhou.emit(self.tabela, str(e))
+            return
+
+        try:
+            r = self.runner.perfil_camada(conn, layer)
+            self.concluido.emit(self.tabela, r["colunas"], r["perfil"])
+        except Exception as e:
+            conn.rollback()
+            self.falhou.emit(self.tabela, str(e))
+        finally:
+            if self.pool is not None:
+                self.pool.release(conn)
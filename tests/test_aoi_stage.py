@@ -0,0 +1,48 @@
+"""
+Testes do nome e da verificação das tabelas temporárias da AOI (AOIStage).
+"""
+
+import pytest
+
+gpd = pytest.importorskip("geopandas")
+pytest.importorskip("psycopg2")
+
+from shapely.geometry import box
+
+from core.spatial.aoi import AOI
+from core.spatial.aoi_stage import AOIStage
+
+
+def _stage(geometrias, codigos) -> AOIStage:
+    gdf = gpd.GeoDataFrame({"cod": codigos}, geometry=geometrias, crs="EPSG:4674")
+    return AOIStage(AOI("aoi.geojson", gdf=gdf), campo_id="cod")
+
+
+def test_mesmo_contorno_dividido_em_feicoes_diferentes_tem_tabelas_diferentes():
+    inteira = _stage([box(0, 0, 2, 1)], ["a"])
+    dividida = _stage([box(0, 0, 1, 1), box(1, 0, 2, 1)], ["a", "b"])
+
+    assert inteira.aoi.hash == dividida.aoi.hash
+    assert inteira.table_name != dividida.table_name
+
+
+def test_identificadores_diferentes_tem_tabelas_diferentes():
+    geometrias = [box(0, 0, 1, 1), box(1, 0, 2, 1)]
+    assert _stage(geometrias, ["a", "b"]).table_name != _stage(geometrias, ["b", "a"]).table_name
+
+
+def test_mesma_aoi_reaproveita_a_tabela():
+    geometrias = [box(0, 0, 1, 1), box(1, 0, 2, 1)]
+    stage = _stage(geometrias, ["a", "b"])
+    outro = _stage(geometrias, ["a", "b"])
+
+    assert stage.table_name == outro.table_name
+    assert stage.passos({stage.table_name: stage.conteudo_hash}) == []
+
+
+def test_tabela_com_outro_conteudo_e_recriada():
+    stage = _stage([box(0, 0, 1, 1), box(1, 0, 2, 1)], ["a", "b"])
+    passos = [sql for sql, _ in stage.passos({stage.table_name: "outro"})]
+
+    assert passos[0] == f'DROP TABLE pg_temp."{stage.table_name}"'
+    assert any(sql.startswith("COPY") for sql in passos)
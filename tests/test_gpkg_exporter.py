@@ -0,0 +1,59 @@
+"""
+Testes da montagem e limpeza dos lotes lidos do banco pelo GPKGExporter.
+"""
+
+import pytest
+
+pytest.importorskip("geopandas")
+pytest.importorskip("psycopg2")
+
+import shapely
+from shapely.geometry import Point, box
+
+from core.exporter.gpkg_exporter import limpar_geometrias, montar_lote
+
+
+def _ewkb_hex(geometria) -> str:
+    # Como o psycopg2 entrega colunas geometry: EWKB em hexadecimal
+    return shapely.to_wkb(shapely.set_srid(geometria, 4674), hex=True, include_srid=True)
+
+
+def test_atributo_chamado_geometry_nao_colide_com_a_geometria():
+    # Tabela com um atributo de texto chamado "geometry" além da coluna geométrica "geom"
+    colunas = ["id", "geometry", "geom"]
+    linhas = [
+        (1, "poligono", _ewkb_hex(box(0, 0, 1, 1))),
+        (2, "ponto", _ewkb_hex(Point(5, 5))),
+    ]
+
+    gdf, zmflag, recebidos = montar_lote(linhas, colunas, "geom", "EPSG:4674")
+
+    assert zmflag is None
+    assert recebidos > 0
+    assert gdf.geometry.name == "geom"
+    assert list(gdf["geometry"]) == ["poligono", "ponto"]
+    assert gdf.geometry.iloc[0].equals(box(0, 0, 1, 1))
+    assert gdf.crs.to_epsg() == 4674
+
+
+def test_coluna_zmflag_e_retirada():
+    colunas = ["id", "geom", "__zmflag"]
+    linhas = [(1, _ewkb_hex(Point(1, 1)), 0)]
+
+    gdf, zmflag, _ = montar_lote(linhas, colunas, "geom", "EPSG:4674", com_flag=True)
+
+    assert "__zmflag" not in gdf.columns
+    assert list(zmflag) == [0]
+
+
+def test_reparo_preserva_o_atributo_geometry():
+    gravata = shapely.from_wkt("POLYGON ((0 0, 1 1, 1 0, 0 1, 0 0))")
+    linhas = [(1, "invalida", _ewkb_hex(gravata))]
+    gdf, _, _ = montar_lote(linhas, ["id", "geometry", "geom"], "geom", "EPSG:4674")
+
+    limpo, reparadas, descartadas = limpar_geometrias(gdf, reparar=True)
+
+    assert (reparadas, descartadas) == (1, 0)
+    assert limpo.geometry.name == "geom"
+    assert list(limpo["geometry"]) == ["invalida"]
+    assert limpo.geometry.iloc[0].is_valid
@@ -0,0 +1,52 @@
+"""
+Testes da chave do cache de resultados (ResultCache) montada pelo IntersectionRunner.
+"""
+
+import pytest
+
+gpd = pytest.importorskip("geopandas")
+pytest.importorskip("psycopg2")
+
+from shapely.geometry import box
+
+from core.spatial.aoi import AOI
+from core.spatial.intersection_runner import IntersectionRunner
+from core.spatial.result_cache import ResultCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResultCache(path=str(tmp_path / "resultados.sqlite"))
+    yield cache
+    cache.close()
+
+
+def _runner(cache, **opcoes) -> IntersectionRunner:
+    gdf = gpd.GeoDataFrame(geometry=[box(-50, -20, -49, -19)], crs="EPSG:4674")
+    runner = IntersectionRunner(None, AOI("aoi.geojson", gdf=gdf), "dados", ["rios"],
+                                cache_resultados=cache, **opcoes)
+    layer = runner.layers[0]
+    runner._marcadores = {layer: "1:1:10"}
+    runner._colunas_chave = {(layer.schema, layer.table): "id"}
+    return runner
+
+
+def _chave(runner: IntersectionRunner) -> str:
+    return runner._chave_cache(runner.layers[0], amostras=True)
+
+
+def test_max_chaves_diferente_nao_reaproveita_o_cache(cache):
+    chave = _chave(_runner(cache, max_chaves=10))
+    cache.put(chave, {"tabela": "dados.rios", "count": 50})
+
+    assert cache.get(_chave(_runner(cache, max_chaves=10))) is not None
+    assert cache.get(_chave(_runner(cache, max_chaves=1_000))) is None
+
+
+def test_limite_feicoes_diferente_nao_reaproveita_o_cache(cache):
+    runner = _runner(cache)
+    cache.put(_chave(runner), {"tabela": "dados.rios", "count": 50})
+
+    outro = _runner(cache)
+    outro.profiler.limite_feicoes = 10
+    assert cache.get(_chave(outro)) is None
@@ -4,35 +4,167 @@ simultaneamente para o console (stdout) e, opcionalmente, para um componente
 de interface gráfica como QTextEdit.
 
 É útil para manter rastreamento de ações tanto para o usuário quanto para debug.
+
+O logger pode ser chamado de qualquer thread:
+- Cada mensagem tem um nível (DEBUG, INFO, AVISO, ERRO), inferido do prefixo
+  ('[Erro]', '[Aviso]') quando não informado
+- As mensagens destinadas ao widget entram em uma fila e são gravadas em lote por
+  um QTimer na thread da interface, com uma única rolagem por lote
+- As últimas mensagens ficam em um buffer circular em memória (registros())
+- Opcionalmente, cada mensagem é gravada como uma linha JSON em arquivo
+  (JSON lines), para análise posterior da execução
+
+O PyQt6 só é importado quando um widget é informado, o que permite usar o
+logger também fora da interface (linha de comando).
 """
 
-from PyQt6.QtWidgets import QTextEdit
+import json
+import sys
+import threading
+import time
+from collections import deque
+
+DEBUG, INFO, AVISO, ERRO = 10, 20, 30, 40
+NOMES_NIVEIS = {DEBUG: "DEBUG", INFO: "INFO", AVISO: "AVISO", ERRO: "ERRO"}
+NIVEIS_POR_NOME = {nome: nivel for nivel, nome in NOMES_NIVEIS.items()}
+
+
+def nivel_da_mensagem(message: str) -> int:
+    """
+    Infere o nível pelo prefixo usado nas mensagens da aplicação.
+    """
+    inicio = message.lstrip()[:10].lower()
+    if inicio.startswith("[erro"):
+        return ERRO
+    if inicio.startswith("[aviso"):
+        return AVISO
+    return INFO
 
 
 class Logger:
-    def __init__(self, widget: QTextEdit = None):
+    def __init__(self, widget=None, nivel: int = INFO, capacidade: int = 5000,
+                 intervalo_ms: int = 100, arquivo_jsonl: str | None = None, console=sys.stdout):
         """
         Inicializa o logger.
 
-        Parâmetro:
+        Parâmetros:
         - widget: instância de QTextEdit (opcional), usada para exibir logs na interface.
+          Deve ser criado na thread da interface.
+        - nivel: nível mínimo registrado
+        - capacidade: tamanho do buffer circular e máximo de linhas mantidas no widget
+        - intervalo_ms: intervalo entre as gravações em lote no widget
+        - arquivo_jsonl: arquivo onde cada mensagem é anexada como uma linha JSON (opcional)
+        - console: fluxo de saída do console (None desativa)
         """
         self.widget = widget
+        self.nivel = nivel
+        self.console = console
+        self._lock = threading.Lock()
+        self._registros: deque = deque(maxlen=capacidade)
+        self._pendentes: deque = deque(maxlen=capacidade)
+        self._omitidas = 0
+        self._arquivo = open(arquivo_jsonl, "a", encoding="utf-8") if arquivo_jsonl else None
+        self._timer = None
+
+        if widget is not None:
+            from PyQt6.QtCore import QTimer
+
+            widget.document().setMaximumBlockCount(capacidade)
+            self._timer = QTimer(widget)
+            self._timer.setInterval(intervalo_ms)
+            self._timer.timeout.connect(self.flush)
+            self._timer.start()
 
-    def log(self, message: str):
+    def log(self, message: str, nivel: int | None = None, **campos):
         """
-        Registra uma mensagem no console e na interface, se aplicável.
+        Registra uma mensagem no console, no buffer, no arquivo JSON lines e na
+        fila do widget. Pode ser chamado de qualquer thread.
+
+        Parâmetros:
+        - nivel: nível da mensagem (inferido do prefixo se omitido)
+        - campos: dados adicionais gravados apenas no arquivo JSON lines
         """
-        print(message)
-        if self.widget:
-            self.widget.append(message)
-            self.widget.verticalScrollBar().setValue(
-                self.widget.verticalScrollBar().maximum()
-            )
+        nivel = nivel_da_mensagem(message) if nivel is None else nivel
+        if nivel < self.nivel:
+            return
+
+        registro = {
+            "t": time.time(),
+            "nivel": NOMES_NIVEIS.get(nivel, str(nivel)),
+            "mensagem": message,
+            "thread": threading.current_thread().name,
+            **campos,
+        }
+        with self._lock:
+            self._registros.append(registro)
+            if self.widget is not None:
+                if len(self._pendentes) == self._pendentes.maxlen:
+                    self._omitidas += 1
+                self._pendentes.append(message)
+            if self._arquivo is not None:
+                self._arquivo.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+                self._arquivo.flush()
+
+        if self.console is not None:
+            print(message, file=self.console)
+
+    def debug(self, message: str, **campos):
+        self.log(message, DEBUG, **campos)
+
+    def info(self, message: str, **campos):
+        self.log(message, INFO, **campos)
+
+    def aviso(self, message: str, **campos):
+        self.log(message, AVISO, **campos)
+
+    def erro(self, message: str, **campos):
+        self.log(message, ERRO, **campos)
+
+    def flush(self):
+        """
+        Grava no widget, de uma vez, as mensagens acumuladas desde o último lote.
+        Deve ser chamado na thread da interface (o QTimer faz isso periodicamente).
+        """
+        if self.widget is None:
+            return
+        with self._lock:
+            if not self._pendentes:
+                return
+            mensagens = list(self._pendentes)
+            self._pendentes.clear()
+            omitidas, self._omitidas = self._omitidas, 0
+
+        if omitidas:
+            mensagens.insert(0, f"[Aviso] {omitidas} mensagens omitidas no log.")
+        self.widget.append("\n".join(mensagens))
+        barra = self.widget.verticalScrollBar()
+        barra.setValue(barra.maximum())
+
+    def registros(self, nivel_minimo: int = DEBUG) -> list[dict]:
+        """
+        Cópia das mensagens mantidas no buffer circular, a partir do nível indicado.
+        """
+        with self._lock:
+            return [r for r in self._registros if NIVEIS_POR_NOME.get(r["nivel"], INFO) >= nivel_minimo]
 
     def clear(self):
         """
         Limpa o conteúdo do widget de log (apenas se for um QTextEdit).
         """
+        with self._lock:
+            self._pendentes.clear()
+            self._omitidas = 0
         if self.widget:
             self.widget.clear()
+
+    def close(self):
+        """
+        Grava as mensagens pendentes e fecha o arquivo JSON lines.
+        """
+        if self._timer is not None:
+            self._timer.stop()
+        self.flush()
+        with self._lock:
+            if self._arquivo is not None:
+                self._arquivo.close()
+                self._arquivo = None
@@ -0,0 +1,168 @@
+"""
+Este módulo define a classe RunProfiler, que mede onde o tempo de uma execução
+é gasto: leitura, reprojeção e dissolução da AOI, preparação, consulta de cada
+camada, leitura, limpeza e gravação das feições na exportação.
+
+Cada medição pertence a uma etapa (ex: 'consulta', 'exportacao.leitura') e,
+opcionalmente, a uma camada, com as linhas e os bytes transferidos. Ao final, o
+relatório agrega os tempos por etapa e por camada, junto com os planos
+EXPLAIN (ANALYZE, BUFFERS) das camadas mais lentas, se capturados, e pode ser
+salvo em JSON ou HTML.
+
+As medições podem vir de várias threads. Um RunProfiler inativo
+(RunProfiler(ativo=False)) não registra nada, para que o código instrumentado
+não precise testar se há um medidor.
+"""
+
+import html
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+
+class RunProfiler:
+    def __init__(self, ativo: bool = True):
+        self.ativo = ativo
+        self.inicio = time.time()
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self._etapas: dict[str, dict] = {}
+        self._camadas: dict[str, dict] = {}
+        self._planos: dict[str, object] = {}
+
+    @contextmanager
+    def medir(self, etapa: str, camada: str | None = None):
+        """
+        Mede o bloco como uma ocorrência da etapa. O dicionário entregue pode
+        receber 'linhas' e 'bytes', registrados junto com o tempo.
+        """
+        if not self.ativo:
+            yield {}
+            return
+        dados = {}
+        t = time.perf_counter()
+        try:
+            yield dados
+        finally:
+            self.registrar(etapa, time.perf_counter() - t, camada,
+                           dados.get("linhas", 0), dados.get("bytes", 0))
+
+    def registrar(self, etapa: str, segundos: float, camada: str | None = None,
+                  linhas: int = 0, n_bytes: int = 0):
+        """
+        Registra uma ocorrência da etapa, já medida.
+        """
+        if not self.ativo:
+            return
+        with self._lock:
+            e = self._etapas.setdefault(etapa, {"n": 0, "segundos": 0.0, "max": 0.0, "linhas": 0, "bytes": 0})
+            e["n"] += 1
+            e["segundos"] += segundos
+            e["max"] = max(e["max"], segundos)
+            e["linhas"] += linhas
+            e["bytes"] += n_bytes
+            if camada is not None:
+                c = self._camadas.setdefault(camada, {"segundos": {}, "linhas": {}, "bytes": 0})
+                c["segundos"][etapa] = c["segundos"].get(etapa, 0.0) + segundos
+                if linhas:
+                    c["linhas"][etapa] = c["linhas"].get(etapa, 0) + linhas
+                c["bytes"] += n_bytes
+
+    def registrar_plano(self, camada: str, plano):
+        """
+        Guarda o plano EXPLAIN (ANALYZE, BUFFERS) capturado para a camada.
+        """
+        with self._lock:
+            self._planos[camada] = plano
+
+    def mais_lentas(self, n: int, etapa: str | None = None) -> list[str]:
+        """
+        As n camadas com mais tempo na etapa indicada (ou no total das etapas).
+        """
+        with self._lock:
+            tempos = {
+                camada: (c["segundos"].get(etapa, 0.0) if etapa else sum(c["segundos"].values()))
+                for camada, c in self._camadas.items()
+            }
+        ordenadas = sorted((t, camada) for camada, t in tempos.items() if t > 0)
+        return [camada for _, camada in reversed(ordenadas[-n:])] if n > 0 else []
+
+    def relatorio(self) -> dict:
+        """
+        Relatório da execução: duração total, tempos por etapa e por camada
+        (camadas da mais lenta para a mais rápida) e planos capturados.
+        """
+        with self._lock:
+            etapas = {nome: dict(e) for nome, e in self._etapas.items()}
+            camadas = [
+                {
+                    "camada": nome,
+                    "total": sum(c["segundos"].values()),
+                    "segundos": dict(c["segundos"]),
+                    "linhas": dict(c["linhas"]),
+                    "bytes": c["bytes"],
+                }
+                for nome, c in self._camadas.items()
+            ]
+            planos = dict(self._planos)
+        camadas.sort(key=lambda c: c["total"], reverse=True)
+        return {
+            "inicio": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.inicio)),
+            "duracao": time.perf_counter() - self._t0,
+            "etapas": etapas,
+            "camadas": camadas,
+            "planos": planos,
+        }
+
+    def salvar(self, caminho: str):
+        """
+        Salva o relatório em HTML (extensão .html/.htm) ou em JSON.
+        """
+        relatorio = self.relatorio()
+        if caminho.lower().endswith((".html", ".htm")):
+            conteudo = self._html(relatorio)
+        else:
+            conteudo = json.dumps(relatorio, ensure_ascii=False, indent=2, default=str)
+        with open(caminho, "w", encoding="utf-8") as f:
+            f.write(conteudo)
+
+    @staticmethod
+    def _html(relatorio: dict) -> str:
+        e = html.escape
+        etapas = "".join(
+            f"<tr><td>{e(nome)}</td><td>{d['n']}</td><td>{d['segundos']:.3f}</td>"
+            f"<td>{d['max']:.3f}</td><td>{d['linhas']}</td><td>{d['bytes']}</td></tr>"
+            for nome, d in sorted(relatorio["etapas"].items(), key=lambda i: -i[1]["segundos"])
+        )
+        camadas = "".join(
+            f"<tr><td>{e(c['camada'])}</td><td>{c['total']:.3f}</td>"
+            f"<td>{e(', '.join(f'{k}: {v:.3f}' for k, v in c['segundos'].items()))}</td>"
+            f"<td>{e(', '.join(f'{k}: {v}' for k, v in c['linhas'].items()))}</td><td>{c['bytes']}</td></tr>"
+            for c in relatorio["camadas"]
+        )
+        planos = "".join(
+            f"<details><summary>{e(camada)}</summary><pre>"
+            f"{e(json.dumps(plano, ensure_ascii=False, indent=2, default=str))}</pre></details>"
+            for camada, plano in relatorio["planos"].items()
+        )
+        return f"""<!DOCTYPE html>
+<html lang="pt-BR"><head><meta charset="utf-8"><title>Perfil da execução</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+table {{ border-collapse: collapse; margin-bottom: 2em; }}
+td, th {{ border: 1px solid #ccc; padding: 4px 8px; text-align: left; }}
+pre {{ background: #f4f4f4; padding: 1em; overflow-x: auto; }}
+</style></head><body>
+<h1>Perfil da execução</h1>
+<p>Início: {e(relatorio['inicio'])} — duração: {relatorio['duracao']:.1f} s</p>
+<h2>Etapas</h2>
+<table><tr><th>Etapa</th><th>Ocorrências</th><th>Total (s)</th><th>Máximo (s)</th><th>Linhas</th><th>Bytes</th></tr>
+{etapas}</table>
+<h2>Camadas</h2>
+<table><tr><th>Camada</th><th>Total (s)</th><th>Por etapa (s)</th><th>Linhas</th><th>Bytes</th></tr>
+{camadas}</table>
+<h2>Planos (EXPLAIN ANALYZE, BUFFERS)</h2>
+{planos or "<p>Nenhum plano capturado.</p>"}
+</body></html>
+"""